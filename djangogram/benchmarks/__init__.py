@@ -0,0 +1,11 @@
+"""
+Benchmarks of the main views, run by the `benchmark` management command.
+
+The command seeds a fixed-size dataset with `fake_data`, sends every scenario of `suite.SCENARIOS`
+through the test client and reports the p50 and p95 latency, the queries per request and the memory
+allocated per request. The results are compared with `baseline.json`, a scenario fails when it runs more
+queries than its baseline or than the `QUERY_BUDGETS` of its view, or allocates more than the baseline by
+more than the tolerance.
+Latencies depend on the machine, so they are compared relative to the time of a fixed workload measured
+on the same machine (`suite.calibrate`), only over enough iterations, and only warn unless asked to fail.
+"""
@@ -0,0 +1,255 @@
+"""
+Replays request traces recorded by `webapp.tracing` against a running server.
+
+Every visitor of the trace becomes a virtual user with its own cookies, replaying its requests in order and
+logged in as one of the users of the target database. The posts, users and comments of the trace do not
+exist offline, so their ids are mapped to existing ones. The virtual users run on `concurrency` threads.
+A response is an error when its status differs from the recorded one or it redirects a logged-in visitor
+to the login page, so a replay that lost its session does not pass as a fast one.
+"""
+import json
+import os
+import socket
+import subprocess
+import tempfile
+import time
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.shortcuts import resolve_url
+from django.urls import reverse
+
+from webapp.models import Post, Comment, UserProfile
+
+
+def load_trace(path):
+    """
+    Returns the records of the trace at `path` by visitor, each in the order they were recorded.
+    """
+    visitors = defaultdict(list)
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                record = json.loads(line)
+                visitors[record['visitor']].append(record)
+    for records in visitors.values():
+        records.sort(key=lambda record: record['time'])
+    return list(visitors.values())
+
+
+def pick(ids, value):
+    return ids[zlib.crc32(str(value).encode()) % len(ids)]
+
+
+class IdMapper:
+    """
+    Maps the ids of the trace to ids of the target database, the same recorded id always to the same id.
+    """
+
+    def __init__(self):
+        self.user_ids = list(User.objects.filter(profile__isnull=False).order_by('id').values_list('id', flat=True))
+        self.post_ids = list(Post.objects.order_by('id').values_list('id', flat=True))
+        self.comments = list(Comment.objects.order_by('id').values_list('id', 'post_id'))
+        if not self.user_ids or not self.post_ids:
+            raise ValueError('The target database has no users or posts, seed it with fake_data.')
+
+    def get_user(self, index):
+        return User.objects.get(id=self.user_ids[index % len(self.user_ids)])
+
+    def map_kwargs(self, view, kwargs, user):
+        kwargs = dict(kwargs)
+        if view == 'user-edit':
+            kwargs['id'] = UserProfile.objects.get(user=user).id
+            return kwargs
+        if 'comment_id' in kwargs and self.comments:
+            comment_id, post_id = pick(self.comments, kwargs['comment_id'])
+            kwargs.update({'comment_id': comment_id, 'id' if 'id' in kwargs else 'post_id': post_id})
+            return kwargs
+        for name in ('id', 'post_id'):
+            if name in kwargs:
+                kwargs[name] = pick(self.post_ids, kwargs[name])
+        if 'user_id' in kwargs:
+            kwargs['user_id'] = pick(self.user_ids, kwargs['user_id'])
+        return kwargs
+
+
+class VirtualUser:
+    """
+    Replays the records of one visitor with its own cookies, without following redirects.
+    """
+
+    def __init__(self, base_url, records, user, password, mapper, speed):
+        self.base_url = base_url
+        self.records = records
+        self.user = user
+        self.password = password
+        self.mapper = mapper
+        self.speed = speed
+        self.session = requests.Session()
+
+    def send(self, method, path, data=None):
+        headers = {'Referer': self.base_url + '/'}
+        if method != 'GET':
+            headers['X-CSRFToken'] = self.session.cookies.get('csrftoken', '')
+        return self.session.request(method, self.base_url + path, data=data, headers=headers, allow_redirects=False,
+                                    timeout=30)
+
+    def log_in(self):
+        self.send('GET', reverse('login'))
+        response = self.send('POST', reverse('login'), {'username': self.user.username, 'password': self.password})
+        self.check_session()
+        return response
+
+    def check_session(self):
+        """
+        Raises RuntimeError when the login left no session cookie. Secure cookies are sent over plain http too,
+        as the servers of a replay run without TLS.
+        """
+        cookies = [cookie for cookie in self.session.cookies if cookie.name == settings.SESSION_COOKIE_NAME]
+        if not cookies:
+            raise RuntimeError(f'Logging in as {self.user.username} set no session cookie, check --password.')
+        for cookie in cookies:
+            cookie.secure = False
+
+    def is_error(self, record, response):
+        if response is None or response.status_code >= 400:
+            return True
+        if (record['authenticated'] and response.is_redirect
+                and urlsplit(response.headers['Location']).path == resolve_url(settings.LOGIN_URL)):
+            return True
+        return record.get('status') is not None and response.status_code != record['status']
+
+    def replay(self):
+        """
+        Returns the URL name, status code (None for connection errors), whether the response is an error
+        and the latency of every replayed request.
+        Raises:
+            RuntimeError: If the virtual user could not log in.
+        """
+        results = []
+        logged_in = False
+        previous = None
+        for record in self.records:
+            if self.speed and previous is not None:
+                time.sleep(max(0.0, record['time'] - previous) / self.speed)
+            previous = record['time']
+            view = record['view']
+            if record['authenticated'] and not logged_in and view != 'login':
+                self.log_in()
+                logged_in = True
+            if view:
+                path = reverse(view, kwargs=self.mapper.map_kwargs(view, record['kwargs'], self.user))
+            else:
+                path = record['path']
+            if record['query']:
+                path += '?' + record['query']
+            data = record['data']
+            if view == 'login' and record['method'] == 'POST':
+                self.send('GET', reverse('login'))
+                data = {'username': self.user.username, 'password': self.password}
+            started = time.perf_counter()
+            try:
+                response = self.send(record['method'], path, data)
+            except requests.RequestException:
+                response = None
+            latency = time.perf_counter() - started
+            status = response.status_code if response is not None else None
+            results.append((view or record['path'], status, self.is_error(record, response), latency))
+            if view == 'login' and record['method'] == 'POST':
+                self.check_session()
+                logged_in = True
+            elif view == 'logout':
+                logged_in = False
+        return results
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summarize(results, seconds):
+    """
+    Returns the throughput, error rate, status codes and latency percentiles of `results` per URL name
+    and in total.
+    """
+    groups = defaultdict(list)
+    for view, status, error, latency in results:
+        groups[view].append((status, error, latency))
+        groups['total'].append((status, error, latency))
+    summary = {}
+    for view, group in sorted(groups.items()):
+        latencies = [latency * 1000 for _, _, latency in group]
+        statuses = defaultdict(int)
+        for status, _, _ in group:
+            statuses[str(status)] += 1
+        summary[view] = {'requests': len(group), 'throughput': round(len(group) / seconds, 2),
+                         'error_rate': round(sum(error for _, error, _ in group) / len(group), 4),
+                         'statuses': dict(sorted(statuses.items())),
+                         'p50_ms': round(percentile(latencies, 0.5), 2),
+                         'p95_ms': round(percentile(latencies, 0.95), 2),
+                         'p99_ms': round(percentile(latencies, 0.99), 2)}
+    return summary
+
+
+def replay(base_url, visitors, concurrency, password, repeat=1, speed=0.0):
+    """
+    Replays `visitors` (as returned by `load_trace`) `repeat` times against `base_url`.
+    Parameters:
+        base_url (str): The URL of the server, without a trailing slash.
+        visitors (list): The records of every visitor.
+        concurrency (int): The number of virtual users replaying at the same time.
+        password (str): The password of the users of the target database.
+        repeat (int): How many times every visitor is replayed, each time as another user.
+        speed (float): Replay the pauses between the requests of a visitor this many times faster,
+            0 sends the requests without pauses.
+    Returns:
+        dict: The summary of the replayed requests per URL name.
+    """
+    mapper = IdMapper()
+    virtual_users = [VirtualUser(base_url, records, mapper.get_user(index), password, mapper, speed)
+                     for index, records in enumerate(visitors * repeat)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = [result for results in executor.map(VirtualUser.replay, virtual_users) for result in results]
+    return summarize(results, time.perf_counter() - started)
+
+
+def start_server(kind, port, workers, timeout=30):
+    """
+    Starts gunicorn with gunicorn.conf.py serving djangogram.wsgi or, for `kind` 'asgi', djangogram.asgi,
+    and waits until it accepts connections.
+    Returns:
+        subprocess.Popen: The server process.
+    """
+    environ = {**os.environ, 'GUNICORN_ASGI': '1' if kind == 'asgi' else '0', 'GUNICORN_WORKERS': str(workers),
+               'GUNICORN_BIND': f'127.0.0.1:{port}'}
+    # A file rather than a pipe, which would block the server once full.
+    log = tempfile.TemporaryFile()
+    process = subprocess.Popen(['gunicorn', '--config', 'gunicorn.conf.py'], cwd=settings.BASE_DIR, env=environ,
+                               stdout=subprocess.DEVNULL, stderr=log)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            log.seek(0)
+            raise RuntimeError(f'gunicorn exited:\n{log.read().decode()}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'gunicorn did not accept connections within {timeout} seconds.')
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
@@ -0,0 +1,166 @@
+import json
+import statistics
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from webapp.models import Post
+
+# The dataset of the baseline, multiplied by the --scale of the command.
+DATASET = {'users': 500, 'posts': 5000, 'comments': 5000, 'likes': 25000, 'follows': 10000}
+PASSWORD = 'password123'
+# Fewer measured requests give a p95 too noisy to compare.
+MIN_TIMED_ITERATIONS = 20
+
+
+class Scenario:
+    """
+    A request sent to a view on every iteration.
+    Parameters:
+        name (str): The name of the scenario in the results.
+        method (str): The HTTP method of the request.
+        get_url (callable): Returns the URL of the request for the benchmark context.
+        data (dict): The body of POST requests.
+    """
+
+    def __init__(self, name, method, get_url, data=None):
+        self.name = name
+        self.method = method
+        self.get_url = get_url
+        self.data = data
+
+
+SCENARIOS = [
+    Scenario('home', 'get', lambda context: reverse('posts')),
+    Scenario('feed', 'get', lambda context: reverse('feed')),
+    Scenario('comments', 'get', lambda context: reverse('all-comments-for-post', args=[context['post'].id])),
+    Scenario('like-post', 'post', lambda context: reverse('like-post', args=[context['post'].id])),
+    Scenario('subscribe', 'post', lambda context: reverse('subscribe', args=[context['author'].id])),
+    Scenario('create-post', 'post', lambda context: reverse('post-create'),
+             {'caption': 'Benchmark post', 'name': 'benchmark'}),
+]
+
+
+def get_context():
+    """
+    Returns the objects the scenarios use: the user following the most authors, the most commented post
+    and the most followed author.
+    """
+    user = User.objects.filter(profile__isnull=False).annotate(following=Count('subscriptions')).order_by(
+        '-following', 'id').first()
+    author = User.objects.exclude(id=user.id).annotate(followers=Count('user_subscribers')).order_by(
+        '-followers', 'id').first()
+    return {'user': user, 'author': author, 'post': Post.objects.order_by('-comment_count', 'id').first()}
+
+
+def calibrate(rounds=5):
+    """
+    Returns the milliseconds a fixed pure Python workload takes on this machine, the best of `rounds`.
+    Latencies divided by it can be compared between machines.
+    """
+    best = None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        json.loads(json.dumps([{'id': number, 'caption': str(number) * 10} for number in range(20000)]))
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def measure(client, scenario, context, iterations, warmup, calibration_ms):
+    """
+    Sends the request of `scenario` `warmup + iterations` times and measures the last `iterations`.
+    Latency is measured without any instrumentation, queries and memory in a second, shorter pass.
+    Returns:
+        dict: The URL name of the view, the p50 and p95 latency in milliseconds and relative to
+            `calibration_ms`, the median queries and allocated KiB per request.
+    """
+    url = scenario.get_url(context)
+    send = getattr(client, scenario.method)
+
+    def request():
+        response = send(url, scenario.data) if scenario.data else send(url)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{scenario.name} returned {response.status_code}')
+
+    for _ in range(warmup):
+        request()
+    durations = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        request()
+        durations.append((time.perf_counter() - started) * 1000)
+
+    queries = []
+    allocated = []
+    tracemalloc.start()
+    try:
+        for _ in range(min(iterations, 10)):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            with CaptureQueriesContext(connection) as captured:
+                request()
+            allocated.append((tracemalloc.get_traced_memory()[1] - before) / 1024)
+            queries.append(len(captured))
+    finally:
+        tracemalloc.stop()
+    p95_ms = percentile(durations, 0.95)
+    return {'view': resolve(url).url_name, 'p50_ms': round(statistics.median(durations), 2),
+            'p95_ms': round(p95_ms, 2), 'p95_relative': round(p95_ms / calibration_ms, 3),
+            'queries': statistics.median_high(queries), 'memory_kib': round(statistics.median(allocated), 1)}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns the regressions of `results` against `baseline` and the `QUERY_BUDGETS` of their views, as messages.
+    Parameters:
+        results (dict): The measures by scenario name.
+        baseline (dict): The measures of the baseline by scenario name, missing scenarios are not compared.
+        tolerance (float): How much more memory than the baseline a scenario may allocate, 0.5 is 50%.
+    """
+    regressions = []
+    for name, result in results.items():
+        budget = settings.QUERY_BUDGETS.get(result['view'])
+        if budget is not None and result['queries'] > budget:
+            regressions.append(f'{name} ran {result["queries"]} queries, over the budget of {budget}')
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if result['queries'] > expected['queries']:
+            regressions.append(f'{name} ran {result["queries"]} queries, the baseline ran {expected["queries"]}')
+        if result['memory_kib'] > expected['memory_kib'] * (1 + tolerance):
+            regressions.append(f'{name} allocated {result["memory_kib"]} KiB, the baseline {expected["memory_kib"]}')
+    return regressions
+
+
+def compare_latency(results, baseline, tolerance):
+    """
+    Returns the scenarios of `results` slower than `baseline` by more than `tolerance`, as messages.
+    The p95 latencies are compared relative to the calibration of the machine that measured them.
+    """
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name, {}).get('p95_relative')
+        if expected is not None and result['p95_relative'] > expected * (1 + tolerance):
+            regressions.append(f'{name} p95 is {result["p95_relative"]} times the calibration, '
+                               f'the baseline is {expected}')
+    return regressions
+
+
+def load_baseline(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
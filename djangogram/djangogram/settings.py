@@ -1,145 +0,0 @@
-"""
-Django settings for djangogram project.
-
-Generated by 'django-admin startproject' using Django 4.1.7.
-
-For more information on this file, see
-https://docs.djangoproject.com/en/4.1/topics/settings/
-
-For the full list of settings and their values, see
-https://docs.djangoproject.com/en/4.1/ref/settings/
-"""
-import os
-from pathlib import Path
-import cloudinary.api
-
-# Build paths inside the project like this: BASE_DIR / 'subdir'.
-BASE_DIR = Path(__file__).resolve().parent.parent
-
-# Quick-start development settings - unsuitable for production
-# See https://docs.djangoproject.com/en/4.1/howto/deployment/checklist/
-
-# SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = os.environ.get("SECRET_KEY")
-
-# SECURITY WARNING: don't run with debug turned on in production!
-
-DEBUG = int(os.environ.get("DEBUG", default=0))
-
-ALLOWED_HOSTS = os.environ.get("DJANGO_ALLOWED_HOSTS").split(" ")
-
-CSRF_TRUSTED_ORIGINS = [os.environ.get("CSRF_TRUSTED_ORIGINS")]
-# Application definition
-
-INSTALLED_APPS = ['debug_toolbar', 'django.contrib.admin', 'django.contrib.auth', 'django.contrib.contenttypes',
-                  'django.contrib.sessions', 'django.contrib.messages', 'django.contrib.staticfiles',
-                  'webapp.apps.WebappConfig', 'easy_thumbnails', 'rest_framework', 'cloudinary', 'social_django',
-                  ]
-
-MIDDLEWARE = ['django.middleware.security.SecurityMiddleware', 'django.contrib.sessions.middleware.SessionMiddleware',
-              'django.middleware.common.CommonMiddleware',
-              'django.middleware.csrf.CsrfViewMiddleware',
-              'django.contrib.auth.middleware.AuthenticationMiddleware',
-              'django.contrib.messages.middleware.MessageMiddleware',
-              'django.middleware.clickjacking.XFrameOptionsMiddleware',
-              'debug_toolbar.middleware.DebugToolbarMiddleware', ]
-
-ROOT_URLCONF = 'djangogram.urls'
-
-THUMBNAIL_ALIASES = {'': {'small': {'size': (200, 200), 'crop': True}, 'medium': {'size': (400, 400), 'crop': True},
-                          'large': {'size': (800, 800), 'crop': True}, }, }
-
-TEMPLATES = [
-    {'BACKEND': 'django.template.backends.django.DjangoTemplates', 'DIRS': [BASE_DIR / 'templates'], 'APP_DIRS': True,
-     'OPTIONS': {'context_processors': ['django.template.context_processors.debug',
-                                        'django.template.context_processors.request',
-                                        'django.contrib.auth.context_processors.auth',
-                                        'django.contrib.messages.context_processors.messages', ], }, }, ]
-
-WSGI_APPLICATION = 'djangogram.wsgi.application'
-
-# Database
-# https://docs.djangoproject.com/en/4.1/ref/settings/#databases
-
-DATABASES = {"default": {"ENGINE": os.environ.get("SQL_ENGINE", "django.db.backends.sqlite3"),
-                         "NAME": os.environ.get("SQL_DATABASE", BASE_DIR / "db.sqlite3"),
-                         "USER": os.environ.get("SQL_USER", "user"),
-                         "PASSWORD": os.environ.get("SQL_PASSWORD", "password"),
-                         "HOST": os.environ.get("SQL_HOST", "localhost"),
-                         "PORT": os.environ.get("SQL_PORT", "5432"), }}
-
-# Password validation
-# https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
-
-AUTH_PASSWORD_VALIDATORS = [{'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator', },
-                            {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator', },
-                            {'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator', },
-                            {'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator', }, ]
-
-AUTHENTICATION_BACKENDS = [
-    'social_core.backends.google.GoogleOAuth2',
-    'social_core.backends.github.GithubOAuth2',
-    'django.contrib.auth.backends.ModelBackend',
-]
-
-SOCIAL_AUTH_GOOGLE_OAUTH2_KEY = os.environ.get('SOCIAL_AUTH_GOOGLE_OAUTH2_KEY')
-SOCIAL_AUTH_GOOGLE_OAUTH2_SECRET = os.environ.get('SOCIAL_AUTH_GOOGLE_OAUTH2_SECRET')
-
-SOCIAL_AUTH_GITHUB_KEY = os.environ.get('SOCIAL_AUTH_GITHUB_KEY')
-SOCIAL_AUTH_GITHUB_SECRET = os.environ.get('SOCIAL_AUTH_GITHUB_SECRET')
-
-
-# Internationalization
-# https://docs.djangoproject.com/en/4.1/topics/i18n/
-
-LANGUAGE_CODE = 'en-us'
-
-TIME_ZONE = 'UTC'
-
-USE_I18N = True
-
-USE_TZ = True
-
-# Static files (CSS, JavaScript, Images)
-# https://docs.djangoproject.com/en/4.1/howto/static-files/
-
-STATIC_URL = 'static/'
-STATIC_ROOT = BASE_DIR / "staticfiles"
-MEDIA_URL = 'media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, '../../media/')
-
-#cloudinary
-cloudinary.config(
-    cloud_name=os.environ.get('CLOUD_NAME'),
-    api_key=os.environ.get('API_KEY'),
-    api_secret=os.environ.get('API_SECRET'),
-    secure=True,
-)
-
-CLOUDINARY_AVATAR_FOLDER = 'avatars'
-CLOUDINARY_MEDIA_FOLDER = 'image'
-
-# Default primary key field type
-# https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
-
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
-
-MAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
-EMAIL_HOST = 'smtp.gmail.com'
-EMAIL_PORT = 587
-EMAIL_USE_TLS = True
-EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER')
-EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
-
-DEFAULT_FROM_EMAIL = 'John <jlite2023@gmail.com>'
-SERVER_EMAIL = 'John <jlite2023@gmail.com>'
-EMAIL_SUBJECT_PREFIX = 'Have a nice day to Djangogram!! '
-EMAIL_TIMEOUT = 5
-
-# CSRF_COOKIE_SECURE = True
-INTERNAL_IPS = ['127.0.0.1']
-SESSION_COOKIE_SECURE = True
-
-SOCIAL_AUTH_URL_NAMESPACE = 'social'
-
-SOCIAL_AUTH_JSONFIELD_ENABLED = True
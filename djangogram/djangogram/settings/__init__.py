@@ -0,0 +1,4 @@
+"""
+Settings modules of the environments: `dev` loads the debugging tools, `prod` is used by the servers
+and `test` by the test runner. All of them extend `base`.
+"""
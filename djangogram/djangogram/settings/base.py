@@ -0,0 +1,261 @@
+"""
+Django settings for djangogram project, shared by the dev, prod and test settings modules.
+
+Generated by 'django-admin startproject' using Django 4.1.7.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.1/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/4.1/ref/settings/
+"""
+import os
+from pathlib import Path
+import cloudinary.api
+
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+# Quick-start development settings - unsuitable for production
+# See https://docs.djangoproject.com/en/4.1/howto/deployment/checklist/
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = os.environ.get("SECRET_KEY")
+
+# SECURITY WARNING: don't run with debug turned on in production!
+
+DEBUG = int(os.environ.get("DEBUG", default=0))
+
+ALLOWED_HOSTS = os.environ.get("DJANGO_ALLOWED_HOSTS", "").split()
+
+CSRF_TRUSTED_ORIGINS = os.environ.get("CSRF_TRUSTED_ORIGINS", "").split()
+# Application definition
+
+INSTALLED_APPS = ['django.contrib.admin', 'django.contrib.auth', 'django.contrib.contenttypes',
+                  'django.contrib.sessions', 'django.contrib.messages', 'django.contrib.staticfiles',
+                  'webapp.apps.WebappConfig', 'easy_thumbnails', 'rest_framework', 'cloudinary', 'social_django',
+                  ]
+
+MIDDLEWARE = ['webapp.health.HealthCheckMiddleware',
+              'webapp.middleware.MetricsMiddleware',
+              'webapp.profiling.ProfilingMiddleware',
+              'webapp.querylog.QueryLogMiddleware',
+              'django.middleware.security.SecurityMiddleware',
+              'webapp.middleware.ReplicaMiddleware',
+              'django.contrib.sessions.middleware.SessionMiddleware',
+              'django.middleware.common.CommonMiddleware',
+              'django.middleware.csrf.CsrfViewMiddleware',
+              'django.contrib.auth.middleware.AuthenticationMiddleware',
+              'webapp.middleware.AsyncUserMiddleware',
+              'webapp.middleware.FollowSetMiddleware',
+              'webapp.tracing.TraceRecorderMiddleware',
+              'django.contrib.messages.middleware.MessageMiddleware',
+              'django.middleware.clickjacking.XFrameOptionsMiddleware', ]
+
+ROOT_URLCONF = 'djangogram.urls'
+
+THUMBNAIL_ALIASES = {'': {'small': {'size': (200, 200), 'crop': True}, 'medium': {'size': (400, 400), 'crop': True},
+                          'large': {'size': (800, 800), 'crop': True}, }, }
+
+TEMPLATES = [
+    {'BACKEND': 'django.template.backends.django.DjangoTemplates', 'DIRS': [BASE_DIR / 'templates'], 'APP_DIRS': True,
+     'OPTIONS': {'context_processors': ['django.template.context_processors.debug',
+                                        'django.template.context_processors.request',
+                                        'django.contrib.auth.context_processors.auth',
+                                        'django.contrib.messages.context_processors.messages', ], }, }, ]
+
+WSGI_APPLICATION = 'djangogram.wsgi.application'
+
+# Database
+# https://docs.djangoproject.com/en/4.1/ref/settings/#databases
+
+DATABASES = {"default": {"ENGINE": os.environ.get("SQL_ENGINE", "django.db.backends.sqlite3"),
+                         "NAME": os.environ.get("SQL_DATABASE", BASE_DIR / "db.sqlite3"),
+                         "USER": os.environ.get("SQL_USER", "user"),
+                         "PASSWORD": os.environ.get("SQL_PASSWORD", "password"),
+                         "HOST": os.environ.get("SQL_HOST", "localhost"),
+                         "PORT": os.environ.get("SQL_PORT", "5432"),
+                         # Connections are kept open for SQL_CONN_MAX_AGE seconds and checked before reuse.
+                         "CONN_MAX_AGE": int(os.environ.get("SQL_CONN_MAX_AGE", 60)),
+                         "CONN_HEALTH_CHECKS": bool(int(os.environ.get("SQL_CONN_HEALTH_CHECKS", 1))), }}
+# With SQL_POOL_SIZE, PostgreSQL connections are returned to a pool of the process when closed, at most this
+# many idle ones per database, see webapp.pooled_postgresql. Meant for ASGI workers, which close their
+# connections after every request.
+SQL_POOL_SIZE = int(os.environ.get("SQL_POOL_SIZE", 0))
+if SQL_POOL_SIZE and DATABASES["default"]["ENGINE"] == "django.db.backends.postgresql":
+    DATABASES["default"].update({"ENGINE": "webapp.pooled_postgresql", "POOL_SIZE": SQL_POOL_SIZE})
+
+# Read replicas, one per host in SQL_REPLICA_HOSTS with the other settings of the primary.
+# The reads of GET requests go to a random replica, see webapp.routers.
+REPLICA_DATABASES = []
+for number, host in enumerate(os.environ.get("SQL_REPLICA_HOSTS", "").split(), start=1):
+    DATABASES[f"replica{number}"] = {**DATABASES["default"], "HOST": host, "TEST": {"MIRROR": "default"}}
+    REPLICA_DATABASES.append(f"replica{number}")
+DATABASE_ROUTERS = ['webapp.routers.ReplicaRouter']
+# Reads stay on the primary for this long after a user's POST, so they see their own writes.
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', default=5))
+
+LOGGING = {'version': 1, 'disable_existing_loggers': False,
+           'handlers': {'console': {'class': 'logging.StreamHandler'}},
+           'loggers': {'webapp': {'handlers': ['console'], 'level': os.environ.get('WEBAPP_LOG_LEVEL', 'INFO')}}}
+
+# Profiling
+# PROFILE_SAMPLE_RATE of the requests run under cProfile, requests slower than PROFILE_SLOW_REQUEST_MS are
+# recorded with their query count and time. Both 0 disables webapp.profiling.ProfilingMiddleware.
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', default=0))
+PROFILE_SLOW_REQUEST_MS = float(os.environ.get('PROFILE_SLOW_REQUEST_MS', default=0))
+PROFILE_LOG_FILE = os.environ.get('PROFILE_LOG_FILE', default=BASE_DIR / 'profiles.log')
+PROFILE_LOG_MAX_BYTES = int(os.environ.get('PROFILE_LOG_MAX_BYTES', default=10 * 1024 * 1024))
+PROFILE_STATS_LINES = 30
+
+# Query log
+# Queries slower than SLOW_QUERY_MS are logged with the template line and the code that ran them, the same
+# query run NPLUSONE_THRESHOLD times in one request is reported as an N+1 pattern, and so are the requests of
+# the URL names in QUERY_BUDGETS running more queries than their budget. QUERY_LOG_STRICT raises instead.
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', default=100))
+NPLUSONE_THRESHOLD = int(os.environ.get('NPLUSONE_THRESHOLD', default=5))
+# The budgets are the query counts the views are designed for, without the session and user queries that the
+# cache serves: a subscription is the toggle, the backfill of the timeline (a read and a write) and the ids of
+# the high fan-out authors when they are not cached. PostgreSQL runs the like and subscription toggles as one
+# statement. The other databases run them as a transaction of up to 9 and 11 queries, counted with the
+# savepoints wrapping it inside an enclosing transaction, such as the one of a test.
+QUERY_BUDGETS = {'posts': 6, 'feed': 6, 'all-comments-for-post': 4, 'like-post': 1, 'like-comment': 1,
+                 'subscribe': 4}
+if 'postgresql' not in DATABASES['default']['ENGINE']:
+    QUERY_BUDGETS.update({'like-post': 9, 'like-comment': 9, 'subscribe': 14})
+QUERY_LOG_STRICT = False
+
+# Request traces
+# The requests of TRACE_SAMPLE_RATE of the visitors are written to TRACE_LOG_FILE, to be replayed offline
+# with the replay_trace command. 0 disables webapp.tracing.TraceRecorderMiddleware.
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', default=0))
+TRACE_LOG_FILE = os.environ.get('TRACE_LOG_FILE', default=BASE_DIR / 'traces.jsonl')
+TRACE_LOG_MAX_BYTES = int(os.environ.get('TRACE_LOG_MAX_BYTES', default=100 * 1024 * 1024))
+
+# Metrics
+# The /metrics endpoint requires `Authorization: Bearer <METRICS_TOKEN>` when METRICS_TOKEN is set. Without a
+# token it only answers requests sent straight from METRICS_INTERNAL_NETWORKS, never the ones nginx forwards.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+METRICS_INTERNAL_NETWORKS = os.environ.get(
+    'METRICS_INTERNAL_NETWORKS', default='127.0.0.0/8 ::1/128 10.0.0.0/8 172.16.0.0/12 192.168.0.0/16').split()
+
+# Health checks
+# /readyz runs its checks at most once per HEALTH_CHECK_CACHE_SECONDS per process, and checks the media
+# storage only with HEALTH_CHECK_STORAGE, since that is a network call with Cloudinary.
+HEALTH_CHECK_CACHE_SECONDS = float(os.environ.get('HEALTH_CHECK_CACHE_SECONDS', default=1))
+HEALTH_CHECK_STORAGE = bool(int(os.environ.get('HEALTH_CHECK_STORAGE', default=0)))
+
+# Cache
+# With CACHE_URL (redis://host:6379/0) the cache is shared by all workers, without it every process has
+# its own local-memory cache, which is what development and the tests use.
+CACHE_URL = os.environ.get('CACHE_URL')
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', default='django.core.cache.backends.redis.RedisCache' if CACHE_URL
+                               else 'django.core.cache.backends.locmem.LocMemCache')
+CACHES = {'default': {'BACKEND': CACHE_BACKEND, 'LOCATION': CACHE_URL or 'djangogram',
+                      'KEY_PREFIX': os.environ.get('CACHE_KEY_PREFIX', default='djangogram')}}
+
+# Password validation
+# https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [{'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator', },
+                            {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator', },
+                            {'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator', },
+                            {'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator', }, ]
+
+AUTHENTICATION_BACKENDS = [
+    'social_core.backends.google.GoogleOAuth2',
+    'social_core.backends.github.GithubOAuth2',
+    'webapp.backends.CachedModelBackend',
+    # Resolves the sessions created before CachedModelBackend was added.
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# Sessions and the logged-in user are read from the cache, the database is only hit on cache misses and writes.
+# Users changed with QuerySet.update() are served from the cache for up to USER_CACHE_TIMEOUT seconds, see
+# webapp.backends.
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE', default='django.contrib.sessions.backends.cached_db')
+USER_CACHE_TIMEOUT = int(os.environ.get('USER_CACHE_TIMEOUT', default=5 * 60))
+# Flash messages are kept in a cookie, the session is only written for messages too large for it.
+MESSAGE_STORAGE = 'django.contrib.messages.storage.fallback.FallbackStorage'
+
+SOCIAL_AUTH_GOOGLE_OAUTH2_KEY = os.environ.get('SOCIAL_AUTH_GOOGLE_OAUTH2_KEY')
+SOCIAL_AUTH_GOOGLE_OAUTH2_SECRET = os.environ.get('SOCIAL_AUTH_GOOGLE_OAUTH2_SECRET')
+
+SOCIAL_AUTH_GITHUB_KEY = os.environ.get('SOCIAL_AUTH_GITHUB_KEY')
+SOCIAL_AUTH_GITHUB_SECRET = os.environ.get('SOCIAL_AUTH_GITHUB_SECRET')
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/4.1/topics/i18n/
+
+LANGUAGE_CODE = 'en-us'
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = True
+
+USE_TZ = True
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/4.1/howto/static-files/
+
+STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / "staticfiles"
+MEDIA_URL = 'media/'
+MEDIA_ROOT = os.path.join(BASE_DIR, '../../media/')
+
+#cloudinary
+cloudinary.config(
+    cloud_name=os.environ.get('CLOUD_NAME'),
+    api_key=os.environ.get('API_KEY'),
+    api_secret=os.environ.get('API_SECRET'),
+    secure=True,
+)
+
+CLOUDINARY_AVATAR_FOLDER = 'avatars'
+CLOUDINARY_MEDIA_FOLDER = 'image'
+
+# feed
+# Authors with more followers than FEED_FANOUT_LIMIT are not written into timelines, their posts are read on demand.
+FEED_FANOUT_LIMIT = int(os.environ.get('FEED_FANOUT_LIMIT', default=5000))
+FEED_BACKFILL_SIZE = int(os.environ.get('FEED_BACKFILL_SIZE', default=200))
+
+FOLLOW_SET_TIMEOUT = int(os.environ.get('FOLLOW_SET_TIMEOUT', default=60 * 60))
+# The caption, images and tags of a post card are cached per post version.
+POST_CARD_TIMEOUT = int(os.environ.get('POST_CARD_TIMEOUT', default=24 * 60 * 60))
+
+POSTS_PAGE_SIZE = int(os.environ.get('POSTS_PAGE_SIZE', default=20))
+COMMENTS_PAGE_SIZE = int(os.environ.get('COMMENTS_PAGE_SIZE', default=50))
+
+# likes
+# With LIKE_WRITE_BEHIND the post likes are buffered in the LIKE_BUFFER_CACHE cache and written in bulk
+# after LIKE_BUFFER_SIZE intents or LIKE_BUFFER_INTERVAL seconds. `flush_likes --loop`, the likes service
+# of docker-compose.prod.yaml, writes them every LIKE_BUFFER_INTERVAL seconds when no like comes.
+LIKE_WRITE_BEHIND = bool(int(os.environ.get('LIKE_WRITE_BEHIND', default=0)))
+LIKE_BUFFER_CACHE = os.environ.get('LIKE_BUFFER_CACHE', default='default')
+LIKE_BUFFER_SIZE = int(os.environ.get('LIKE_BUFFER_SIZE', default=500))
+LIKE_BUFFER_INTERVAL = float(os.environ.get('LIKE_BUFFER_INTERVAL', default=5))
+
+# Default primary key field type
+# https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+MAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_HOST = 'smtp.gmail.com'
+EMAIL_PORT = 587
+EMAIL_USE_TLS = True
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
+
+DEFAULT_FROM_EMAIL = 'John <jlite2023@gmail.com>'
+SERVER_EMAIL = 'John <jlite2023@gmail.com>'
+EMAIL_SUBJECT_PREFIX = 'Have a nice day to Djangogram!! '
+EMAIL_TIMEOUT = 5
+
+# CSRF_COOKIE_SECURE = True
+SESSION_COOKIE_SECURE = True
+
+SOCIAL_AUTH_URL_NAMESPACE = 'social'
+
+SOCIAL_AUTH_JSONFIELD_ENABLED = True
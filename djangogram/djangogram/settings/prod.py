@@ -0,0 +1,6 @@
+"""
+Production settings, no debugging tools are loaded.
+"""
+from .base import *  # noqa: F401,F403
+
+DEBUG = False
@@ -0,0 +1,18 @@
+"""
+Settings of the test runner: a local-memory cache and a fast password hasher.
+"""
+import os
+
+from .base import *  # noqa: F401,F403
+from .base import LOGGING
+
+SECRET_KEY = os.environ.get("SECRET_KEY", "test")
+
+CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'djangogram'}}
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+LOGGING['loggers']['webapp']['level'] = 'WARNING'
+
+# N+1 patterns and views going over their query budget fail the tests.
+QUERY_LOG_STRICT = True
@@ -15,8 +15,8 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from django.conf import settings
 from django.conf.urls.static import static
-from . import settings
 
 urlpatterns = [
 
@@ -28,7 +28,7 @@ urlpatterns = [
 if bool(settings.DEBUG):
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
-if settings.DEBUG:
+if 'debug_toolbar' in settings.INSTALLED_APPS:
     urlpatterns = [
         path('__debug__/', include('debug_toolbar.urls')),
     ]+urlpatterns
@@ -1,5 +1,5 @@
 $(document).ready(function () {
-    $('.like-ajax').click(function (event) {
+    $(document).on('click', '.like-ajax', function (event) {
         event.preventDefault();
         var form = $(this).closest('form')
         var url = form.attr('action');
@@ -24,8 +24,19 @@ $(document).ready(function () {
             }
         })
     })
+    $(document).on('click', '.load-more-ajax', function (event) {
+        event.preventDefault();
+        var container = $(this).closest('.load-more')
+        $.ajax({
+            type: 'GET', url: $(this).attr('href'), dataType: 'html', success: function (response) {
+                container.replaceWith(response);
+            }, error: function (xhr, textStatus, errorThrown) {
+                console.log(xhr.status + ': ' + xhr.statusText);
+            }
+        })
+    })
 })
-$('.subscribe-ajax').click(function (event) {
+$(document).on('click', '.subscribe-ajax', function (event) {
     event.preventDefault();
     var form = $(this).closest('form')
     var url = form.attr('action');
@@ -0,0 +1,58 @@
+"""
+Gunicorn settings, read from the working directory when the server starts.
+
+With the threaded worker every thread keeps its database connection open for `SQL_CONN_MAX_AGE` seconds,
+so the threads of a worker form its connection pool and the server holds at most `workers * threads`
+connections. The `webapp.db` logger reports how many connections each worker opened.
+
+With GUNICORN_ASGI=1 the server runs djangogram.asgi with uvicorn workers instead. The like, subscribe
+and feed views are async, so while they wait for the database they do not hold a worker. Their sync code
+runs in a new thread per request, which would leave its persistent connection open after the request, so
+`SQL_CONN_MAX_AGE` defaults to 0 under ASGI and every request closes its connections. Set `SQL_POOL_SIZE`
+to return those connections to a pool of the worker instead of closing them (webapp.pooled_postgresql),
+so requests still skip the connection setup.
+
+The workers write their Prometheus metrics to files in `PROMETHEUS_MULTIPROC_DIR`, which is emptied when
+the server starts, so `/metrics` reports the totals of all workers whichever of them answers.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+asgi = bool(int(os.environ.get('GUNICORN_ASGI', 0)))
+
+wsgi_app = 'djangogram.asgi:application' if asgi else 'djangogram.wsgi:application'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'uvicorn.workers.UvicornWorker' if asgi else 'gthread')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# Restarting workers now and then bounds memory growth, the jitter keeps them from restarting together.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+if asgi and 'SQL_CONN_MAX_AGE' not in os.environ:
+    # Under ASGI the sync parts of a request run in a thread of its own, persistent connections would leak.
+    # SQL_POOL_SIZE keeps the closed connections for the next requests.
+    raw_env = ['SQL_CONN_MAX_AGE=0']
+
+metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR',
+                                    os.path.join(tempfile.gettempdir(), 'djangogram-metrics'))
+
+
+def on_starting(server):
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def post_worker_init(worker):
+    # Runs before the worker accepts connections, so it only takes traffic once warm.
+    from webapp import warmup
+
+    warmup.run()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
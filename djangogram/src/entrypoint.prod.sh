@@ -1,17 +1,13 @@
 #!/bin/sh
+set -e
 
-if [ "$DATABASE" = "postgres" ]
+# Waits for the database and fails fast on unapplied migrations. With MIGRATE_ON_START=1 the migrations
+# are applied instead, one replica at a time. The data is never flushed.
+if [ "$MIGRATE_ON_START" = "1" ]
 then
-    echo "Waiting for postgres..."
-
-    while ! nc -z $SQL_HOST $SQL_PORT; do
-      sleep 0.1
-    done
-
-    echo "PostgreSQL started"
+    python manage.py prestart --migrate
+else
+    python manage.py prestart
 fi
 
-python manage.py flush --no-input
-python manage.py migrate
-
 exec "$@"
@@ -0,0 +1,60 @@
+import contextvars
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import TestCase
+
+from webapp.cache import CacheNamespace, collect, get_stats
+
+
+class TestCacheNamespace(TestCase):
+    def setUp(self):
+        """
+        Set up an empty namespace in the local-memory cache.
+        """
+        cache.clear()
+        self.namespace = CacheNamespace('test')
+
+    def test_get_or_set(self):
+        """
+        Test that the value is computed once, counted as a miss and then as a hit.
+        """
+        compute = mock.Mock(return_value=[1, 2])
+        self.assertEqual(self.namespace.get_or_set('key', compute, 60), [1, 2])
+        self.assertEqual(self.namespace.get_or_set('key', compute, 60), [1, 2])
+        compute.assert_called_once()
+        self.assertEqual(get_stats()['test'], {'hits': 1, 'misses': 1})
+
+    def test_collect_counts_its_own_context(self):
+        """
+        Test that the stats opened with `collect()` count the hits and misses of their block and context only,
+        including the async lookups.
+        """
+        self.namespace.set('key', 'value', 60)
+        with collect() as stats:
+            self.namespace.get('key')
+            async_to_sync(self.namespace.aget_many)(['key', 'missing'])
+            contextvars.Context().run(self.namespace.get, 'key')
+        self.namespace.get('key')
+        self.assertEqual((stats.hits, stats.misses), (2, 1))
+
+    def test_versions_and_prefixes_are_separate(self):
+        """
+        Test that namespaces with another name or version do not see each other's values.
+        """
+        self.namespace.set('key', 'value', 60)
+        self.assertEqual(self.namespace.get('key'), 'value')
+        self.assertIsNone(CacheNamespace('test', version=2).get('key'))
+        self.assertIsNone(CacheNamespace('other').get('key'))
+        self.namespace.delete('key')
+        self.assertIsNone(self.namespace.get('key'))
+
+    def test_early_expiration(self):
+        """
+        Test that a slow value close to its expiry is refreshed early, and never with early refreshes disabled.
+        """
+        self.namespace.set('key', 'value', 1, delta=10)
+        with mock.patch('random.random', return_value=0.9):
+            self.assertIsNone(self.namespace.get('key'))
+            self.assertEqual(CacheNamespace('test', beta=0).get('key'), 'value')
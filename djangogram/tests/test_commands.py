@@ -0,0 +1,215 @@
+import json
+import os
+import statistics
+from io import StringIO
+from tempfile import TemporaryDirectory
+
+from django.contrib.auth.models import User
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models import Count, Sum
+from django.test import TestCase, TransactionTestCase, LiveServerTestCase
+
+from webapp.models import UserProfile, Post, TimelineEntry, Comment, PostLike, Subscription, FollowerCount
+
+
+class TestBackfillTimelinesCommand(TestCase):
+    def setUp(self):
+        """
+        Set up a follower subscribed to an author with two posts and an empty timeline.
+        """
+        self.follower = User.objects.create_user(username='follower', password='testpass')
+        self.author = User.objects.create_user(username='author', password='testpass')
+        self.profile = UserProfile.objects.create(user=self.follower, full_name='Follower')
+        Subscription.objects.create(user=self.follower, subscribed_to=self.author)
+        self.post1 = Post.objects.create(author=self.author, caption='Post 1')
+        self.post2 = Post.objects.create(author=self.author, caption='Post 2')
+
+    def test_backfill_timelines(self):
+        """
+        Test that the command writes the posts of the subscriptions into the timeline
+        and that running it twice does not duplicate entries.
+        """
+        call_command('backfill_timelines', verbosity=0)
+        call_command('backfill_timelines', verbosity=0)
+        entries = TimelineEntry.objects.filter(owner=self.follower)
+        self.assertEqual(entries.count(), 2)
+        self.assertEqual(list(Post.objects.get_feed_posts(self.follower)), [self.post2, self.post1])
+
+    def test_backfill_followers_without_profile(self):
+        """
+        Test that the timelines of followers without a profile are rebuilt too.
+        """
+        follower = User.objects.create_user(username='social', password='testpass')
+        Subscription.objects.create(user=follower, subscribed_to=self.author)
+        call_command('backfill_timelines', verbosity=0)
+        self.assertEqual(TimelineEntry.objects.filter(owner=follower).count(), 2)
+
+
+class TestFakeDataCommand(TestCase):
+    def test_fake_data(self):
+        """
+        Test that the command creates the requested rows with consistent counters, users who can log in,
+        and a few popular authors followed far more than the median one.
+        """
+        output = StringIO()
+        call_command('fake_data', users=30, posts=60, comments=40, likes=300, follows=300, batch_size=25, seed=1,
+                     stdout=output)
+        self.assertEqual((User.objects.count(), UserProfile.objects.count(), Post.objects.count(),
+                          Comment.objects.count()), (30, 30, 60, 40))
+        self.assertEqual(Post.objects.aggregate(likes=Sum('like_count'))['likes'], PostLike.objects.count())
+        self.assertTrue(self.client.login(username=User.objects.first().username, password='password123'))
+        followers = Subscription.objects.values('subscribed_to').annotate(count=Count('*')).values_list(
+            'count', flat=True)
+        self.assertGreater(max(followers), 3 * statistics.median(followers))
+        self.assertIn('Successfully populated', output.getvalue())
+
+    def test_workers_need_database_server(self):
+        """
+        Test that several workers are refused on SQLite.
+        """
+        with self.assertRaises(CommandError):
+            call_command('fake_data', workers=2, stdout=StringIO())
+
+
+class TestPrestartCommand(TestCase):
+    def test_prestart(self):
+        """
+        Test that the command passes when every migration is applied, fails on an unapplied migration
+        and applies it with --migrate.
+        """
+        output = StringIO()
+        call_command('prestart', stdout=output)
+        self.assertIn('0 migrations applied', output.getvalue())
+
+        _, name = max(MigrationLoader(connection).graph.leaf_nodes('webapp'))
+        MigrationRecorder(connection).record_unapplied('webapp', name)
+        with self.assertRaisesMessage(CommandError, f'webapp.{name}'):
+            call_command('prestart', stdout=StringIO())
+        MigrationRecorder(connection).record_applied('webapp', name)
+
+
+class TestRecountCommand(TestCase):
+    def test_recount(self):
+        """
+        Test that the command repairs counters that drifted from the actual likes, comments and followers.
+        """
+        author = User.objects.create_user(username='author', password='testpass')
+        post = Post.objects.create(author=author, caption='Post', like_count=5, comment_count=5)
+        comment = Comment.objects.create(user=author, post=post, content='Comment', like_count=3)
+        PostLike.objects.create(post=post, user=author)
+        Subscription.objects.create(user=User.objects.create_user(username='follower'), subscribed_to=author)
+        call_command('recount', stdout=StringIO())
+        post.refresh_from_db()
+        comment.refresh_from_db()
+        self.assertEqual((post.like_count, post.comment_count), (1, 1))
+        self.assertEqual(comment.like_count, 0)
+        self.assertEqual(FollowerCount.objects.get(user=author).count, 1)
+
+
+class TestExplainQueriesCommand(TransactionTestCase):
+    def test_explain_queries(self):
+        """
+        Test that the command seeds data and writes the plan of every query with and without the indexes.
+        """
+        output = StringIO()
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'plans.json')
+            call_command('explain_queries', seed=100, compare=True, output=path, stdout=output)
+            with open(path) as file:
+                plans = json.load(file)
+        self.assertIn('home', plans['queries'])
+        self.assertIn('plan_without_indexes', plans['queries']['comments'])
+        self.assertIn('Successfully explained', output.getvalue())
+
+
+class TestMeasureStartupCommand(TestCase):
+    def test_measure_startup(self):
+        """
+        Test that the command reports the startup phases and fails over the time limit.
+        """
+        output = StringIO()
+        call_command('measure_startup', 'djangogram.settings.test', repeat=1, stdout=output)
+        self.assertIn('setup:', output.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('measure_startup', 'djangogram.settings.test', repeat=1, max_seconds=0, stdout=StringIO())
+
+
+class TestBenchmarkCommand(TestCase):
+    def test_benchmark(self):
+        """
+        Test that the command measures the scenarios on a seeded dataset, saves them as the baseline
+        and fails when a scenario runs more queries than its baseline or the budget of its view.
+        """
+        options = {'current_database': True, 'scale': 0.01, 'iterations': 3, 'warmup': 1}
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            output = StringIO()
+            call_command('benchmark', 'home', 'like-post', baseline=path, save_baseline=True, stdout=output,
+                         **options)
+            with open(path) as file:
+                baseline = json.load(file)
+            self.assertEqual(set(baseline), {'home', 'like-post'})
+            self.assertGreater(baseline['like-post']['queries'], 0)
+            self.assertIn('Successfully benchmarked 2 scenarios', output.getvalue())
+
+            baseline['like-post']['queries'] = 0
+            with open(path, 'w') as file:
+                json.dump(baseline, file)
+            output = StringIO()
+            with self.assertRaisesMessage(CommandError, 'like-post ran'):
+                call_command('benchmark', 'home', 'like-post', baseline=path, tolerance=100, stdout=output,
+                             **options)
+            self.assertIn('Latency not compared', output.getvalue())
+
+            with self.settings(QUERY_BUDGETS={'like-post': 0}, QUERY_LOG_STRICT=False), \
+                    self.assertRaisesMessage(CommandError, 'over the budget'):
+                call_command('benchmark', 'like-post', baseline=path, save_baseline=True, stdout=StringIO(),
+                             **options)
+
+    def test_benchmark_latency(self):
+        """
+        Test that a latency regression only warns, unless the command is asked to fail on it.
+        """
+        options = {'current_database': True, 'scale': 0.01, 'iterations': 20, 'warmup': 1}
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            call_command('benchmark', 'home', baseline=path, save_baseline=True, stdout=StringIO(), **options)
+            with open(path) as file:
+                baseline = json.load(file)
+            self.assertGreater(baseline['home']['p95_relative'], 0)
+
+            baseline['home']['p95_relative'] = 0.0001
+            with open(path, 'w') as file:
+                json.dump(baseline, file)
+            errors = StringIO()
+            call_command('benchmark', 'home', baseline=path, stdout=StringIO(), stderr=errors, **options)
+            self.assertIn('home p95 is', errors.getvalue())
+            with self.assertRaisesMessage(CommandError, 'home p95 is'):
+                call_command('benchmark', 'home', baseline=path, fail_on_latency=True, stdout=StringIO(), **options)
+
+
+class TestReplayTraceCommand(LiveServerTestCase):
+    def test_replay_trace(self):
+        """
+        Test that the sample trace is replayed against a running server with its ids mapped to the seeded data,
+        and that every request gets the status code of the trace.
+        """
+        call_command('fake_data', users=10, posts=20, comments=20, likes=50, follows=30, stdout=StringIO())
+        trace = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'benchmarks', 'traces', 'browse.jsonl')
+        output = StringIO()
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'summary.json')
+            # The live server shares one in-memory SQLite connection between its threads, one virtual user at a
+            # time keeps their transactions apart.
+            call_command('replay_trace', trace, url=self.live_server_url, concurrency=1, output=path, stdout=output)
+            with open(path) as file:
+                summary = json.load(file)[self.live_server_url]
+        self.assertEqual(summary['total']['requests'], 58)
+        self.assertEqual(summary['total']['error_rate'], 0)
+        self.assertEqual(summary['feed']['statuses'], {'200': 4})
+        self.assertEqual(summary['like-post']['statuses'], {'200': 12})
+        self.assertEqual(summary['login']['statuses'], {'200': 4, '302': 4})
+        self.assertIn('Successfully replayed 58 requests', output.getvalue())
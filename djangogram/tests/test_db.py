@@ -0,0 +1,144 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import TestCase, RequestFactory, override_settings
+from django.urls import reverse
+
+from webapp import db, queries, querylog
+from webapp.middleware import ReplicaMiddleware
+from webapp.models import Post
+from webapp.routers import ReplicaRouter
+
+
+class TestConnectionStats(TestCase):
+    def test_connections_and_requests_are_counted(self):
+        """
+        Test that requests and new connections are counted and that a new connection is logged.
+        """
+        before = db.get_stats()
+        self.client.get(reverse('login'))
+        with self.assertLogs('webapp.db', 'INFO') as logs:
+            connection_created.send(sender=type(connection), connection=connection)
+        after = db.get_stats()
+        self.assertEqual(after['requests'], before['requests'] + 1)
+        self.assertEqual(after['opened'], before['opened'] + 1)
+        self.assertIn(f"{after['opened']} connections opened for {after['requests']} requests", logs.output[0])
+
+    def test_pooled_connections_are_counted_as_reused(self):
+        """
+        Test that a connection taken from the pool is counted as reused and not logged as opened.
+        """
+        before = db.get_stats()
+        connection.reused_from_pool = True
+        try:
+            with self.assertNoLogs('webapp.db', 'INFO'):
+                connection_created.send(sender=type(connection), connection=connection)
+        finally:
+            del connection.reused_from_pool
+        after = db.get_stats()
+        self.assertEqual((after['opened'], after['reused']), (before['opened'], before['reused'] + 1))
+
+    def test_pool_lends_the_latest_connection(self):
+        """
+        Test that the pool lends the most recently returned connection first and keeps at most its size.
+        """
+        pool = db.ConnectionPool(2)
+        self.assertIsNone(pool.get())
+        self.assertTrue(pool.put('first'))
+        self.assertTrue(pool.put('second'))
+        self.assertFalse(pool.put('third'))
+        self.assertEqual([pool.get(), pool.get(), pool.get()], ['second', 'first', None])
+
+
+@override_settings(REPLICA_DATABASES=['replica1'])
+class TestReplicaRouter(TestCase):
+    def setUp(self):
+        """
+        Set up a middleware whose view records the database the router picks for reading posts.
+        """
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+        self.middleware = ReplicaMiddleware(self.get_response)
+
+    def get_response(self, request):
+        self.read_db = self.router.db_for_read(Post)
+        return HttpResponse()
+
+    def test_get_reads_from_replica(self):
+        """
+        Test that GET requests read from the replica while writes and POST requests use the primary.
+        """
+        self.middleware(self.factory.get('/'))
+        self.assertEqual(self.read_db, 'replica1')
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+        self.middleware(self.factory.post('/'))
+        self.assertEqual(self.read_db, 'default')
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_reads_are_pinned_after_post(self):
+        """
+        Test that a POST pins the following reads of the user to the primary for a short window.
+        """
+        response = self.middleware(self.factory.post('/'))
+        cookie = response.cookies[ReplicaMiddleware.PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], 5)
+        request = self.factory.get('/')
+        request.COOKIES[ReplicaMiddleware.PIN_COOKIE] = cookie.value
+        self.middleware(request)
+        self.assertEqual(self.read_db, 'default')
+
+
+class TestQueryLog(TestCase):
+    def setUp(self):
+        """
+        Set up a few posts whose authors are loaded one by one, and a query log to collect their queries.
+        """
+        author = User.objects.create_user(username='author', password='testpass')
+        Post.objects.bulk_create(Post(caption=f'Post {number}', author=author) for number in range(5))
+        self.log = querylog.QueryLog(RequestFactory().get('/'))
+        self.token = queries.current_stats.set((self.log,))
+
+    def tearDown(self):
+        queries.current_stats.reset(self.token)
+
+    def test_shape_ignores_parameters(self):
+        """
+        Test that queries differing only by their literals and the length of their IN lists have the same shape.
+        """
+        self.assertEqual(querylog.get_shape("SELECT * FROM post WHERE id IN (%s, %s) AND caption = 'a' LIMIT 21"),
+                         querylog.get_shape("SELECT * FROM post\n WHERE id IN (%s, %s, %s) AND caption = 'b' LIMIT 1"))
+
+    def test_repeated_queries_are_reported_with_template_line(self):
+        """
+        Test that the author queries run by a template loop are reported once as an N+1 pattern,
+        with the template line and the line of code that rendered it.
+        """
+        template = Template('{% for post in posts %}\n{{ post.author.username }}\n{% endfor %}')
+        template.render(Context({'posts': Post.objects.all()}))
+        problems = self.log.get_problems()
+        self.assertEqual(len(problems), 1)
+        self.assertIn('N+1 in / from None:2, tests/test_db.py:', problems[0])
+        self.assertIn('5 queries like SELECT', problems[0])
+
+    def test_slow_queries_are_logged(self):
+        """
+        Test that the queries over SLOW_QUERY_MS are logged with the line that ran them.
+        """
+        with self.settings(SLOW_QUERY_MS=0.000001), self.assertLogs('webapp.querylog', 'WARNING') as logs:
+            Post.objects.count()
+        self.assertIn('Slow query', logs.output[0])
+        self.assertIn('tests/test_db.py:', logs.output[0])
+
+    def test_budget_is_enforced_in_tests(self):
+        """
+        Test that a view running more queries than its budget fails the request in strict mode
+        and is only logged otherwise.
+        """
+        self.client.login(username='author', password='testpass')
+        with self.settings(QUERY_BUDGETS={'posts': 0}):
+            with self.assertRaisesMessage(querylog.QueryBudgetExceeded, 'over its budget of 0'):
+                self.client.get(reverse('posts'))
+            with self.settings(QUERY_LOG_STRICT=False), self.assertLogs('webapp.querylog', 'WARNING'):
+                self.assertEqual(self.client.get(reverse('posts')).status_code, 200)
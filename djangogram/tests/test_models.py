@@ -1,8 +1,13 @@
+from unittest import skipUnless
+
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
 
 from webapp.models import UserProfile, Post, PostImage, Tag, PostTag, PostLike, Comment, CommentTag, CommentLike, \
-    Subscription
+    Subscription, FollowerCount
+from webapp.follows import FollowSet, invalidate
 
 
 class ModelTests(TestCase):
@@ -138,3 +143,71 @@ class ModelTests(TestCase):
         self.assertEqual(str(self.comment_like), 'CommentLike object (1)')
         self.assertEqual(self.comment_like.comment, self.comment)
         self.assertEqual(self.comment_like.user, self.user3)
+
+    def test_post_like_toggle(self):
+        """
+        Test that toggling a like adds and removes exactly one like and keeps the counter in sync.
+        """
+        Post.objects.filter(pk=self.post.pk).update(like_count=1)
+        self.assertEqual(PostLike.objects.toggle(self.post.pk, self.user3), (True, 2))
+        self.assertEqual(PostLike.objects.toggle(self.post.pk, self.user3), (False, 1))
+        self.assertEqual(self.post.likes.count(), 1)
+
+    def test_unlike_with_drifted_counter(self):
+        """
+        Test that unliking a post whose counter drifted to 0 keeps the counter at 0 instead of failing.
+        """
+        PostLike.objects.create(post=self.post, user=self.user3)
+        self.assertEqual(PostLike.objects.toggle(self.post.pk, self.user3), (False, 0))
+        self.assertFalse(self.post.likes.filter(user=self.user3).exists())
+
+    def test_unsubscribe_with_drifted_follower_count(self):
+        """
+        Test that unsubscribing from a user whose follower count drifted to 0 keeps the count at 0 instead of failing.
+        """
+        FollowerCount.objects.create(user=self.user2, count=0)
+        self.assertFalse(Subscription.objects.toggle(self.user, self.user2.pk))
+        self.assertEqual(FollowerCount.objects.get(user=self.user2).count, 0)
+
+    @skipUnless(connection.vendor == 'postgresql', 'The toggles are a single statement on PostgreSQL only')
+    def test_toggles_are_one_statement(self):
+        """
+        Test that the like and subscription toggles each run a single query on PostgreSQL.
+        """
+        with self.assertNumQueries(1):
+            self.assertEqual(PostLike.objects.toggle(self.post.pk, self.user3), (True, 1))
+        with self.assertNumQueries(1):
+            self.assertTrue(Subscription.objects.toggle(self.user3, self.user.pk))
+
+    def test_duplicate_like_is_rejected(self):
+        """
+        Test that the same user cannot like the same post or comment twice.
+        """
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            PostLike.objects.create(post=self.post, user=self.user2)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CommentLike.objects.create(comment=self.comment, user=self.user3)
+
+    def test_follow_set(self):
+        """
+        Test that the follow set is read from the cache until it is invalidated.
+        """
+        cache.clear()
+        self.assertIn(self.user2.id, FollowSet(self.user.id))
+        Subscription.objects.create(user=self.user, subscribed_to=self.user3)
+        with self.assertNumQueries(0):
+            self.assertEqual(list(FollowSet(self.user.id)), [self.user2.id])
+        invalidate(self.user.id)
+        self.assertEqual(list(FollowSet(self.user.id)), [self.user2.id, self.user3.id])
+        self.assertFalse(FollowSet(None))
+
+    def test_subscription_indexes_are_not_duplicated(self):
+        """
+        Test that the subscription table is indexed only by the unique constraint and the subscribers index,
+        each covering the lookups of one foreign key.
+        """
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Subscription._meta.db_table)
+        indexed = sorted(tuple(constraint['columns']) for constraint in constraints.values()
+                         if constraint['index'] or (constraint['unique'] and not constraint['primary_key']))
+        self.assertEqual(indexed, [('subscribed_to_id', 'user_id'), ('user_id', 'subscribed_to_id')])
@@ -1,12 +1,28 @@
+import base64
+import contextvars
 import json
-
+import os
+import time
+from datetime import datetime
+from io import StringIO
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from asgiref.sync import sync_to_async
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase, Client
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, Client, AsyncClient, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
 from webapp.forms import RegisterForm, LoginForm, PostForm, CommentForm, PostImageForm, BioForm, PostTagForm
-from webapp.models import Post, Comment, Tag, UserProfile, PostTag, CommentTag, PostImage, Subscription
+from webapp.models import Post, Comment, Tag, UserProfile, PostTag, CommentTag, PostImage, Subscription, \
+    TimelineEntry, PostLike, CommentLike, FollowerCount
+from webapp import backends, health, like_buffer, metrics, profiling, tracing, warmup
 
 
 class TestSignUpView(TestCase):
@@ -72,6 +88,50 @@ class TestSignInView(TestCase):
         self.assertEqual(response.status_code, 302)
         self.assertRedirects(response, reverse('posts'))
 
+    def test_session_and_user_are_cached(self):
+        """
+        Test that after signing in the session and the user are read from the cache without queries,
+        and that deactivating the user ends the session on the next request.
+        """
+        cache.clear()
+        self.client.post(self.login_url, {'username': 'testuser', 'password': 'testpassword123'})
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('user-bio-create'))
+        self.assertEqual(response.status_code, 200)
+
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(reverse('user-bio-create'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_cached_user_has_no_password_hash(self):
+        """
+        Test that the cached user holds the session auth hash instead of the password hash, and that a password
+        change ends the session on the next request.
+        """
+        cache.clear()
+        self.client.post(self.login_url, {'username': 'testuser', 'password': 'testpassword123'})
+        self.client.get(reverse('user-bio-create'))
+        self.assertNotIn(self.user.password, str(backends.users.get(self.user.pk)))
+
+        self.user.set_password('newpassword123')
+        self.user.save()
+        response = self.client.get(reverse('user-bio-create'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_update_is_seen_after_invalidation(self):
+        """
+        Test that a deactivation with `QuerySet.update()`, which sends no signal, is only seen once the cached user
+        is invalidated.
+        """
+        cache.clear()
+        self.client.post(self.login_url, {'username': 'testuser', 'password': 'testpassword123'})
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get(reverse('user-bio-create')).status_code, 200)
+
+        backends.invalidate_users([self.user.pk])
+        self.assertEqual(self.client.get(reverse('user-bio-create')).status_code, 302)
+
 
 class TestSingOutView(TestCase):
     def setUp(self):
@@ -103,6 +163,7 @@ class TestSubscribeView(TestCase):
         """
         Set up the necessary objects and variables for testing.
         """
+        cache.clear()
         self.client = Client()
         self.user = User.objects.create_user(username='testuser', password='testpass')
         self.user_profile = UserProfile.objects.create(user=self.user, full_name='Test User')
@@ -133,6 +194,40 @@ class TestSubscribeView(TestCase):
         self.assertTrue(self.user.profile.subscriptions.filter(id=self.user_to_subscribe.id).exists())
         self.assertTrue(Subscription.objects.filter(user=self.user, subscribed_to=self.user_to_subscribe).exists())
 
+    def test_unsubscribe_post_successfully(self):
+        """
+        Test that a second POST removes the subscription and that the follow edge is stored only once.
+        """
+        self.client.login(username='testuser', password='testpass')
+        self.client.post(self.url)
+        self.assertEqual(Subscription.objects.filter(user=self.user).count(), 1)
+        response = self.client.post(self.url)
+        self.assertEqual(json.loads(response.content)['is_subscribed'], False)
+        self.assertFalse(self.user.profile.subscriptions.exists())
+        self.assertFalse(Subscription.objects.exists())
+        self.assertEqual(FollowerCount.objects.get(user=self.user_to_subscribe).count, 0)
+
+    def test_subscribe_invalidates_follow_set(self):
+        """
+        Test that the cached follow set used by the post cards is refreshed after subscribing.
+        """
+        Post.objects.create(author=self.user_to_subscribe, caption='Post')
+        self.client.login(username='testuser', password='testpass')
+        self.assertContains(self.client.get(reverse('posts')), '>Subscribed</button>')
+        self.client.post(self.url)
+        response = self.client.get(reverse('posts'))
+        self.assertContains(response, '>Unsubscribed</button>')
+        self.assertIn(self.user_to_subscribe.id, response.wsgi_request.user.following_ids)
+
+    def test_subscribe_to_missing_user(self):
+        """
+        Test that subscribing to a user that does not exist returns 404 and stores nothing.
+        """
+        self.client.login(username='testuser', password='testpass')
+        response = self.client.post(reverse('subscribe', args=[self.user_to_subscribe.id + 100]))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Subscription.objects.exists())
+
 
 class TestFeedViewCase(TestCase):
     def setUp(self):
@@ -141,6 +236,7 @@ class TestFeedViewCase(TestCase):
         a user instance with the username 'testuser' and password 'testpass',
         and a user profile instance with the full name 'Test User'.
         """
+        cache.clear()
         self.client = Client()
         self.user = User.objects.create_user(username='testuser', password='testpass')
         self.user_profile = UserProfile.objects.create(user=self.user, full_name='Test User')
@@ -169,6 +265,92 @@ class TestFeedViewCase(TestCase):
         response = self.client.get(reverse('feed'))
         self.assertEqual(response.status_code, 200)
 
+    def test_feed_shows_posts_of_subscriptions(self):
+        """
+        Test that posts are fanned out to the timelines of the subscribers.
+        The test user subscribes to an author through the subscribe view, the author creates
+        a post, and the post is expected in the feed. After unsubscribing the feed is empty again.
+        """
+        author = User.objects.create_user(username='author', password='testpass')
+        old_post = Post.objects.create(author=author, caption='Old post')
+        self.client.login(username='testuser', password='testpass')
+        self.client.post(reverse('subscribe', args=[author.id]))
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.user, post=old_post).exists())
+
+        author_client = Client()
+        author_client.login(username='author', password='testpass')
+        author_client.post(reverse('post-create'), {'caption': 'New post', 'name': ''})
+        new_post = Post.objects.get(caption='New post')
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.user, post=new_post).exists())
+        self.assertEqual(list(Post.objects.get_feed_posts(self.user)), [new_post, old_post])
+
+        self.client.post(reverse('subscribe', args=[author.id]))
+        response = self.client.get(reverse('feed'))
+        self.assertQuerysetEqual(response.context['posts'], [])
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_feed_reads_high_fanout_authors(self):
+        """
+        Test that posts of authors over the fan-out limit are not written to timelines
+        but are still shown in the feed.
+        """
+        author = User.objects.create_user(username='author', password='testpass')
+        Subscription.objects.toggle(self.user, author.pk)
+        post = Post.objects.create(author=author, caption='Popular post')
+        TimelineEntry.objects.fan_out(post)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.client.login(username='testuser', password='testpass')
+        response = self.client.get(reverse('feed'))
+        self.assertEqual(list(response.context['posts']), [post])
+
+    @override_settings(POSTS_PAGE_SIZE=2)
+    def test_feed_merges_high_fanout_authors_by_page(self):
+        """
+        Test that the pages of the feed merge the timeline with the posts of the authors over the fan-out
+        limit in date order, and that an author crossing the limit switches from the timeline to reads.
+        """
+        author = User.objects.create_user(username='author', password='testpass')
+        popular = User.objects.create_user(username='popular', password='testpass')
+        fan = User.objects.create_user(username='fan', password='testpass')
+        Subscription.objects.toggle(self.user, author.pk)
+        Subscription.objects.toggle(self.user, popular.pk)
+        posts = []
+        with self.settings(FEED_FANOUT_LIMIT=1):
+            for index in range(3):
+                for post_author in (author, popular):
+                    post = Post.objects.create(author=post_author, caption=f'Post {index}')
+                    TimelineEntry.objects.fan_out(post)
+                    posts.insert(0, post)
+            self.assertEqual(TimelineEntry.objects.count(), 6)
+            Subscription.objects.toggle(fan, popular.pk)
+            post = Post.objects.create(author=popular, caption='Popular post')
+            TimelineEntry.objects.fan_out(post)
+            posts.insert(0, post)
+            self.assertEqual(TimelineEntry.objects.count(), 6)
+
+            self.client.login(username='testuser', password='testpass')
+            feed = []
+            cursor = None
+            while True:
+                response = self.client.get(reverse('feed'), {'cursor': cursor} if cursor else {})
+                feed += response.context['posts']
+                cursor = response.context['next_cursor']
+                if not cursor:
+                    break
+        self.assertEqual(feed, posts)
+
+    def test_feed_reads_the_timeline_only(self):
+        """
+        Test that the feed does not count the followers of the followed authors.
+        """
+        author = User.objects.create_user(username='author', password='testpass')
+        Subscription.objects.toggle(self.user, author.pk)
+        TimelineEntry.objects.follow(self.user, author)
+        self.client.login(username='testuser', password='testpass')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('feed'))
+        self.assertFalse([query for query in queries if 'webapp_subscription' in query['sql']])
+
 
 class TestHomeView(TestCase):
     def setUp(self):
@@ -182,6 +364,7 @@ class TestHomeView(TestCase):
         with the caption 'Test Post' and author set to the created user using
         the `Post.objects.create` method.
         """
+        cache.clear()
         self.client = Client()
         self.user = User.objects.create_user(username='testuser', password='12345')
         self.client.login(username='testuser', password='12345')
@@ -211,6 +394,90 @@ class TestHomeView(TestCase):
         self.assertEqual(response.status_code, 302)
         self.assertRedirects(response, '/accounts/login/?next=%2F')
 
+    @override_settings(POSTS_PAGE_SIZE=2)
+    def test_home_view_cursor_pagination(self):
+        """
+        Test that the home view is paginated by cursor.
+        The first page contains the two newest posts and a cursor, the ajax request for the
+        cursor returns only the posts fragment with the remaining post and no further cursor.
+        """
+        post2 = Post.objects.create(caption='Test Post 2', author=self.user)
+        post3 = Post.objects.create(caption='Test Post 3', author=self.user)
+        response = self.client.get(reverse('posts'))
+        self.assertEqual(response.context['posts'], [post3, post2])
+        self.assertIsNotNone(response.context['next_cursor'])
+
+        response = self.client.get(reverse('posts'), {'cursor': response.context['next_cursor']},
+                                   HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertTemplateUsed(response, 'webapp/posts_page.html')
+        self.assertTemplateNotUsed(response, 'webapp/home.html')
+        self.assertEqual(response.context['posts'], [self.post])
+        self.assertIsNone(response.context['next_cursor'])
+
+    @override_settings(POSTS_PAGE_SIZE=1000)
+    def test_home_view_query_count_is_constant(self):
+        """
+        Test that rendering the home page takes the same number of queries for 10 and for 1000 posts.
+        Every post has an author that the user follows, an image, a tag and a like, so any per-post
+        lookup in the post card would change the query count.
+        """
+        author = User.objects.create_user(username='author', password='12345')
+        Subscription.objects.create(user=self.user, subscribed_to=author)
+        tag = Tag.objects.create(name='tag')
+
+        def create_posts(count):
+            posts = Post.objects.bulk_create([Post(author=author, caption='Post') for _ in range(count)])
+            PostImage.objects.bulk_create([PostImage(post=post) for post in posts])
+            PostTag.objects.bulk_create([PostTag(post=post, tag=tag) for post in posts])
+            PostLike.objects.bulk_create([PostLike(post=post, user=self.user) for post in posts])
+
+        create_posts(9)
+        cache.clear()
+        with CaptureQueriesContext(connection) as small_page:
+            response = self.client.get(reverse('posts'))
+        self.assertEqual(len(response.context['posts']), 10)
+        create_posts(990)
+        cache.clear()
+        with CaptureQueriesContext(connection) as large_page:
+            response = self.client.get(reverse('posts'))
+        self.assertEqual(len(response.context['posts']), 1000)
+        self.assertEqual(len(small_page.captured_queries), len(large_page.captured_queries))
+
+    def test_home_view_caches_post_cards(self):
+        """
+        Test that the caption, images and tags of a post card are read from the cache on repeat views
+        and rendered again after the post is edited.
+        """
+        PostTag.objects.create(post=self.post, tag=Tag.objects.create(name='tag'))
+        PostImage.objects.create(post=self.post)
+        self.client.get(reverse('posts'))
+        with CaptureQueriesContext(connection) as repeat_view:
+            response = self.client.get(reverse('posts'))
+        self.assertContains(response, '#tag')
+        self.assertFalse([query for query in repeat_view.captured_queries if 'webapp_posttag' in query['sql']])
+
+        self.client.post(reverse('post-edit', args=[self.post.pk]), {'caption': 'Edited Post', 'name': 'new'})
+        response = self.client.get(reverse('posts'))
+        self.assertContains(response, 'Edited Post')
+        self.assertContains(response, '#new')
+
+    def test_home_view_invalid_cursor(self):
+        """
+        Test that a malformed cursor results in a 404 response.
+        """
+        response = self.client.get(reverse('posts'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_home_view_out_of_range_cursor(self):
+        """
+        Test that a well-formed cursor holding an id beyond the range of the database, or a naive timestamp,
+        results in a 404 response.
+        """
+        for value in [f'{timezone.now().isoformat()}|{2 ** 64}', f'{datetime(2024, 1, 1).isoformat()}|1']:
+            cursor = base64.urlsafe_b64encode(value.encode()).decode()
+            response = self.client.get(reverse('posts'), {'cursor': cursor})
+            self.assertEqual(response.status_code, 404)
+
 
 class TestLikePostView(TestCase):
     def setUp(self):
@@ -250,6 +517,44 @@ class TestLikePostView(TestCase):
         self.assertEqual(data['likes_count'], 1)
         self.assertEqual(self.post.likes.count(), 1)
 
+    def test_unlike_post_updates_counter(self):
+        """
+        Test that liking and then unliking a post keeps the like counter of the post in sync.
+        """
+        client = Client()
+        client.login(username='testuser', password='password123')
+        client.post(reverse('like-post', args=[self.post.id]))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        response = client.post(reverse('like-post', args=[self.post.id]))
+        data = json.loads(response.content)
+        self.assertEqual(data['is_liked'], False)
+        self.assertEqual(data['likes_count'], 0)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+    async def test_like_post_async(self):
+        """
+        Test that the like view answers requests served through ASGI and redirects anonymous users.
+        """
+        client = AsyncClient()
+        response = await client.post(reverse('like-post', args=[self.post.id]))
+        self.assertEqual(response.status_code, 302)
+        await sync_to_async(client.force_login)(self.user)
+        response = await client.post(reverse('like-post', args=[self.post.id]))
+        self.assertEqual(json.loads(response.content), {'is_liked': True, 'likes_count': 1})
+        self.assertEqual(await self.post.likes.acount(), 1)
+
+    def test_like_missing_post(self):
+        """
+        Test that liking a post that does not exist returns 404 and stores no like.
+        """
+        client = Client()
+        client.login(username='testuser', password='password123')
+        response = client.post(reverse('like-post', args=[self.post.id + 100]))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(PostLike.objects.exists())
+
 
 class TestLikeCommentView(TestCase):
     def setUp(self):
@@ -288,6 +593,31 @@ class TestLikeCommentView(TestCase):
         self.assertEqual(data['likes_count'], 1)
         self.assertEqual(self.comment.likes.count(), 1)
 
+    def test_like_comment_counts_all_likes(self):
+        """
+        Test that the like count of a comment includes the likes of other users.
+        """
+        other_user = User.objects.create_user(username='otheruser', password='password123')
+        client = Client()
+        client.login(username='otheruser', password='password123')
+        client.post(reverse('like-comment', args=[self.post.id, self.comment.id]))
+        client.login(username='testuser', password='password123')
+        response = client.post(reverse('like-comment', args=[self.post.id, self.comment.id]))
+        self.assertEqual(json.loads(response.content)['likes_count'], 2)
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.like_count, 2)
+
+    def test_like_comment_of_other_post(self):
+        """
+        Test that liking a comment through the URL of another post returns 404 and stores no like.
+        """
+        other_post = Post.objects.create(caption='Other Post', author=self.user)
+        client = Client()
+        client.login(username='testuser', password='password123')
+        response = client.post(reverse('like-comment', args=[other_post.id, self.comment.id]))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(CommentLike.objects.exists())
+
 
 class TestUserBioView(TestCase):
     def setUp(self):
@@ -702,6 +1032,19 @@ class TestAllCommentsForPostView(TestCase):
         self.assertEqual(response.context['post'], self.post)
         self.assertIn(self.comment, response.context['comments'])
 
+    @override_settings(COMMENTS_PAGE_SIZE=1)
+    def test_comments_cursor_pagination(self):
+        """
+        Test that the comments are shown oldest first, one page per cursor.
+        """
+        self.client.login(username='testuser', password='testpass')
+        comment2 = Comment.objects.create(user=self.user, post=self.post, content='Test comment 2')
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['comments'], [self.comment])
+        response = self.client.get(self.url, {'cursor': response.context['next_cursor']})
+        self.assertEqual(response.context['comments'], [comment2])
+        self.assertIsNone(response.context['next_cursor'])
+
 
 class TestCommentsForPostCreateView(TestCase):
     def setUp(self):
@@ -730,6 +1073,8 @@ class TestCommentsForPostCreateView(TestCase):
         self.assertEqual(len(Comment.objects.all()), 1)
         self.assertEqual(len(Tag.objects.all()), 2)
         self.assertEqual(len(CommentTag.objects.all()), 2)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
 
     def test_comment_creation_success_empty_tag(self):
         """
@@ -756,25 +1101,40 @@ class TestCommentsForPostCreateView(TestCase):
 
     def test_comment_creation_failure_duplicate_tags(self):
         """
-        Test that only unique tags are created when the tag form contains duplicate tags.
+        Test that a duplicate tag in the tag form creates one tag and one link.
         """
         self.client.force_login(self.post.author)
-        response = self.client.post(self.url, {'content': 'test comment', 'name': 'tag1, tag1'})
+        response = self.client.post(self.url, {'content': 'test comment', 'name': 'tag1, #Tag1'})
         self.assertEqual(response.status_code, 302)
         self.assertEqual(len(Comment.objects.all()), 1)
         self.assertEqual(len(Tag.objects.all()), 1)
-        self.assertEqual(len(CommentTag.objects.all()), 2)
+        self.assertEqual(len(CommentTag.objects.all()), 1)
 
     def test_comment_creation_success_invalid_tag(self):
         """
         Test that a comment is created successfully with valid comment form and invalid tag form.
+        Empty tag names are skipped.
         """
         self.client.force_login(self.post.author)
         response = self.client.post(self.url, {'content': 'test comment', 'name': 'tag1, , tag2'})
         self.assertEqual(response.status_code, 302)
         self.assertEqual(len(Comment.objects.all()), 1)
-        self.assertEqual(len(Tag.objects.all()), 3)
-        self.assertEqual(len(CommentTag.objects.all()), 3)
+        self.assertEqual(len(Tag.objects.all()), 2)
+        self.assertEqual(len(CommentTag.objects.all()), 2)
+
+    def test_comment_creation_reuses_existing_tags(self):
+        """
+        Test that tagging reuses existing tags and takes the same number of queries for 2 and for 20 tags.
+        """
+        Tag.objects.create(name='tag1')
+        self.client.force_login(self.post.author)
+        with CaptureQueriesContext(connection) as few_tags:
+            self.client.post(self.url, {'content': 'test comment', 'name': 'tag1, tag2'})
+        with CaptureQueriesContext(connection) as many_tags:
+            self.client.post(self.url, {'content': 'test comment', 'name': ','.join(f'tag{i}' for i in range(20))})
+        self.assertEqual(len(few_tags.captured_queries), len(many_tags.captured_queries))
+        self.assertEqual(Tag.objects.count(), 20)
+        self.assertEqual(CommentTag.objects.count(), 22)
 
 
 class TestEditCommentView(TestCase):
@@ -834,6 +1194,16 @@ class TestEditCommentView(TestCase):
         self.assertEqual(tags[0].tag.name, 'tag1')
         self.assertEqual(tags[1].tag.name, 'tag2')
 
+    def test_edit_comment_does_not_duplicate_tags(self):
+        """
+        Test that submitting the same tags again does not create duplicate links.
+        """
+        self.client.login(username='testuser', password='testpass')
+        data = {'content': 'Updated comment content', 'name': 'tag1, tag2'}
+        self.client.post(self.url, data)
+        self.client.post(self.url, data)
+        self.assertEqual(self.comment.tags.count(), 2)
+
 
 class TestDeleteCommentView(TestCase):
     def setUp(self):
@@ -872,6 +1242,27 @@ class TestDeleteCommentView(TestCase):
         self.assertRedirects(response, reverse('all-comments-for-post', args=[self.post.id]))
         self.assertFalse(Comment.objects.filter(pk=self.comment.id).exists())
 
+    def test_delete_comment_updates_counter(self):
+        """
+        Test that deleting a comment decrements the comment counter of the post.
+        """
+        Post.objects.filter(pk=self.post.pk).update(comment_count=1)
+        self.client.login(username='testuser', password='testpass')
+        self.client.post(self.url)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+
+    def test_delete_comment_with_drifted_counter(self):
+        """
+        Test that deleting a comment of a post whose counter drifted to 0 keeps the counter at 0 instead of failing.
+        """
+        self.client.login(username='testuser', password='testpass')
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Comment.objects.filter(pk=self.comment.id).exists())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+
     def test_delete_comment_unauthorized_user(self):
         """
         Test the behavior of deleting a comment when the user is unauthorized.
@@ -885,3 +1276,341 @@ class TestDeleteCommentView(TestCase):
         response = self.client.post(self.url)
         self.assertEqual(response.status_code, 302)
         self.assertTrue(Comment.objects.filter(pk=self.comment.id).exists())
+
+
+@override_settings(LIKE_WRITE_BEHIND=True, LIKE_BUFFER_SIZE=100, LIKE_BUFFER_INTERVAL=3600)
+class TestLikePostWriteBehind(TestCase):
+    def setUp(self):
+        """
+        Set up two users, a post and an empty like buffer in the local-memory cache.
+        """
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='password123')
+        self.other_user = User.objects.create_user(username='otheruser', password='password123')
+        self.post = Post.objects.create(caption='Test Post', author=self.user)
+        cache.set(like_buffer.LAST_FLUSH_KEY, time.time())
+
+    def like(self, username):
+        client = Client()
+        client.login(username=username, password='password123')
+        return json.loads(client.post(reverse('like-post', args=[self.post.id])).content)
+
+    def test_likes_are_buffered_until_flush(self):
+        """
+        Test that likes are answered optimistically, are not written before the flush,
+        and that only the latest intent of every user is written by the flush.
+        """
+        self.assertEqual(self.like('testuser'), {'is_liked': True, 'likes_count': 1})
+        self.assertEqual(self.like('otheruser'), {'is_liked': True, 'likes_count': 2})
+        self.assertEqual(self.like('testuser'), {'is_liked': False, 'likes_count': 1})
+        self.assertFalse(PostLike.objects.exists())
+
+        self.assertEqual(like_buffer.flush(), 3)
+        self.assertEqual(list(PostLike.objects.values_list('user__username', flat=True)), ['otheruser'])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.assertEqual(self.like('otheruser'), {'is_liked': False, 'likes_count': 0})
+
+    @override_settings(LIKE_BUFFER_SIZE=2)
+    def test_buffer_is_flushed_when_full(self):
+        """
+        Test that the buffer is written as soon as it holds `LIKE_BUFFER_SIZE` intents.
+        """
+        self.like('testuser')
+        self.assertFalse(PostLike.objects.exists())
+        self.like('otheruser')
+        self.assertEqual(PostLike.objects.count(), 2)
+
+    def test_flush_stops_at_missing_entry(self):
+        """
+        Test that the flush stops before an entry that is still in flight and writes it later, and that an entry
+        missing at two flushes in a row is skipped.
+        """
+        self.like('testuser')
+        self.like('otheruser')
+        in_flight = cache.get(like_buffer.entry_key(1))
+        cache.delete(like_buffer.entry_key(1))
+        self.assertEqual(like_buffer.flush(), 0)
+        self.assertEqual(cache.get(like_buffer.FLUSHED_KEY), 0)
+        self.assertIsNotNone(cache.get(like_buffer.entry_key(2)))
+
+        cache.set(like_buffer.entry_key(1), in_flight)
+        self.assertEqual(like_buffer.flush(), 2)
+        self.assertEqual(PostLike.objects.count(), 2)
+
+        self.like('testuser')
+        self.like('otheruser')
+        cache.delete(like_buffer.entry_key(3))
+        self.assertEqual(like_buffer.flush(), 0)
+        self.assertEqual(like_buffer.flush(), 1)
+        self.assertEqual(list(PostLike.objects.values_list('user__username', flat=True)), ['testuser'])
+        self.assertEqual(cache.get(like_buffer.FLUSHED_KEY), 4)
+
+    def test_flush_with_drifted_counter(self):
+        """
+        Test that flushing an unlike of a post whose counter drifted to 0 keeps the counter at 0.
+        """
+        PostLike.objects.create(post=self.post, user=self.user)
+        self.assertEqual(self.like('testuser'), {'is_liked': False, 'likes_count': 0})
+        self.assertEqual(like_buffer.flush(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+    def test_flush_due_stays_in_its_request(self):
+        """
+        Test that a like finding the buffer full only makes its own request flush it.
+        """
+        self.like('testuser')
+        contextvars.Context().run(like_buffer.flush_due.set, True)
+        like_buffer.flush_after_request(sender=None)
+        self.assertFalse(PostLike.objects.exists())
+
+    def test_loop_flushes_without_new_likes(self):
+        """
+        Test that `flush_likes --loop` writes the buffered likes although no other like comes.
+        """
+        self.like('testuser')
+        with mock.patch('webapp.management.commands.flush_likes.time.sleep', side_effect=KeyboardInterrupt), \
+                self.assertRaises(KeyboardInterrupt):
+            call_command('flush_likes', loop=True, stdout=StringIO())
+        self.assertEqual(PostLike.objects.count(), 1)
+
+    @override_settings(LIKE_BUFFER_INTERVAL=2 * 24 * 60 * 60)
+    def test_entries_outlive_the_flush_interval(self):
+        """
+        Test that the buffered intents are kept longer than the flush interval, also when it is above a day.
+        """
+        self.assertGreater(like_buffer.get_entry_timeout(), 2 * 24 * 60 * 60)
+        with self.settings(LIKE_BUFFER_INTERVAL=5):
+            self.assertGreater(like_buffer.get_entry_timeout(), 5)
+
+
+class TestProfilesView(TestCase):
+    def setUp(self):
+        """
+        Set up a staff user and a temporary profile log.
+        """
+        self.staff = User.objects.create_user(username='staff', password='testpass', is_staff=True)
+        self.directory = TemporaryDirectory()
+        self.log_file = os.path.join(self.directory.name, 'profiles.log')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_sampled_requests_are_profiled(self):
+        """
+        Test that a sampled request is recorded with its queries, template time and profile,
+        and that the staff user can list the records.
+        """
+        with self.settings(PROFILE_SAMPLE_RATE=1, PROFILE_LOG_FILE=self.log_file):
+            client = Client()
+            client.login(username='staff', password='testpass')
+            client.get(reverse('user-bio-create'))
+            profiles = client.get(reverse('profiles')).json()['profiles']
+        self.assertEqual(profiles[0]['path'], reverse('user-bio-create'))
+        self.assertTrue(profiles[0]['sampled'])
+        self.assertGreater(profiles[0]['template_ms'], 0)
+        self.assertIn('cumulative', profiles[0]['profile'])
+
+    def test_slow_requests_are_recorded(self):
+        """
+        Test that without sampling only the requests over the latency threshold are recorded, without a profile.
+        """
+        with self.settings(PROFILE_SLOW_REQUEST_MS=0.001, PROFILE_LOG_FILE=self.log_file):
+            Client().get(reverse('login'))
+        with self.settings(PROFILE_SLOW_REQUEST_MS=60 * 1000, PROFILE_LOG_FILE=self.log_file):
+            Client().get(reverse('register'))
+            profiles = profiling.read_profiles(10)
+        self.assertEqual([profile['path'] for profile in profiles], [reverse('login')])
+        self.assertNotIn('profile', profiles[0])
+
+    async def test_async_requests_are_profiled(self):
+        """
+        Test that a request served through ASGI is profiled on the event loop with the queries of its threads.
+        """
+        with self.settings(PROFILE_SAMPLE_RATE=1, PROFILE_LOG_FILE=self.log_file):
+            client = AsyncClient()
+            await sync_to_async(client.force_login)(self.staff)
+            await client.get(reverse('feed'))
+            profiles = await sync_to_async(profiling.read_profiles)(10)
+        self.assertEqual(profiles[0]['path'], reverse('feed'))
+        self.assertGreater(profiles[0]['queries'], 0)
+        self.assertIn('cumulative', profiles[0]['profile'])
+
+    def test_limit_is_clamped(self):
+        """
+        Test that a limit out of range lists between one and a thousand profiles instead of failing.
+        """
+        with self.settings(PROFILE_SLOW_REQUEST_MS=0.001, PROFILE_LOG_FILE=self.log_file):
+            self.client.login(username='staff', password='testpass')
+            self.client.get(reverse('login'))
+            self.client.get(reverse('login'))
+            response = self.client.get(reverse('profiles'), {'limit': -1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['profiles']), 1)
+
+    def test_profiles_are_staff_only(self):
+        """
+        Test that users who are not staff are redirected to the admin login.
+        """
+        User.objects.create_user(username='user', password='testpass')
+        self.client.login(username='user', password='testpass')
+        self.assertEqual(self.client.get(reverse('profiles')).status_code, 302)
+
+
+class TestMetricsView(TestCase):
+    def setUp(self):
+        """
+        Set up a user and a post to like.
+        """
+        self.user = User.objects.create_user(username='testuser', password='password123')
+        self.post = Post.objects.create(caption='Test Post', author=self.user)
+
+    def get_sample(self, name, labels):
+        return metrics.REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_requests_and_likes_are_counted(self):
+        """
+        Test that a like is counted, that its request is timed under the URL name with its queries,
+        and that the metrics are served in the Prometheus text format.
+        """
+        likes = self.get_sample('djangogram_likes_total', {'target': 'post'})
+        requests = self.get_sample('djangogram_request_duration_seconds_count', {'view': 'like-post', 'method': 'POST'})
+        queries = self.get_sample('djangogram_request_db_queries_sum', {'view': 'like-post'})
+        self.client.login(username='testuser', password='password123')
+        self.client.post(reverse('like-post', args=[self.post.id]))
+        self.assertEqual(self.get_sample('djangogram_likes_total', {'target': 'post'}), likes + 1)
+        self.assertEqual(self.get_sample('djangogram_request_duration_seconds_count',
+                                         {'view': 'like-post', 'method': 'POST'}), requests + 1)
+        self.assertGreater(self.get_sample('djangogram_request_db_queries_sum', {'view': 'like-post'}), queries)
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'djangogram_request_duration_seconds_bucket{le="0.005",method="POST",view="like-post"}',
+                      response.content)
+        self.assertIn(b'djangogram_cache_misses_total{namespace="follows"}', response.content)
+
+    def test_token_is_required_when_set(self):
+        """
+        Test that with METRICS_TOKEN set only requests carrying it as a bearer token get the metrics.
+        """
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    def test_external_requests_are_refused_without_token(self):
+        """
+        Test that without METRICS_TOKEN the metrics are refused to external addresses and to requests
+        forwarded by the proxy.
+        """
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.7').status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_X_FORWARDED_FOR='203.0.113.7').status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.5').status_code, 200)
+
+
+class TestTraceRecorder(TestCase):
+    def setUp(self):
+        """
+        Set up a user, a post and a temporary trace file.
+        """
+        self.user = User.objects.create_user(username='testuser', password='password123')
+        self.post = Post.objects.create(caption='Test Post', author=self.user)
+        self.directory = TemporaryDirectory()
+        self.trace_file = os.path.join(self.directory.name, 'trace.jsonl')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_requests_are_recorded_by_visitor(self):
+        """
+        Test that the requests of a sampled visitor are recorded in order with the URL name and arguments,
+        under the same visitor id before and after logging in, and without the credentials.
+        """
+        with self.settings(TRACE_SAMPLE_RATE=1, TRACE_LOG_FILE=self.trace_file):
+            client = Client()
+            client.get(reverse('login'))
+            client.post(reverse('login'), {'username': 'testuser', 'password': 'password123'})
+            client.post(reverse('like-post', args=[self.post.id]))
+        with open(self.trace_file) as file:
+            records = [json.loads(line) for line in file]
+        self.assertEqual([record['view'] for record in records], ['login', 'login', 'like-post'])
+        self.assertEqual(len({record['visitor'] for record in records}), 1)
+        self.assertEqual(records[1]['data'], {})
+        self.assertEqual(records[2]['kwargs'], {'post_id': self.post.id})
+        self.assertTrue(records[2]['authenticated'])
+
+    def test_unsampled_visitors_are_not_recorded(self):
+        """
+        Test that nothing is recorded for visitors outside of the sample.
+        """
+        with self.settings(TRACE_SAMPLE_RATE=0.000001, TRACE_LOG_FILE=self.trace_file):
+            Client().get(reverse('login'))
+        self.assertFalse(os.path.exists(self.trace_file) and os.path.getsize(self.trace_file))
+
+
+class TestHealthViews(TestCase):
+    def setUp(self):
+        health.state.update(result=None, expires_at=0.0)
+
+    def test_liveness(self):
+        """
+        Test that the liveness probe answers without querying the database or touching the session.
+        """
+        with self.assertNumQueries(0):
+            response = self.client.get('/healthz', HTTP_HOST='10.0.0.7:8000')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('sessionid', response.cookies)
+
+    def test_readiness_runs_the_checks(self):
+        """
+        Test that the readiness probe warms the process up, reports every check and is not validated against
+        ALLOWED_HOSTS.
+        """
+        response = self.client.get('/readyz', HTTP_HOST='10.0.0.7:8000')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'status': 'ok', 'checks': {
+            'warmup': 'ok', 'database': 'ok', 'cache': 'ok', 'migrations': 'ok'}})
+        self.assertTrue(warmup.state['warm'])
+
+    def test_readiness_fails_with_a_failing_check(self):
+        """
+        Test that the readiness probe answers 503 naming the failing check, and logs its error instead of
+        returning it.
+        """
+        error = ConnectionError('redis://cache.internal:6379 refused')
+        with mock.patch.dict(health.CHECKS, cache=mock.Mock(side_effect=error)), \
+                self.assertLogs('webapp.health', 'ERROR') as logs:
+            response = self.client.get('/readyz')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['status'], 'fail')
+        self.assertEqual(response.json()['checks']['cache'], 'error')
+        self.assertNotIn(b'cache.internal', response.content)
+        self.assertIn('cache.internal', logs.output[0])
+
+    def test_readiness_is_cached(self):
+        """
+        Test that probes within HEALTH_CHECK_CACHE_SECONDS reuse the last result without querying the database.
+        """
+        self.client.get('/readyz')
+        with self.assertNumQueries(0):
+            response = self.client.get('/readyz')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(HEALTH_CHECK_STORAGE=True)
+    def test_readiness_checks_the_storage(self):
+        """
+        Test that the storage is checked only with HEALTH_CHECK_STORAGE.
+        """
+        with mock.patch.object(health, 'default_storage') as storage:
+            response = self.client.get('/readyz')
+        self.assertEqual(response.json()['checks']['storage'], 'ok')
+        storage.exists.assert_called_once()
+
+    async def test_readiness_async(self):
+        """
+        Test that the readiness probe runs its checks off the event loop under ASGI.
+        """
+        response = await AsyncClient().get('/readyz')
+        self.assertEqual(response.status_code, 200)
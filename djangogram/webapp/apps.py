@@ -4,3 +4,20 @@ from django.apps import AppConfig
 class WebappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'webapp'
+
+    def ready(self):
+        from django.contrib.auth.models import User
+        from django.contrib.auth.signals import user_logged_in
+        from django.core.signals import request_finished
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_save
+
+        from . import backends, db, like_buffer, queries
+
+        post_save.connect(backends.update, sender=User, dispatch_uid='webapp.backends.update')
+        post_delete.connect(backends.invalidate, sender=User, dispatch_uid='webapp.backends.invalidate')
+        user_logged_in.connect(backends.use_cached_backend, dispatch_uid='webapp.backends.use_cached_backend')
+        connection_created.connect(db.count_connection, dispatch_uid='webapp.db.count_connection')
+        request_finished.connect(db.count_request, dispatch_uid='webapp.db.count_request')
+        request_finished.connect(like_buffer.flush_after_request, dispatch_uid='webapp.like_buffer.flush_after_request')
+        connection_created.connect(queries.install_query_recorder, dispatch_uid='webapp.queries.install_query_recorder')
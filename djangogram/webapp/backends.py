@@ -0,0 +1,84 @@
+"""
+Authentication backend that serves the logged-in user from the cache.
+
+`AuthenticationMiddleware` loads the user of the session on every request. The fields of the user row are
+cached per id and written through whenever the user is saved, or dropped when it is deleted, so password
+changes, deactivations and `last_login` updates are seen on the next request. Users who logged in
+through another backend, such as Google, are served by this one too, because they are loaded by id alike.
+
+The password hash is not cached: the cached user has it deferred, and the session is verified against its
+session auth hash, cached in its place. Rows changed with `QuerySet.update()` send no signal, so such a
+deactivation or password change is only seen once the entry expires after `USER_CACHE_TIMEOUT`, unless
+`invalidate_users` is called with the ids.
+"""
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.db import router
+
+from .cache import CacheNamespace
+
+users = CacheNamespace('users', version=2)
+
+
+def to_cache(user):
+    """
+    Returns the fields of `user` without its password hash, and its session auth hash.
+    """
+    fields = {field.attname: getattr(user, field.attname) for field in User._meta.concrete_fields
+              if field.attname != 'password'}
+    return fields, user.get_session_auth_hash()
+
+
+def from_cache(value):
+    """
+    Returns the user stored by `to_cache`, its password is loaded from the database when it is read.
+    """
+    fields, session_auth_hash = value
+    user = User.from_db(router.db_for_write(User), list(fields), list(fields.values()))
+    user.get_session_auth_hash = partial(get_session_auth_hash, user, session_auth_hash)
+    return user
+
+
+def get_session_auth_hash(user, cached_hash):
+    # The cached hash holds until the password is loaded or set.
+    if 'password' in user.get_deferred_fields():
+        return cached_hash
+    return User.get_session_auth_hash(user)
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        def load():
+            user = super(CachedModelBackend, self).get_user(user_id)
+            return None if user is None else to_cache(user)
+
+        value = users.get_or_set(user_id, load, settings.USER_CACHE_TIMEOUT)
+        user = None if value is None else from_cache(value)
+        return user if self.user_can_authenticate(user) else None
+
+
+def invalidate_users(user_ids):
+    """
+    Drops the cached users `user_ids`, to be called after changing them with `QuerySet.update()`.
+    """
+    for user_id in user_ids:
+        users.delete(user_id)
+
+
+def update(sender, instance, **kwargs):
+    if instance.get_deferred_fields():
+        users.delete(instance.pk)
+    else:
+        users.set(instance.pk, to_cache(instance), settings.USER_CACHE_TIMEOUT)
+
+
+def invalidate(sender, instance, **kwargs):
+    users.delete(instance.pk)
+
+
+def use_cached_backend(sender, request, user, **kwargs):
+    request.session[BACKEND_SESSION_KEY] = f'{CachedModelBackend.__module__}.{CachedModelBackend.__qualname__}'
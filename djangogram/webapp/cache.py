@@ -0,0 +1,163 @@
+"""
+Namespaced cache helpers shared by the views.
+
+Every namespace prefixes its keys with its name and passes its version to the cache, so changing
+the format of the cached values only needs a version bump. Values are stored with their expiry time
+and the time it took to compute them, and are refreshed a little before they expire with a probability
+that grows as the expiry gets closer (probabilistic early expiration), so a popular key does not make
+every worker recompute it at the same moment. Hits and misses are counted per namespace, in this process
+and in the `webapp.metrics` counters, and per request in the `CacheStats` opened with `collect()`.
+"""
+import math
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.cache import caches
+
+from . import metrics
+
+namespaces = {}
+current_stats = ContextVar('current_cache_stats', default=())
+
+
+class CacheStats:
+    """
+    The cache hits and misses of all namespaces while collecting.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+
+@contextmanager
+def collect(stats=None):
+    """
+    Adds the hits and misses of the block to `stats`, a new `CacheStats` by default, like `queries.collect`.
+    Returns:
+        CacheStats: The stats collecting the hits and misses.
+    """
+    stats = stats or CacheStats()
+    token = current_stats.set((*current_stats.get(), stats))
+    try:
+        yield stats
+    finally:
+        current_stats.reset(token)
+
+
+class CacheNamespace:
+    """
+    A group of cache keys sharing a prefix, a version and hit/miss counters.
+    Parameters:
+        name (str): The prefix of the keys, unique among the namespaces.
+        version (int): The version of the cached values, entries of other versions are ignored.
+        alias (str): The cache from `CACHES` to use.
+        beta (float): How eagerly values are refreshed before they expire, 0 disables early refreshes.
+    """
+
+    def __init__(self, name, version=1, alias='default', beta=1.0):
+        self.name = name
+        self.version = version
+        self.alias = alias
+        self.beta = beta
+        self.hits = 0
+        self.misses = 0
+        namespaces[name] = self
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def make_key(self, key):
+        return f'{self.name}:{key}'
+
+    def is_fresh(self, entry):
+        _, expires_at, delta = entry
+        if expires_at is None:
+            return True
+        return time.time() - delta * self.beta * math.log(1 - random.random()) < expires_at
+
+    def get_many(self, keys):
+        """
+        Returns the fresh values of `keys` found in the cache.
+        Parameters:
+            keys (iterable): The keys without the namespace prefix.
+        Returns:
+            dict: The values by key, missing and early expired keys are left out.
+        """
+        cache_keys = {self.make_key(key): key for key in keys}
+        return self.get_fresh_values(cache_keys, self.backend.get_many(cache_keys, version=self.version))
+
+    async def aget_many(self, keys):
+        cache_keys = {self.make_key(key): key for key in keys}
+        return self.get_fresh_values(cache_keys, await self.backend.aget_many(cache_keys, version=self.version))
+
+    def get_fresh_values(self, cache_keys, entries):
+        values = {cache_keys[cache_key]: entry[0] for cache_key, entry in entries.items() if self.is_fresh(entry)}
+        self.hits += len(values)
+        self.misses += len(cache_keys) - len(values)
+        for stats in current_stats.get():
+            stats.hits += len(values)
+            stats.misses += len(cache_keys) - len(values)
+        metrics.cache_hits.labels(self.name).inc(len(values))
+        metrics.cache_misses.labels(self.name).inc(len(cache_keys) - len(values))
+        return values
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def set_many(self, values, timeout, delta=0.0):
+        """
+        Stores `values` for `timeout` seconds.
+        Parameters:
+            values (dict): The values by key.
+            timeout (int): The lifetime of the values in seconds, None to keep them until they are evicted.
+            delta (float): How long computing one value took in seconds, slower values are refreshed earlier.
+        """
+        self.backend.set_many(self.make_entries(values, timeout, delta), timeout, version=self.version)
+
+    async def aset_many(self, values, timeout, delta=0.0):
+        await self.backend.aset_many(self.make_entries(values, timeout, delta), timeout, version=self.version)
+
+    def make_entries(self, values, timeout, delta):
+        expires_at = None if timeout is None else time.time() + timeout
+        return {self.make_key(key): (value, expires_at, delta) for key, value in values.items()}
+
+    def set(self, key, value, timeout, delta=0.0):
+        self.set_many({key: value}, timeout, delta)
+
+    def get_or_set(self, key, compute, timeout):
+        """
+        Returns the cached value of `key`, or computes it with `compute()` and stores it for `timeout` seconds.
+        """
+        values = self.get_many([key])
+        if key in values:
+            return values[key]
+        started = time.monotonic()
+        value = compute()
+        self.set(key, value, timeout, time.monotonic() - started)
+        return value
+
+    async def aget_or_set(self, key, compute, timeout):
+        """
+        `get_or_set` for async code, `compute` is a coroutine function.
+        """
+        values = await self.aget_many([key])
+        if key in values:
+            return values[key]
+        started = time.monotonic()
+        value = await compute()
+        await self.aset_many({key: value}, timeout, time.monotonic() - started)
+        return value
+
+    def delete(self, key):
+        self.backend.delete(self.make_key(key), version=self.version)
+
+
+def get_stats():
+    """
+    Returns the hits and misses of every namespace in this process.
+    """
+    return {name: {'hits': namespace.hits, 'misses': namespace.misses} for name, namespace in namespaces.items()}
@@ -0,0 +1,75 @@
+"""
+Cached fragments of the post cards.
+
+The parts of a card that are the same for every user (caption, images and tags) are rendered once per
+post version and stored in the cache. The like and subscribe buttons and the counters are rendered
+on every request. `Post.objects.bump_version` invalidates the cached fragments of a post.
+"""
+import time
+
+from django.conf import settings
+from django.db.models import Prefetch, prefetch_related_objects
+from django.template.loader import get_template
+
+from .cache import CacheNamespace
+from .models import Post, PostTag
+
+FRAGMENT_TEMPLATES = {'body': 'webapp/post_card_body.html', 'tags': 'webapp/post_card_tags.html'}
+
+post_cards = CacheNamespace('post-card')
+
+
+def cache_key(post):
+    return f'{post.id}:{post.version}'
+
+
+def get_prefetches():
+    return 'images', Prefetch('tags', queryset=PostTag.objects.select_related('tag'))
+
+
+def render_fragments(post):
+    return {name: get_template(template).render({'post': post}) for name, template in FRAGMENT_TEMPLATES.items()}
+
+
+def attach_fragments(posts):
+    """
+    Sets `post.card` to the rendered user-independent fragments of every post.
+    Only the posts missing from the cache are rendered, their images and tags are loaded with two queries.
+    Parameters:
+        posts (list): The posts of the page.
+    Returns:
+        list: The same posts.
+    """
+    keys = {post.id: cache_key(post) for post in posts}
+    fragments = post_cards.get_many(keys.values())
+    missing = [post for post in posts if keys[post.id] not in fragments]
+    if missing:
+        started = time.monotonic()
+        prefetch_related_objects(missing, *get_prefetches())
+        rendered = {keys[post.id]: render_fragments(post) for post in missing}
+        post_cards.set_many(rendered, settings.POST_CARD_TIMEOUT, (time.monotonic() - started) / len(missing))
+        fragments.update(rendered)
+    for post in posts:
+        post.card = fragments[keys[post.id]]
+    return posts
+
+
+async def aattach_fragments(posts):
+    """
+    `attach_fragments` for async views. The images and tags of the posts missing from the cache are read
+    with the async ORM, on a second copy of the posts.
+    """
+    keys = {post.id: cache_key(post) for post in posts}
+    fragments = await post_cards.aget_many(keys.values())
+    missing = {post.id for post in posts if keys[post.id] not in fragments}
+    if missing:
+        started = time.monotonic()
+        loaded = Post.objects.filter(pk__in=missing).prefetch_related(*get_prefetches())
+        rendered = {keys[post.id]: render_fragments(post) async for post in loaded}
+        await post_cards.aset_many(rendered, settings.POST_CARD_TIMEOUT, (time.monotonic() - started) / len(missing))
+        fragments.update(rendered)
+    # The posts deleted in the meantime have no card.
+    posts = [post for post in posts if keys[post.id] in fragments]
+    for post in posts:
+        post.card = fragments[keys[post.id]]
+    return posts
@@ -0,0 +1,78 @@
+"""
+Statistics of the database connections of this process and the pool of the `webapp.pooled_postgresql` backend.
+
+With persistent connections a connection is opened once per worker thread and reused by the following
+requests, so `opened` should stay far below `requests`. Every new connection is logged with both numbers,
+connections taken from the pool are counted as `reused` instead.
+"""
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+stats = {'opened': 0, 'reused': 0, 'requests': 0}
+lock = threading.Lock()
+
+
+class ConnectionPool:
+    """
+    Idle connections of one database, shared by the threads of the process. The most recently returned
+    connection is lent first, so the connections beyond the load of the process stay idle.
+    Parameters:
+        size (int): The most idle connections kept, the ones returned to a full pool are closed.
+    """
+
+    def __init__(self, size):
+        self.idle = queue.LifoQueue(maxsize=size)
+
+    def get(self):
+        """
+        Returns an idle connection, or None when there is none.
+        """
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            return None
+
+    def put(self, connection):
+        """
+        Keeps `connection` for the next `get`.
+        Returns:
+            bool: Whether the connection was kept, False when the pool is full.
+        """
+        try:
+            self.idle.put_nowait(connection)
+        except queue.Full:
+            return False
+        return True
+
+
+pools = {}
+
+
+def get_pool(alias, size):
+    with lock:
+        if alias not in pools:
+            pools[alias] = ConnectionPool(size)
+        return pools[alias]
+
+
+def count_connection(sender, connection, **kwargs):
+    reused = getattr(connection, 'reused_from_pool', False)
+    with lock:
+        stats['reused' if reused else 'opened'] += 1
+        opened, requests = stats['opened'], stats['requests']
+    if not reused:
+        logger.info('Opened connection to %r database, %d connections opened for %d requests in this process.',
+                    connection.alias, opened, requests)
+
+
+def count_request(sender, **kwargs):
+    with lock:
+        stats['requests'] += 1
+
+
+def get_stats():
+    with lock:
+        return dict(stats)
@@ -0,0 +1,119 @@
+"""
+Cached sets of the users followed by a user.
+
+The ids are stored in the cache as a sorted array of 64-bit integers and turned into a frozenset
+on first use, so membership checks in templates are done in memory.
+The ids of the authors over `FEED_FANOUT_LIMIT`, whose posts the feed reads instead of the timelines,
+are cached the same way for all users.
+"""
+from array import array
+
+from django.conf import settings
+
+from .cache import CacheNamespace
+from .models import FollowerCount, Subscription
+
+follow_sets = CacheNamespace('follows')
+high_fanout_authors = CacheNamespace('high-fanout')
+
+
+def load_following_ids(user_id):
+    """
+    Returns the sorted ids of the users followed by `user_id`, from the cache when possible.
+    """
+    def load():
+        following = Subscription.objects.filter(user=user_id).values_list('subscribed_to_id', flat=True)
+        return array('q', sorted(following)).tobytes()
+
+    ids = array('q')
+    ids.frombytes(follow_sets.get_or_set(user_id, load, settings.FOLLOW_SET_TIMEOUT))
+    return ids
+
+
+async def aload_following_ids(user_id):
+    """
+    `load_following_ids` for async code, the ids missing from the cache are read with the async ORM.
+    """
+    async def load():
+        following = Subscription.objects.filter(user=user_id).values_list('subscribed_to_id', flat=True)
+        return array('q', sorted([pk async for pk in following])).tobytes()
+
+    ids = array('q')
+    ids.frombytes(await follow_sets.aget_or_set(user_id, load, settings.FOLLOW_SET_TIMEOUT))
+    return ids
+
+
+def invalidate(user_id):
+    follow_sets.delete(user_id)
+
+
+def get_high_fanout_ids():
+    """
+    Returns the ids of the authors with more followers than `FEED_FANOUT_LIMIT`, from the cache when possible.
+    """
+    def load():
+        return array('q', sorted(FollowerCount.objects.get_high_fanout_ids())).tobytes()
+
+    ids = array('q')
+    ids.frombytes(high_fanout_authors.get_or_set(settings.FEED_FANOUT_LIMIT, load, settings.FOLLOW_SET_TIMEOUT))
+    return frozenset(ids)
+
+
+async def aget_high_fanout_ids():
+    async def load():
+        return array('q', sorted([pk async for pk in FollowerCount.objects.get_high_fanout_ids()])).tobytes()
+
+    ids = array('q')
+    ids.frombytes(await high_fanout_authors.aget_or_set(settings.FEED_FANOUT_LIMIT, load,
+                                                        settings.FOLLOW_SET_TIMEOUT))
+    return frozenset(ids)
+
+
+def invalidate_high_fanout():
+    high_fanout_authors.delete(settings.FEED_FANOUT_LIMIT)
+
+
+class FollowSet:
+    """
+    The ids of the users followed by a user, loaded lazily on first use.
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self._ids = None
+
+    @property
+    def ids(self):
+        if self._ids is None:
+            self._ids = frozenset(load_following_ids(self.user_id)) if self.user_id else frozenset()
+        return self._ids
+
+    async def aload(self):
+        """
+        Loads the ids without blocking the event loop, so the set can then be used by async views and templates.
+        """
+        if self._ids is None:
+            self._ids = frozenset(await aload_following_ids(self.user_id)) if self.user_id else frozenset()
+        return self._ids
+
+    def __contains__(self, user_id):
+        return user_id in self.ids
+
+    def __iter__(self):
+        return iter(sorted(self.ids))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __bool__(self):
+        return bool(self.ids)
+
+
+def get_follow_set(user):
+    """
+    Returns the follow set attached to `user` by FollowSetMiddleware, or a new one.
+    """
+    follow_set = getattr(user, 'following_ids', None)
+    if follow_set is None:
+        follow_set = FollowSet(user.pk)
+    return follow_set
@@ -34,16 +34,24 @@ class PostForm(ModelForm):
         fields = ['caption']
 
 
-class PostTagForm(ModelForm):
+class TagNamesForm(ModelForm):
     class Meta:
         model = Tag
         fields = ['name']
 
+    def validate_unique(self):
+        """
+        The name field holds comma-separated tag names that are upserted by `Tag.objects.assign`,
+        so existing tags are not a validation error.
+        """
 
-class CommentTagForm(ModelForm):
-    class Meta:
-        model = Tag
-        fields = ['name']
+
+class PostTagForm(TagNamesForm):
+    pass
+
+
+class CommentTagForm(TagNamesForm):
+    pass
 
 
 class CommentForm(ModelForm):
@@ -0,0 +1,109 @@
+"""
+Liveness and readiness probes for nginx and the orchestrator.
+
+`HealthCheckMiddleware` answers the probes before any other middleware runs, so they need no session,
+user or messages, are not validated against ALLOWED_HOSTS and are not counted in the metrics.
+`/healthz` only tells that the process serves requests. `/readyz` warms the process up and checks the
+databases, the cache, the migrations and, with `HEALTH_CHECK_STORAGE`, the media storage. Its result is
+kept for `HEALTH_CHECK_CACHE_SECONDS`, so frequent probes do not load the database. The probes are public,
+so the response only tells which checks failed, their errors are logged.
+"""
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import connections
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse, JsonResponse
+
+from . import warmup
+from .middleware import AsyncCapableMiddleware
+
+LIVENESS_PATH = '/healthz'
+READINESS_PATH = '/readyz'
+
+logger = logging.getLogger(__name__)
+
+lock = threading.Lock()
+# The last readiness result and when it expires. Applied migrations stay applied for the life of the process.
+state = {'result': None, 'expires_at': 0.0, 'migrated': False}
+
+
+def check_databases():
+    for alias in connections:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+
+
+def check_cache():
+    cache.set('health', time.time(), 10)
+    if cache.get('health') is None:
+        raise RuntimeError('the cache did not return the value just stored')
+
+
+def check_migrations():
+    if state['migrated']:
+        return
+    executor = MigrationExecutor(connections['default'])
+    plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    if plan:
+        raise RuntimeError(f'{len(plan)} unapplied migrations')
+    state['migrated'] = True
+
+
+def check_storage():
+    default_storage.exists('healthz')
+
+
+CHECKS = {'warmup': warmup.run, 'database': check_databases, 'cache': check_cache,
+          'migrations': check_migrations, 'storage': check_storage}
+
+
+def get_readiness():
+    """
+    Returns whether every check passed and the result of each check, running them at most once per
+    `HEALTH_CHECK_CACHE_SECONDS` in this process.
+    """
+    with lock:
+        if state['result'] is None or time.monotonic() >= state['expires_at']:
+            results = {}
+            for name, check in CHECKS.items():
+                if name == 'storage' and not settings.HEALTH_CHECK_STORAGE:
+                    continue
+                try:
+                    check()
+                    results[name] = 'ok'
+                except Exception:
+                    logger.exception('Readiness check %s failed', name)
+                    results[name] = 'error'
+            state['result'] = (all(result == 'ok' for result in results.values()), results)
+            state['expires_at'] = time.monotonic() + settings.HEALTH_CHECK_CACHE_SECONDS
+        return state['result']
+
+
+def readiness_response(ready, results):
+    return JsonResponse({'status': 'ok' if ready else 'fail', 'checks': results}, status=200 if ready else 503)
+
+
+class HealthCheckMiddleware(AsyncCapableMiddleware):
+    """
+    Answers the liveness and readiness probes. Must be the first middleware.
+    """
+
+    def process(self, request, get_response):
+        if request.path == LIVENESS_PATH:
+            return HttpResponse('ok', content_type='text/plain')
+        if request.path == READINESS_PATH:
+            return readiness_response(*get_readiness())
+        return get_response(request)
+
+    async def aprocess(self, request, get_response):
+        if request.path == LIVENESS_PATH:
+            return HttpResponse('ok', content_type='text/plain')
+        if request.path == READINESS_PATH:
+            return readiness_response(*await sync_to_async(get_readiness)())
+        return await get_response(request)
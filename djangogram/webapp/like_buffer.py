@@ -0,0 +1,181 @@
+"""
+Write-behind buffer for post likes.
+
+Like and unlike intents are appended to a log in the cache and flushed to the database in bulk,
+either when `LIKE_BUFFER_SIZE` intents are pending or `LIKE_BUFFER_INTERVAL` seconds passed since
+the last flush. The flush runs once the response of the like is sent (see `flush_after_request`), so it
+does not delay it, and every `LIKE_BUFFER_INTERVAL` seconds in `flush_likes --loop`, so the intents of
+the last likes are written when no other like follows. Only the latest intent of every (post, user) pair
+is written.
+"""
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.db.models.functions import Greatest
+
+from .models import Post, PostLike
+
+SEQUENCE_KEY = 'likes:sequence'
+FLUSHED_KEY = 'likes:flushed'
+LAST_FLUSH_KEY = 'likes:last-flush'
+LOCK_KEY = 'likes:flush-lock'
+GAP_KEY = 'likes:gap'
+LOCK_TIMEOUT = 60
+ENTRY_TIMEOUT = 24 * 60 * 60
+
+# Set by the likes of the current request that found the buffer full or stale.
+flush_due = ContextVar('like_flush_due', default=False)
+
+
+def get_cache():
+    return caches[settings.LIKE_BUFFER_CACHE]
+
+
+def get_entry_timeout():
+    """
+    Returns how long the buffered intents are kept: a day, or three flush intervals when that is longer,
+    so they outlive the periodic flush.
+    """
+    return max(ENTRY_TIMEOUT, int(3 * settings.LIKE_BUFFER_INTERVAL) + 1)
+
+
+def entry_key(sequence):
+    return f'likes:entry:{sequence}'
+
+
+def intent_key(post_id, user_id):
+    return f'likes:intent:{post_id}:{user_id}'
+
+
+def pending_key(post_id):
+    return f'likes:pending:{post_id}'
+
+
+def toggle(post_id, user):
+    """
+    Records a like or unlike of the post `post_id` by `user` without writing to the database.
+    Parameters:
+        post_id (int): The id of the post to like or unlike.
+        user (User): The user who likes the post.
+    Returns:
+        tuple: Whether the post is liked by the user and the optimistic like count of the post.
+    Raises:
+        Post.DoesNotExist: If there is no post `post_id`.
+    """
+    return record(post_id, user, get_like_state(post_id, user).first())
+
+
+async def atoggle(post_id, user):
+    """
+    `toggle` for async views, the post is read with the async ORM.
+    """
+    return record(post_id, user, await get_like_state(post_id, user).afirst())
+
+
+def get_like_state(post_id, user):
+    return Post.objects.filter(pk=post_id).annotate(
+        is_liked=Exists(PostLike.objects.filter(post=OuterRef('pk'), user=user))).values_list(
+        'like_count', 'is_liked')
+
+
+def record(post_id, user, row):
+    if row is None:
+        raise Post.DoesNotExist(f'No Post {post_id}.')
+    cache = get_cache()
+    like_count, is_liked = row
+    is_liked = not cache.get(intent_key(post_id, user.id), is_liked)
+    cache.set(intent_key(post_id, user.id), is_liked, get_entry_timeout())
+    cache.add(SEQUENCE_KEY, 0, None)
+    sequence = cache.incr(SEQUENCE_KEY)
+    cache.set(entry_key(sequence), (post_id, user.id, is_liked), get_entry_timeout())
+    cache.add(pending_key(post_id), 0, get_entry_timeout())
+    pending = cache.incr(pending_key(post_id), 1 if is_liked else -1)
+
+    state = cache.get_many([FLUSHED_KEY, LAST_FLUSH_KEY])
+    if (sequence - state.get(FLUSHED_KEY, 0) >= settings.LIKE_BUFFER_SIZE
+            or time.time() - state.get(LAST_FLUSH_KEY, 0) >= settings.LIKE_BUFFER_INTERVAL):
+        flush_due.set(True)
+    return is_liked, max(like_count + pending, 0)
+
+
+def flush_after_request(sender, **kwargs):
+    """
+    Flushes the buffer after the response of a like that found it full or stale was sent.
+    Connected to `request_finished`, which is sent in the context of the request.
+    """
+    if flush_due.get():
+        flush_due.set(False)
+        flush()
+
+
+def flush():
+    """
+    Writes the buffered intents to the database: one bulk insert, one delete and one counter update per post.
+    Returns:
+        int: The number of intents that were flushed, or 0 if another process is flushing.
+    """
+    cache = get_cache()
+    if not cache.add(LOCK_KEY, True, LOCK_TIMEOUT):
+        return 0
+    try:
+        start = cache.get(FLUSHED_KEY, 0)
+        end = cache.get(SEQUENCE_KEY, 0)
+        entries = cache.get_many([entry_key(sequence) for sequence in range(start + 1, end + 1)])
+        # A missing entry may still be in flight, the flush stops before it and leaves the rest of the log
+        # for the next flush. An entry still missing then was evicted and is skipped.
+        lost = cache.get(GAP_KEY)
+        flushed = start
+        while flushed < end and (entry_key(flushed + 1) in entries or flushed + 1 == lost):
+            flushed += 1
+        if flushed < end:
+            cache.set(GAP_KEY, flushed + 1, None)
+        entries = [entries[entry_key(sequence)] for sequence in range(start + 1, flushed + 1)
+                   if entry_key(sequence) in entries]
+        intents = {}
+        logged = defaultdict(int)
+        for post_id, user_id, is_liked in entries:
+            intents[post_id, user_id] = is_liked
+            logged[post_id] += 1 if is_liked else -1
+        if intents:
+            _apply(intents)
+        cache.set(FLUSHED_KEY, flushed, None)
+        cache.set(LAST_FLUSH_KEY, time.time(), None)
+        cache.delete_many([entry_key(sequence) for sequence in range(start + 1, flushed + 1)])
+        for post_id, delta in logged.items():
+            if delta:
+                try:
+                    cache.decr(pending_key(post_id), delta)
+                except ValueError:
+                    pass
+        return len(entries)
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def _apply(intents):
+    post_ids = {post_id for post_id, _ in intents}
+    user_ids = {user_id for _, user_id in intents}
+    changes = defaultdict(int)
+    with transaction.atomic():
+        existing = set(PostLike.objects.filter(post_id__in=post_ids, user_id__in=user_ids).values_list(
+            'post_id', 'user_id'))
+        created = [pair for pair, is_liked in intents.items() if is_liked and pair not in existing]
+        deleted = defaultdict(list)
+        for (post_id, user_id), is_liked in intents.items():
+            if not is_liked and (post_id, user_id) in existing:
+                deleted[post_id].append(user_id)
+
+        PostLike.objects.bulk_create([PostLike(post_id=post_id, user_id=user_id) for post_id, user_id in created],
+                                     batch_size=1000, ignore_conflicts=True)
+        for post_id, _ in created:
+            changes[post_id] += 1
+        for post_id, deleted_user_ids in deleted.items():
+            changes[post_id] -= PostLike.objects.filter(post_id=post_id, user_id__in=deleted_user_ids).delete()[0]
+        for post_id, change in changes.items():
+            if change:
+                Post.objects.filter(pk=post_id).update(like_count=Greatest(F('like_count') + change, 0))
@@ -0,0 +1,26 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from webapp.models import Subscription, TimelineEntry
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized feed timelines from the current subscriptions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='usernames', default=[],
+                            help='Only rebuild the timeline of this user (can be repeated)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of entries inserted per query')
+
+    def handle(self, *args, **options):
+        if options['usernames']:
+            users = User.objects.filter(username__in=options['usernames']).order_by('id')
+        else:
+            users = User.objects.filter(id__in=Subscription.objects.values('user_id')).order_by('id')
+        total = 0
+        for user in users.iterator():
+            created = TimelineEntry.objects.rebuild(user, batch_size=options['batch_size'])
+            total += created
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{user.username}: {created} entries')
+        self.stdout.write(self.style.SUCCESS(f'Successfully rebuilt timelines with {total} entries.'))
@@ -0,0 +1,94 @@
+import json
+import os
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+
+from benchmarks import suite
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the main views on a seeded dataset and compare the results with a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help='Only run these scenarios')
+        parser.add_argument('--iterations', type=int, default=50, help='Measured requests per scenario')
+        parser.add_argument('--warmup', type=int, default=5, help='Requests sent before measuring each scenario')
+        parser.add_argument('--scale', type=float, default=1.0, help='Multiply the size of the dataset')
+        parser.add_argument('--baseline', default=os.path.join(settings.BASE_DIR, 'benchmarks', 'baseline.json'),
+                            help='The baseline JSON file')
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help='How much the memory may exceed the baseline, 0.5 is 50%%')
+        parser.add_argument('--latency-tolerance', type=float, default=0.5,
+                            help='How much the relative p95 latency may exceed the baseline, 0.5 is 50%%')
+        parser.add_argument('--fail-on-latency', action='store_true',
+                            help='Fail on latency regressions instead of only reporting them')
+        parser.add_argument('--save-baseline', action='store_true', help='Write the results to the baseline file')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--current-database', action='store_true',
+                            help='Seed the current database instead of a throwaway test database')
+
+    def handle(self, *args, **options):
+        names = [scenario.name for scenario in suite.SCENARIOS]
+        unknown = set(options['scenarios']) - set(names)
+        if unknown:
+            raise CommandError(f'Unknown scenarios: {", ".join(sorted(unknown))}. Choose from {", ".join(names)}.')
+        scenarios = [scenario for scenario in suite.SCENARIOS
+                     if not options['scenarios'] or scenario.name in options['scenarios']]
+
+        old_name = None
+        if not options['current_database']:
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver']):
+                results = self.run(scenarios, options)
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        for name, result in results.items():
+            self.stdout.write(f'{name:<12} p50 {result["p50_ms"]:>8.2f} ms  p95 {result["p95_ms"]:>8.2f} ms '
+                              f'({result["p95_relative"]:>6.3f}x)  {result["queries"]:>3} queries  '
+                              f'{result["memory_kib"]:>8.1f} KiB')
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
+        if options['save_baseline']:
+            # Without a baseline only the query budgets are compared, a baseline over them is not saved.
+            over_budget = suite.compare(results, {}, options['tolerance'])
+            if over_budget:
+                raise CommandError('Over the query budgets:\n' + '\n'.join(over_budget))
+            baseline = {**suite.load_baseline(options['baseline']), **results}
+            with open(options['baseline'], 'w') as file:
+                json.dump(baseline, file, indent=2)
+                file.write('\n')
+        else:
+            baseline = suite.load_baseline(options['baseline'])
+            regressions = suite.compare(results, baseline, options['tolerance'])
+            if options['iterations'] < suite.MIN_TIMED_ITERATIONS:
+                self.stdout.write(f'Latency not compared, it needs at least {suite.MIN_TIMED_ITERATIONS} iterations.')
+            else:
+                slower = suite.compare_latency(results, baseline, options['latency_tolerance'])
+                if options['fail_on_latency']:
+                    regressions += slower
+                else:
+                    for message in slower:
+                        self.stderr.write(self.style.WARNING(message))
+            if regressions:
+                raise CommandError('Regressions against the baseline:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS(f'Successfully benchmarked {len(results)} scenarios.'))
+
+    def run(self, scenarios, options):
+        dataset = {key: max(1, int(count * options['scale'])) for key, count in suite.DATASET.items()}
+        call_command('fake_data', **dataset, password=suite.PASSWORD, stdout=StringIO())
+        context = suite.get_context()
+        client = Client()
+        client.login(username=context['user'].username, password=suite.PASSWORD)
+        calibration_ms = suite.calibrate()
+        return {scenario.name: suite.measure(client, scenario, context, options['iterations'], options['warmup'],
+                                             calibration_ms)
+                for scenario in scenarios}
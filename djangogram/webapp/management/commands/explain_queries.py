@@ -0,0 +1,134 @@
+import json
+import random
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from webapp.models import UserProfile, Post, Tag, PostTag, PostLike, Comment, Subscription, TimelineEntry, \
+    FollowerCount
+
+
+class RestoreIndexes(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Record the EXPLAIN plans of the queries behind the feed, home, comments, like and tag lookups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, metavar='POSTS',
+                            help='Create this many posts (with users, comments, likes and tags) before explaining')
+        parser.add_argument('--compare', action='store_true',
+                            help='Also explain every query with the indexes and constraints of the app dropped')
+        parser.add_argument('--analyze', action='store_true', help='Run EXPLAIN ANALYZE (PostgreSQL only)')
+        parser.add_argument('--output', help='Write the plans to this JSON file')
+
+    def handle(self, *args, **options):
+        if options['compare'] and not connection.features.can_rollback_ddl:
+            raise CommandError(f'--compare needs transactional DDL, which {connection.vendor} does not support.')
+        if options['seed']:
+            self.seed(options['seed'])
+        user = User.objects.filter(profile__isnull=False).order_by('id').first()
+        post = Post.objects.order_by('-comment_count').first()
+        if user is None or post is None:
+            raise CommandError('There is no data to explain, run with --seed.')
+
+        explain_options = {'analyze': True} if options['analyze'] else {}
+        results = {name: {'sql': str(queryset.query), 'plan': queryset.explain(**explain_options)}
+                   for name, queryset in self.get_queries(user, post)}
+        if options['compare']:
+            try:
+                # The schema editor runs in a transaction, leaving it with an exception restores the indexes.
+                with connection.schema_editor() as schema_editor:
+                    self.drop_indexes(schema_editor)
+                    for name, queryset in self.get_queries(user, post):
+                        results[name]['plan_without_indexes'] = queryset.explain(**explain_options)
+                    raise RestoreIndexes
+            except RestoreIndexes:
+                pass
+
+        for name, result in results.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(result['plan'])
+            if 'plan_without_indexes' in result:
+                self.stdout.write(self.style.MIGRATE_LABEL('without indexes:'))
+                self.stdout.write(result['plan_without_indexes'])
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump({'vendor': connection.vendor, 'queries': results}, file, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Successfully explained {len(results)} queries.'))
+
+    def get_queries(self, user, post):
+        page_size = settings.POSTS_PAGE_SIZE
+        return [
+            ('home', Post.objects.with_card_data(user).order_by('-created_at', '-id')[:page_size + 1]),
+            ('feed', TimelineEntry.objects.get_page(user, None, page_size)),
+            ('feed_high_fanout', Post.objects.filter(author__in=self.get_most_followed(post)).with_card_data(
+                user).order_by('-created_at', '-id')[:page_size + 1]),
+            ('author_posts', Post.objects.filter(author=post.author).order_by('-created_at')[:page_size + 1]),
+            ('comments', Comment.objects.filter(post=post).with_card_data(user).order_by(
+                'created_at', 'id')[:settings.COMMENTS_PAGE_SIZE + 1]),
+            ('post_like', PostLike.objects.filter(post=post, user=user)),
+            ('tags', Tag.objects.filter(name__in=['python', 'django'])),
+        ]
+
+    @staticmethod
+    def get_most_followed(post):
+        """
+        Returns the ids of the most followed authors, standing in for the authors over `FEED_FANOUT_LIMIT`,
+        which a small dataset does not have.
+        """
+        return list(FollowerCount.objects.order_by('-count').values_list('user_id', flat=True)[:10]) or [post.author_id]
+
+    def drop_indexes(self, schema_editor):
+        """
+        Drops the indexes and constraints declared in `Meta` of the app models.
+        Unique fields are kept, and so are unique constraints on SQLite, where they are part of the table.
+        """
+        for model in apps.get_app_config('webapp').get_models():
+            # Constraints go first, SQLite rebuilds the table to drop them and recreates the Meta indexes.
+            for constraint in model._meta.constraints:
+                schema_editor.remove_constraint(model, constraint)
+            for index in model._meta.indexes:
+                schema_editor.remove_index(model, index)
+
+    def seed(self, post_count):
+        """
+        Creates `post_count` posts spread over one user per 50 posts, with comments, likes, tags,
+        subscriptions and timelines, using bulk inserts.
+        """
+        now = timezone.now()
+        user_count = max(post_count // 50, 10)
+        start = User.objects.count()
+        User.objects.bulk_create([User(username=f'explain{start + i}', password='!') for i in range(user_count)],
+                                 batch_size=1000)
+        users = list(User.objects.filter(username__startswith='explain').order_by('-id')[:user_count])
+        UserProfile.objects.bulk_create([UserProfile(user=user, full_name=user.username) for user in users],
+                                        batch_size=1000)
+        Subscription.objects.bulk_create(
+            [Subscription(user=user, subscribed_to=author)
+             for user in users for author in random.sample(users, min(20, user_count)) if author != user],
+            batch_size=1000, ignore_conflicts=True)
+        Post.objects.bulk_create(
+            [Post(author=random.choice(users), caption=f'Post {i}') for i in range(post_count)], batch_size=1000)
+        posts = list(Post.objects.order_by('-id')[:post_count])
+        for post in posts:
+            post.created_at = now - timedelta(minutes=random.randint(0, 60 * 24 * 365))
+        Post.objects.bulk_update(posts, ['created_at'], batch_size=1000)
+        tags = Tag.objects.upsert([f'tag{i}' for i in range(100)])
+        PostTag.objects.bulk_create([PostTag(post=post, tag=random.choice(tags)) for post in posts],
+                                    batch_size=1000, ignore_conflicts=True)
+        PostLike.objects.bulk_create(
+            [PostLike(post=random.choice(posts), user=random.choice(users)) for _ in range(post_count * 5)],
+            batch_size=1000, ignore_conflicts=True)
+        Comment.objects.bulk_create(
+            [Comment(post=random.choice(posts), user=random.choice(users), content='Comment')
+             for _ in range(post_count * 2)], batch_size=1000)
+        call_command('recount', stdout=self.stdout)
+        call_command('backfill_timelines', stdout=self.stdout)
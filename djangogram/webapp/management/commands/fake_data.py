@@ -1,51 +1,175 @@
-from django.core.management.base import BaseCommand
+import itertools
+import multiprocessing
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
-from webapp.models import UserProfile, Post, PostImage, Tag, PostTag, PostLike, Comment, CommentTag, CommentLike
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
 from faker import Faker
-import random
+
+from webapp.models import UserProfile, Post, PostImage, Tag, PostTag, PostLike, Comment, Subscription, TimelineEntry
+
+# Faker is too slow to call for every row of a large dataset, the texts are generated once and sampled.
+POOL_SIZE = 1000
+TAG_COUNT = 200
+
+# Set before the worker processes are forked, so they share it without pickling.
+dataset = None
+
+
+class Dataset:
+    """
+    The text pools and the ids the generated rows point to.
+    Authors and posts are picked with a Zipf distribution: the n-th most popular is picked 1 / n ** exponent
+    times as often as the most popular one, which gives the long tail of followers and likes of a real network.
+    Parameters:
+        seed (int): The seed of the texts and of every batch, the same seed generates the same rows.
+        exponent (float): The exponent of the Zipf distribution, 0 picks uniformly.
+        password (str): The password of every generated user, hashed once.
+    """
+
+    def __init__(self, seed, exponent, password):
+        fake = Faker()
+        fake.seed_instance(seed)
+        self.seed = seed
+        self.exponent = exponent
+        self.password = make_password(password)
+        self.names = [fake.name() for _ in range(POOL_SIZE)]
+        self.texts = [fake.text(max_nb_chars=255) for _ in range(POOL_SIZE)]
+        self.image_urls = [fake.image_url() for _ in range(POOL_SIZE)]
+        self.tag_ids = [tag.id for tag in Tag.objects.upsert(fake.words(TAG_COUNT, unique=True))]
+        self.user_ids = self.authors = self.posts = None
+
+    def rank(self, ids):
+        """
+        Returns `ids` in a random order and the cumulative Zipf weights of their ranks, for `random.choices`.
+        """
+        ids = list(ids)
+        random.Random(self.seed).shuffle(ids)
+        return ids, list(itertools.accumulate(1 / rank ** self.exponent for rank in range(1, len(ids) + 1)))
+
+    def load_users(self):
+        self.user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+        self.authors = self.rank(self.user_ids)
+
+    def load_posts(self):
+        self.posts = self.rank(Post.objects.order_by('id').values_list('id', flat=True))
+
+    def create_users(self, rng, offset, count):
+        start = (User.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+        users = User.objects.bulk_create([User(username=f'fake{start + i}', email=f'fake{start + i}@example.com',
+                                               password=self.password) for i in range(count)])
+        UserProfile.objects.bulk_create([UserProfile(user=user, full_name=rng.choice(self.names),
+                                                     bio=rng.choice(self.texts), avatar=rng.choice(self.image_urls))
+                                         for user in users])
+
+    def create_follows(self, rng, offset, count):
+        authors, cum_weights = self.authors
+        follows = zip(rng.choices(self.user_ids, k=count), rng.choices(authors, cum_weights=cum_weights, k=count))
+        Subscription.objects.bulk_create([Subscription(user_id=user_id, subscribed_to_id=author_id)
+                                          for user_id, author_id in follows if user_id != author_id],
+                                         ignore_conflicts=True)
+
+    def create_posts(self, rng, offset, count):
+        authors, cum_weights = self.authors
+        posts = Post.objects.bulk_create([Post(author_id=author_id, caption=rng.choice(self.texts))
+                                          for author_id in rng.choices(authors, cum_weights=cum_weights, k=count)])
+        # created_at is set on insert, the posts are spread over the last year afterwards.
+        now = timezone.now()
+        for post in posts:
+            post.created_at = now - timedelta(seconds=rng.randint(0, 365 * 24 * 60 * 60))
+        Post.objects.bulk_update(posts, ['created_at'])
+        PostImage.objects.bulk_create([PostImage(post=post, image=rng.choice(self.image_urls)) for post in posts])
+        PostTag.objects.bulk_create([PostTag(post=post, tag_id=tag_id) for post in posts
+                                     for tag_id in rng.sample(self.tag_ids, rng.randint(1, 3))])
+
+    def create_comments(self, rng, offset, count):
+        posts, cum_weights = self.posts
+        comments = zip(rng.choices(posts, cum_weights=cum_weights, k=count), rng.choices(self.user_ids, k=count))
+        Comment.objects.bulk_create([Comment(post_id=post_id, user_id=user_id, content=rng.choice(self.texts))
+                                     for post_id, user_id in comments])
+
+    def create_likes(self, rng, offset, count):
+        posts, cum_weights = self.posts
+        likes = zip(rng.choices(posts, cum_weights=cum_weights, k=count), rng.choices(self.user_ids, k=count))
+        PostLike.objects.bulk_create([PostLike(post_id=post_id, user_id=user_id) for post_id, user_id in likes],
+                                     ignore_conflicts=True)
+
+    def create_timelines(self, rng, offset, count):
+        for user_id in self.user_ids[offset:offset + count]:
+            TimelineEntry.objects.rebuild(User(pk=user_id))
+
+
+def generate(task):
+    """
+    Creates one batch of rows in a transaction, in this process or in a worker process.
+    """
+    step, offset, count = task
+    rng = random.Random(f'{dataset.seed}-{step}-{offset}')
+    with transaction.atomic():
+        getattr(dataset, f'create_{step}')(rng, offset, count)
 
 
 class Command(BaseCommand):
-    help = 'Populate the database with fake data'
+    help = 'Populate the database with a synthetic dataset of any size, inserted in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Number of users to create')
+        parser.add_argument('--posts', type=int, default=20, help='Number of posts to create')
+        parser.add_argument('--comments', type=int, default=30, help='Number of comments to create')
+        parser.add_argument('--likes', type=int, default=80,
+                            help='Number of post likes to generate, duplicates are skipped')
+        parser.add_argument('--follows', type=int, default=30,
+                            help='Number of subscriptions to generate, duplicates are skipped')
+        parser.add_argument('--exponent', type=float, default=1.0,
+                            help='Exponent of the Zipf distribution of followers, posts and likes')
+        parser.add_argument('--password', default='password123', help='Password of every created user')
+        parser.add_argument('--no-timelines', action='store_false', dest='timelines',
+                            help='Do not fill the feed timelines, run backfill_timelines later')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of rows inserted per transaction')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of processes inserting the batches (needs a database server)')
 
     def handle(self, *args, **options):
-        fake = Faker()
-        users = []
-        for i in range(10):
-            username = fake.user_name()
-            email = fake.email()
-            password = fake.password()
-            user = User.objects.create_user(
-                username=username, email=email, password=password)
-            users.append(user)
-            UserProfile.objects.create(
-                user=user,
-                full_name=fake.name(),
-                bio=fake.paragraph(),
-                avatar=fake.image_url())
-        for i in range(20):
-            author = random.choice(users)
-            post = Post.objects.create(
-                author=author, caption=fake.text(
-                    max_nb_chars=255), created_at=fake.date_time())
-            for j in range(random.randint(1, 5)):
-                PostImage.objects.create(post=post, image=fake.image_url())
-            for j in range(random.randint(1, 3)):
-                tag, created = Tag.objects.get_or_create(name=fake.word())
-                PostTag.objects.create(post=post, tag=tag)
-            for j in range(random.randint(1, 7)):
-                user = random.choice(users)
-                PostLike.objects.create(post=post, user=user)
-        for i in range(30):
-            user = random.choice(users)
-            post = random.choice(Post.objects.all())
-            comment = Comment.objects.create(
-                user=user, post=post, content=fake.text())
-            for j in range(random.randint(1, 3)):
-                tag, created = Tag.objects.get_or_create(name=fake.word())
-                CommentTag.objects.create(comment=comment, tag=tag)
-            for j in range(random.randint(1, 10)):
-                user = random.choice(users)
-                CommentLike.objects.create(comment=comment, user=user)
+        global dataset
+
+        if options['workers'] > 1 and connection.vendor == 'sqlite':
+            raise CommandError('--workers needs a database server, SQLite only allows one writer at a time.')
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise CommandError(f'{connection.vendor} does not return the ids of bulk inserted rows.')
+        dataset = Dataset(options['seed'], options['exponent'], options['password'])
+        # Users get consecutive usernames, so they are created in this process.
+        self.run('users', options['users'], {**options, 'workers': 1})
+        dataset.load_users()
+        self.run('follows', options['follows'], options)
+        self.run('posts', options['posts'], options)
+        dataset.load_posts()
+        self.run('comments', options['comments'], options)
+        self.run('likes', options['likes'], options)
+        call_command('recount', stdout=self.stdout)
+        if options['timelines']:
+            # The timelines are rebuilt like backfill_timelines does, in batches of users spread over the workers.
+            self.run('timelines', len(dataset.user_ids), options)
         self.stdout.write(self.style.SUCCESS(
             'Successfully populated the database with fake data.'))
+
+    def run(self, step, total, options):
+        batch_size = options['batch_size']
+        tasks = [(step, offset, min(batch_size, total - offset)) for offset in range(0, total, batch_size)]
+        if options['workers'] > 1:
+            # The workers must not share the connections of this process.
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(options['workers']) as pool:
+                for _ in pool.imap_unordered(generate, tasks):
+                    pass
+        else:
+            for task in tasks:
+                generate(task)
+        if options['verbosity'] > 1:
+            self.stdout.write(f'{step}: {total} generated')
@@ -0,0 +1,24 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from webapp import like_buffer
+
+
+class Command(BaseCommand):
+    help = 'Write the buffered post likes to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep flushing every LIKE_BUFFER_INTERVAL seconds, as the likes service does')
+
+    def handle(self, *args, **options):
+        while True:
+            flushed = like_buffer.flush()
+            if not options['loop']:
+                break
+            if flushed:
+                self.stdout.write(f'Flushed {flushed} buffered likes.')
+            time.sleep(settings.LIKE_BUFFER_INTERVAL)
+        self.stdout.write(self.style.SUCCESS(f'Successfully flushed {flushed} buffered likes.'))
@@ -0,0 +1,62 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter, so nothing is imported yet.
+STARTUP_SCRIPT = """
+import json
+import time
+
+started = time.perf_counter()
+import django
+from django.core.handlers.wsgi import WSGIHandler
+imported = time.perf_counter()
+django.setup(set_prefix=False)
+set_up = time.perf_counter()
+WSGIHandler()
+loaded = time.perf_counter()
+print(json.dumps({'import': imported - started, 'setup': set_up - imported, 'middleware': loaded - set_up,
+                  'total': loaded - started}))
+"""
+
+
+class Command(BaseCommand):
+    help = 'Measure how long a new process takes to import Django, run django.setup() and load the middleware'
+
+    def add_arguments(self, parser):
+        parser.add_argument('settings_modules', nargs='*', default=['djangogram.settings.prod'],
+                            help='The settings modules to measure')
+        parser.add_argument('--repeat', type=int, default=5, help='Start this many processes per settings module')
+        parser.add_argument('--max-seconds', type=float,
+                            help='Fail when the median total startup time of a settings module is longer')
+        parser.add_argument('--output', help='Write the median times to this JSON file')
+
+    def handle(self, *args, **options):
+        results = {}
+        for module in options['settings_modules']:
+            runs = [self.measure(module) for _ in range(options['repeat'])]
+            results[module] = {phase: statistics.median(run[phase] for run in runs) for phase in runs[0]}
+            self.stdout.write(self.style.MIGRATE_HEADING(module))
+            for phase, seconds in results[module].items():
+                self.stdout.write(f'  {phase}: {seconds * 1000:.0f} ms')
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
+        slow = [module for module, result in results.items()
+                if options['max_seconds'] is not None and result['total'] > options['max_seconds']]
+        if slow:
+            raise CommandError(f'Startup took longer than {options["max_seconds"]}s with {", ".join(slow)}.')
+        self.stdout.write(self.style.SUCCESS(f'Successfully measured {len(results)} settings modules.'))
+
+    def measure(self, module):
+        environ = {**os.environ, 'DJANGO_SETTINGS_MODULE': module}
+        process = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], env=environ, cwd=settings.BASE_DIR,
+                                 capture_output=True, text=True)
+        if process.returncode:
+            raise CommandError(f'Could not start Django with {module}:\n{process.stderr}')
+        return json.loads(process.stdout.splitlines()[-1])
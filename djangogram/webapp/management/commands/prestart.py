@@ -0,0 +1,60 @@
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.db.migrations.executor import MigrationExecutor
+
+# Key of the PostgreSQL advisory lock held while migrating, so only one replica migrates at a time.
+MIGRATION_LOCK_ID = 7341202
+
+
+class Command(BaseCommand):
+    help = 'Wait for the database and check or apply the migrations before the server starts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wait', type=float, default=60, help='Seconds to wait for the database')
+        parser.add_argument('--migrate', action='store_true',
+                            help='Apply the pending migrations instead of failing, one replica at a time')
+
+    def handle(self, *args, **options):
+        self.wait_for_database(options['wait'])
+        pending = self.get_pending_migrations()
+        if pending and not options['migrate']:
+            raise CommandError(f'Unapplied migrations: {", ".join(pending)}. Run migrate or start with --migrate.')
+        if pending:
+            self.migrate()
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully checked the database, {len(pending)} migrations applied.'))
+
+    def wait_for_database(self, seconds):
+        deadline = time.monotonic() + seconds
+        while True:
+            try:
+                connection.ensure_connection()
+                return
+            except OperationalError as error:
+                if time.monotonic() > deadline:
+                    raise CommandError(f'The database is not available after {seconds} seconds: {error}')
+                time.sleep(0.5)
+
+    @staticmethod
+    def get_pending_migrations():
+        executor = MigrationExecutor(connection)
+        plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+        return [f'{migration.app_label}.{migration.name}' for migration, _ in plan]
+
+    def migrate(self):
+        """
+        Applies the migrations. On PostgreSQL under an advisory lock: the other replicas wait for it
+        and then find nothing left to apply.
+        """
+        if connection.vendor != 'postgresql':
+            call_command('migrate', interactive=False, stdout=self.stdout)
+            return
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_lock(%s)', [MIGRATION_LOCK_ID])
+            try:
+                call_command('migrate', interactive=False, stdout=self.stdout)
+            finally:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', [MIGRATION_LOCK_ID])
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from webapp.follows import invalidate_high_fanout
+from webapp.models import Post, PostLike, Comment, CommentLike, Subscription, FollowerCount
+
+
+def count_subquery(queryset, field):
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(count=Count('*'))
+    return Coalesce(Subquery(counts.values('count')), Value(0))
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized like, comment and follower counters'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            posts = Post.objects.update(like_count=count_subquery(PostLike.objects, 'post'),
+                                        comment_count=count_subquery(Comment.objects, 'post'))
+            comments = Comment.objects.update(like_count=count_subquery(CommentLike.objects, 'comment'))
+            FollowerCount.objects.all().delete()
+            counts = Subscription.objects.order_by().values_list('subscribed_to').annotate(count=Count('*'))
+            authors = len(FollowerCount.objects.bulk_create(
+                [FollowerCount(user_id=user_id, count=count) for user_id, count in counts], batch_size=1000))
+        invalidate_high_fanout()
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully recounted {posts} posts, {comments} comments and {authors} followed users.'))
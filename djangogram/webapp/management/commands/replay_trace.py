@@ -0,0 +1,67 @@
+import json
+import socket
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks import replay
+
+
+def get_free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = 'Replay a recorded request trace against a server and report throughput, errors and latency per view'
+
+    def add_arguments(self, parser):
+        parser.add_argument('trace', help='The JSON lines trace written by webapp.tracing.TraceRecorderMiddleware')
+        parser.add_argument('--url', help='Replay against this running server instead of starting one')
+        parser.add_argument('--server', action='append', choices=['wsgi', 'asgi'], dest='servers',
+                            help='Start gunicorn with djangogram.wsgi or djangogram.asgi, repeat to compare both')
+        parser.add_argument('--workers', type=int, default=2, help='Workers of the started servers')
+        parser.add_argument('--concurrency', type=int, default=10, help='Virtual users replaying at the same time')
+        parser.add_argument('--repeat', type=int, default=1, help='Replay every visitor this many times')
+        parser.add_argument('--speed', type=float, default=0,
+                            help='Keep the recorded pauses, this many times faster (0 sends without pauses)')
+        parser.add_argument('--password', default='password123', help='Password of the users of the database')
+        parser.add_argument('--output', help='Write the summaries to this JSON file')
+
+    def handle(self, *args, **options):
+        if options['url'] and options['servers']:
+            raise CommandError('Use either --url or --server.')
+        visitors = replay.load_trace(options['trace'])
+        if not visitors:
+            raise CommandError(f'{options["trace"]} has no requests.')
+
+        summaries = {}
+        try:
+            if options['url']:
+                summaries[options['url']] = self.replay(options['url'].rstrip('/'), visitors, options)
+            for kind in options['servers'] or ([] if options['url'] else ['wsgi']):
+                port = get_free_port()
+                process = replay.start_server(kind, port, options['workers'])
+                try:
+                    summaries[kind] = self.replay(f'http://127.0.0.1:{port}', visitors, options)
+                finally:
+                    replay.stop_server(process)
+        except (ValueError, RuntimeError) as error:
+            raise CommandError(error)
+
+        for name, summary in summaries.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for view, result in summary.items():
+                self.stdout.write(f'  {view:<24} {result["requests"]:>6} requests {result["throughput"]:>8.1f}/s  '
+                                  f'{result["error_rate"]:>7.2%} errors  p50 {result["p50_ms"]:>8.2f} ms  '
+                                  f'p95 {result["p95_ms"]:>8.2f} ms  p99 {result["p99_ms"]:>8.2f} ms')
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(summaries, file, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully replayed {sum(len(records) for records in visitors) * options["repeat"]} requests '
+            f'against {len(summaries)} servers.'))
+
+    def replay(self, base_url, visitors, options):
+        return replay.replay(base_url, visitors, options['concurrency'], options['password'],
+                             repeat=options['repeat'], speed=options['speed'])
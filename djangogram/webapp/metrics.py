@@ -0,0 +1,65 @@
+"""
+Prometheus metrics of the views, the database and the cache.
+
+The metrics are served in the Prometheus text format by the `/metrics` view. When gunicorn runs several
+workers it sets `PROMETHEUS_MULTIPROC_DIR` (see gunicorn.conf.py), every worker then writes its values
+to files in that directory and the view adds them up, so any worker can answer the scrape.
+"""
+import ipaddress
+import os
+
+from django.conf import settings
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, \
+    generate_latest, multiprocess
+
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+
+request_duration = Histogram('djangogram_request_duration_seconds', 'Time to answer a request, by URL name.',
+                             ['view', 'method'])
+requests = Counter('djangogram_requests', 'Answered requests, by URL name and status code.',
+                   ['view', 'method', 'status'])
+request_queries = Histogram('djangogram_request_db_queries', 'Database queries run by a request, by URL name.',
+                            ['view'], buckets=QUERY_BUCKETS)
+request_query_duration = Histogram('djangogram_request_db_duration_seconds',
+                                   'Time a request spent in database queries, by URL name.', ['view'])
+cache_hits = Counter('djangogram_cache_hits', 'Cache lookups that found a fresh value, by namespace.',
+                     ['namespace'])
+cache_misses = Counter('djangogram_cache_misses', 'Cache lookups that found no fresh value, by namespace.',
+                       ['namespace'])
+likes = Counter('djangogram_likes', 'Likes given, by liked model.', ['target'])
+posts_created = Counter('djangogram_posts_created', 'Posts created.')
+comments_created = Counter('djangogram_comments_created', 'Comments created.')
+
+
+def observe_request(request, response, seconds, queries):
+    match = request.resolver_match
+    view = (match.url_name or match.view_name) if match else 'unmatched'
+    request_duration.labels(view, request.method).observe(seconds)
+    requests.labels(view, request.method, response.status_code).inc()
+    request_queries.labels(view).observe(queries.count)
+    request_query_duration.labels(view).observe(queries.seconds)
+
+
+def is_internal_request(request):
+    """
+    Returns whether `request` was sent straight from `METRICS_INTERNAL_NETWORKS`. Requests forwarded by
+    nginx, which sets X-Forwarded-For, come from its internal address but may be from anyone.
+    """
+    if 'HTTP_X_FORWARDED_FOR' in request.META:
+        return False
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network) for network in settings.METRICS_INTERNAL_NETWORKS)
+
+
+def render():
+    """
+    Returns the current metrics in the Prometheus text format and its content type.
+    """
+    registry = REGISTRY
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,132 @@
+import time
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.utils.functional import SimpleLazyObject
+
+from . import metrics, queries, routers
+from .follows import FollowSet
+
+
+class AsyncCapableMiddleware:
+    """
+    Base of the middleware that runs both under WSGI and ASGI without being adapted to a thread.
+    Subclasses implement `process(request, get_response)` for sync requests and
+    `aprocess(request, get_response)` for async requests.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.aprocess(request, self.get_response)
+        return self.process(request, self.get_response)
+
+
+class FollowSetMiddleware(AsyncCapableMiddleware):
+    """
+    Exposes the cached ids of the users followed by the current user as `request.user.following_ids`.
+    Must be placed after AuthenticationMiddleware, the user is still loaded lazily.
+    """
+
+    def process(self, request, get_response):
+        self.wrap_user(request)
+        return get_response(request)
+
+    async def aprocess(self, request, get_response):
+        self.wrap_user(request)
+        return await get_response(request)
+
+    def wrap_user(self, request):
+        user = request.user
+        request.user = SimpleLazyObject(lambda: self.attach_follow_set(user))
+
+    @staticmethod
+    def attach_follow_set(user):
+        user.following_ids = FollowSet(user.pk)
+        return user
+
+
+class AsyncUserMiddleware(AsyncCapableMiddleware):
+    """
+    Adds `request.auser()` as in Django 5, the coroutine async views await for the user of the session.
+    The user is loaded once and cached like `request.user`, so the templates don't load it again.
+    Must be placed after AuthenticationMiddleware.
+    """
+
+    def process(self, request, get_response):
+        request.auser = partial(self.auser, request)
+        return get_response(request)
+
+    async def aprocess(self, request, get_response):
+        request.auser = partial(self.auser, request)
+        return await get_response(request)
+
+    @staticmethod
+    async def auser(request):
+        if not hasattr(request, '_cached_user'):
+            # The session and auth backends of Django 4.2 are sync only.
+            request._cached_user = await sync_to_async(get_user)(request)
+        return request.user
+
+
+class ReplicaMiddleware(AsyncCapableMiddleware):
+    """
+    Lets the database reads of GET and HEAD requests go to the read replicas, unless the user sent a POST
+    in the last `REPLICA_PIN_SECONDS`, which is remembered in the `PIN_COOKIE` cookie.
+    """
+    PIN_COOKIE = 'primary_pin'
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def process(self, request, get_response):
+        token = routers.use_replicas.set(self.can_use_replicas(request))
+        try:
+            response = get_response(request)
+        finally:
+            routers.use_replicas.reset(token)
+        return self.pin(request, response)
+
+    async def aprocess(self, request, get_response):
+        token = routers.use_replicas.set(self.can_use_replicas(request))
+        try:
+            response = await get_response(request)
+        finally:
+            routers.use_replicas.reset(token)
+        return self.pin(request, response)
+
+    def can_use_replicas(self, request):
+        return request.method in self.SAFE_METHODS and self.PIN_COOKIE not in request.COOKIES
+
+    def pin(self, request, response):
+        if request.method not in self.SAFE_METHODS and settings.REPLICA_DATABASES:
+            response.set_cookie(self.PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True,
+                                samesite='Lax')
+        return response
+
+
+class MetricsMiddleware(AsyncCapableMiddleware):
+    """
+    Records the latency, status code and database queries of every request per URL name.
+    Should be the first middleware, so the time of the others is included.
+    """
+
+    def process(self, request, get_response):
+        started = time.perf_counter()
+        with queries.collect() as stats:
+            response = get_response(request)
+        metrics.observe_request(request, response, time.perf_counter() - started, stats)
+        return response
+
+    async def aprocess(self, request, get_response):
+        started = time.perf_counter()
+        with queries.collect() as stats:
+            response = await get_response(request)
+        metrics.observe_request(request, response, time.perf_counter() - started, stats)
+        return response
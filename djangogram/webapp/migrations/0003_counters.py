@@ -0,0 +1,44 @@
+# Generated by Django 4.2.1 on 2026-10-16 20:45
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(model, field):
+    counts = model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(count=Count('*'))
+    return Coalesce(Subquery(counts.values('count')), Value(0))
+
+
+def populate_counters(apps, schema_editor):
+    Post = apps.get_model('webapp', 'Post')
+    Comment = apps.get_model('webapp', 'Comment')
+    Post.objects.update(like_count=count_subquery(apps.get_model('webapp', 'PostLike'), 'post'),
+                        comment_count=count_subquery(Comment, 'post'))
+    Comment.objects.update(like_count=count_subquery(apps.get_model('webapp', 'CommentLike'), 'comment'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0002_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
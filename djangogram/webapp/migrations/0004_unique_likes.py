@@ -0,0 +1,41 @@
+# Generated by Django 4.2.1 on 2026-10-16 20:47
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(model, field):
+    counts = model.objects.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(count=Count('*'))
+    return Coalesce(Subquery(counts.values('count')), Value(0))
+
+
+def remove_duplicate_likes(apps, schema_editor):
+    for like_model_name, target_model_name, field in [('PostLike', 'Post', 'post'),
+                                                       ('CommentLike', 'Comment', 'comment')]:
+        Like = apps.get_model('webapp', like_model_name)
+        duplicates = Like.objects.values(field, 'user').annotate(keep=Min('id'), count=Count('id')).filter(count__gt=1)
+        for duplicate in duplicates:
+            Like.objects.filter(**{field: duplicate[field], 'user': duplicate['user']}).exclude(
+                id=duplicate['keep']).delete()
+        Target = apps.get_model('webapp', target_model_name)
+        Target.objects.update(like_count=count_subquery(Like, field))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0003_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_likes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='commentlike',
+            constraint=models.UniqueConstraint(fields=('comment', 'user'), name='unique_comment_like'),
+        ),
+        migrations.AddConstraint(
+            model_name='postlike',
+            constraint=models.UniqueConstraint(fields=('post', 'user'), name='unique_post_like'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.1 on 2026-10-16 20:51
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_subscriptions(apps, schema_editor):
+    """
+    Copies the subscriptions stored only in UserProfile.subscriptions into Subscription
+    and removes duplicated Subscription rows, so the unique constraint can be added.
+    """
+    Subscription = apps.get_model('webapp', 'Subscription')
+    UserProfile = apps.get_model('webapp', 'UserProfile')
+    duplicates = Subscription.objects.values('user', 'subscribed_to').annotate(
+        keep=Min('id'), count=Count('id')).filter(count__gt=1)
+    for duplicate in duplicates:
+        Subscription.objects.filter(user=duplicate['user'], subscribed_to=duplicate['subscribed_to']).exclude(
+            id=duplicate['keep']).delete()
+    existing = set(Subscription.objects.values_list('user_id', 'subscribed_to_id'))
+    rows = UserProfile.subscriptions.through.objects.values_list('userprofile__user_id', 'user_id')
+    missing = {row for row in rows.iterator() if row not in existing}
+    Subscription.objects.bulk_create([Subscription(user_id=user_id, subscribed_to_id=subscribed_to_id)
+                                      for user_id, subscribed_to_id in missing], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0004_unique_likes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_subscriptions, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['subscribed_to', 'user'], name='subscription_subscribers_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='subscription',
+            constraint=models.UniqueConstraint(fields=('user', 'subscribed_to'), name='unique_subscription'),
+        ),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='subscriptions',
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.1 on 2026-10-16 20:56
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def normalize(name):
+    return ' '.join(name.strip().lstrip('#').split()).lower()[:255]
+
+
+def merge_tags(apps, schema_editor):
+    Tag = apps.get_model('webapp', 'Tag')
+    links = [(apps.get_model('webapp', 'PostTag'), 'post'), (apps.get_model('webapp', 'CommentTag'), 'comment')]
+    keepers = {}
+    for tag in Tag.objects.order_by('id').iterator():
+        name = normalize(tag.name)
+        if not name:
+            tag.delete()
+        elif name in keepers:
+            for Link, _ in links:
+                Link.objects.filter(tag=tag).update(tag=keepers[name])
+            tag.delete()
+        else:
+            keepers[name] = tag
+            if tag.name != name:
+                tag.name = name
+                tag.save(update_fields=['name'])
+    for Link, field in links:
+        duplicates = Link.objects.values(field, 'tag').annotate(keep=Min('id'), count=Count('id')).filter(count__gt=1)
+        for duplicate in duplicates:
+            Link.objects.filter(**{field: duplicate[field], 'tag': duplicate['tag']}).exclude(
+                id=duplicate['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webapp', '0005_unify_subscriptions'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_tags, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tag',
+            name='name',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+        migrations.AddConstraint(
+            model_name='commenttag',
+            constraint=models.UniqueConstraint(fields=('comment', 'tag'), name='unique_comment_tag'),
+        ),
+        migrations.AddConstraint(
+            model_name='posttag',
+            constraint=models.UniqueConstraint(fields=('post', 'tag'), name='unique_post_tag'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.1 on 2026-10-16 23:16
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def count_followers(apps, schema_editor):
+    Subscription = apps.get_model('webapp', 'Subscription')
+    FollowerCount = apps.get_model('webapp', 'FollowerCount')
+    counts = Subscription.objects.order_by().values_list('subscribed_to').annotate(count=Count('*'))
+    FollowerCount.objects.bulk_create([FollowerCount(user_id=user_id, count=count) for user_id, count in counts],
+                                      batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('webapp', '0008_post_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FollowerCount',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='follower_count', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_followers, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='timelineentry',
+            name='timeline_owner_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['owner', '-created_at', '-post'], name='timeline_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='followercount',
+            index=models.Index(fields=['count'], name='follower_count_idx'),
+        ),
+    ]
@@ -1,7 +1,12 @@
 from cloudinary.models import CloudinaryField
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Exists, F, OuterRef, Prefetch
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .pagination import page_queryset
 
 
 class UserProfile(models.Model):
@@ -9,45 +14,419 @@ class UserProfile(models.Model):
     full_name = models.CharField(max_length=255)
     bio = models.TextField(blank=True)
     avatar = CloudinaryField(getattr(settings, 'CLOUDINARY_AVATAR_FOLDER'), blank=True)
-    subscriptions = models.ManyToManyField(User, blank=True, related_name='user_subscriptions')
+
+    @property
+    def subscriptions(self):
+        """
+        The users this profile is subscribed to.
+        """
+        return User.objects.filter(user_subscribers__user=self.user_id)
+
+
+class SubscriptionManager(models.Manager):
+    TOGGLE_SQL = """
+        WITH target AS (
+            SELECT {user_pk} FROM {user_table} WHERE {user_pk} = %(subscribed_to)s
+        ), deleted AS (
+            DELETE FROM {table} WHERE {user_column} = %(user)s AND {subscribed_to_column} IN (SELECT * FROM target)
+            RETURNING 1
+        ), inserted AS (
+            INSERT INTO {table} ({user_column}, {subscribed_to_column}, {created_at_column})
+            SELECT %(user)s, {user_pk}, %(now)s FROM target WHERE NOT EXISTS (SELECT 1 FROM deleted)
+            ON CONFLICT DO NOTHING RETURNING 1
+        ), delta AS (
+            SELECT (SELECT COUNT(*) FROM inserted) - (SELECT COUNT(*) FROM deleted) AS value
+        ), counted AS (
+            INSERT INTO {count_table} ({count_user_column}, {count_column})
+            SELECT {user_pk}, GREATEST(value, 0) FROM target, delta WHERE value <> 0
+            ON CONFLICT ({count_user_column}) DO UPDATE SET {count_column} = GREATEST(
+                {count_table}.{count_column} + (SELECT value FROM delta), 0)
+            RETURNING {count_column}
+        )
+        SELECT EXISTS (SELECT 1 FROM target), NOT EXISTS (SELECT 1 FROM deleted), (SELECT value FROM delta),
+            (SELECT {count_column} FROM counted)
+    """
+
+    def toggle(self, user, subscribed_to_id):
+        """
+        Subscribes `user` to the user `subscribed_to_id` or removes the subscription if it exists.
+        On PostgreSQL this is a single statement, other databases use a short transaction.
+        Concurrent toggles never create duplicate subscriptions, and the follower count of the user
+        only moves by the rows actually inserted or deleted.
+        Returns:
+            bool: Whether `user` is subscribed after the toggle.
+        Raises:
+            User.DoesNotExist: If there is no user `subscribed_to_id`.
+        """
+        if connection.vendor == 'postgresql':
+            return self._toggle_in_one_statement(user, subscribed_to_id)
+        with transaction.atomic():
+            if not User.objects.filter(pk=subscribed_to_id).exists():
+                raise User.DoesNotExist(f'No user {subscribed_to_id}.')
+            deleted, _ = self.filter(user=user, subscribed_to=subscribed_to_id).delete()
+            delta = -deleted
+            if not deleted:
+                try:
+                    with transaction.atomic():
+                        self.create(user=user, subscribed_to_id=subscribed_to_id)
+                    delta = 1
+                except IntegrityError:
+                    pass
+            if delta:
+                FollowerCount.objects.add(subscribed_to_id, delta)
+        return not deleted
+
+    def _toggle_in_one_statement(self, user, subscribed_to_id):
+        from .follows import invalidate_high_fanout
+
+        quote = connection.ops.quote_name
+        meta = self.model._meta
+        count_meta = FollowerCount._meta
+        sql = self.TOGGLE_SQL.format(
+            user_table=quote(User._meta.db_table), user_pk=quote(User._meta.pk.column), table=quote(meta.db_table),
+            user_column=quote(meta.get_field('user').column),
+            subscribed_to_column=quote(meta.get_field('subscribed_to').column),
+            created_at_column=quote(meta.get_field('created_at').column), count_table=quote(count_meta.db_table),
+            count_user_column=quote(count_meta.pk.column), count_column=quote(count_meta.get_field('count').column))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {'user': user.pk, 'subscribed_to': subscribed_to_id, 'now': timezone.now()})
+            exists, is_subscribed, delta, count = cursor.fetchone()
+        if not exists:
+            raise User.DoesNotExist(f'No user {subscribed_to_id}.')
+        if delta and FollowerCount.objects.crosses_limit(count, delta):
+            invalidate_high_fanout()
+        return is_subscribed
 
 
 class Subscription(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='subscriptions')
-    subscribed_to = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_subscribers')
+    # The foreign keys have no index of their own: `unique_subscription` starts with `user` and
+    # `subscription_subscribers_idx` with `subscribed_to`, the two serve their lookups and cascades.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='subscriptions', db_index=False)
+    subscribed_to = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_subscribers',
+                                      db_index=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    objects = SubscriptionManager()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'subscribed_to'], name='unique_subscription')]
+        indexes = [models.Index(fields=['subscribed_to', 'user'], name='subscription_subscribers_idx')]
+
+
+class FollowerCountManager(models.Manager):
+    def add(self, author_id, delta):
+        """
+        Moves the follower count of `author_id` by `delta`, creating it for the first follower. When the count
+        crosses `FEED_FANOUT_LIMIT` the cached ids of the high fan-out authors are dropped.
+        """
+        from .follows import invalidate_high_fanout
+
+        # The count that would cross the limit is excluded, so the usual case is a single UPDATE.
+        crossing = settings.FEED_FANOUT_LIMIT if delta > 0 else settings.FEED_FANOUT_LIMIT + 1
+        count = Greatest(F('count') + delta, 0)
+        if self.filter(pk=author_id).exclude(count=crossing).update(count=count):
+            return
+        if self.filter(pk=author_id, count=crossing).update(count=count):
+            invalidate_high_fanout()
+        elif delta > 0:
+            # The first follower, the count is created and moved like an existing one.
+            self.bulk_create([self.model(user_id=author_id)], ignore_conflicts=True)
+            self.add(author_id, delta)
+
+    @staticmethod
+    def crosses_limit(count, delta):
+        """
+        Returns whether a follower count moved by `delta` to `count` crossed `FEED_FANOUT_LIMIT`.
+        """
+        return (count > settings.FEED_FANOUT_LIMIT) != (count - delta > settings.FEED_FANOUT_LIMIT)
+
+    def get_high_fanout_ids(self):
+        return self.filter(count__gt=settings.FEED_FANOUT_LIMIT).values_list('user_id', flat=True)
+
+
+class FollowerCount(models.Model):
+    """
+    The number of followers of a user, kept in sync by `Subscription.objects.toggle`
+    and recomputed by the recount command.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='follower_count')
+    count = models.PositiveIntegerField(default=0)
+    objects = FollowerCountManager()
 
+    class Meta:
+        indexes = [models.Index(fields=['count'], name='follower_count_idx')]
 
-class PostManager(models.Manager):
-    def get_feed_posts(self, user):
-        subscriptions = user.profile.subscriptions.all()
-        return Post.objects.filter(author__in=subscriptions).order_by('-created_at')
+
+class PostQuerySet(models.QuerySet):
+    def with_card_data(self, user):
+        """
+        Loads the author and the "liked by me" flag a post card renders for `user` in one query.
+        The "subscribed by me" flag is read from `request.user.following_ids`, images and tag names
+        are loaded by `cards.attach_fragments` for the posts whose card is not cached.
+        """
+        return self.select_related('author').annotate(
+            is_liked=Exists(PostLike.objects.filter(post=OuterRef('pk'), user=user)))
+
+
+class PostManager(models.Manager.from_queryset(PostQuerySet)):
+    def get_feed_posts(self, user, cursor=None, page_size=None):
+        """
+        Returns the posts of the page of the feed of `user` after `cursor`, newest first, and one more post
+        when there is a next page.
+        The page is a range of the materialized timeline of the user, read from its index. Authors with more
+        followers than `FEED_FANOUT_LIMIT` are not fanned out on write, the posts of the followed ones are read
+        from the author index over the same range and merged in.
+        Parameters:
+            user (User): The owner of the feed.
+            cursor (str): The cursor of the previous page or None for the first page.
+            page_size (int): The number of posts on a page, `POSTS_PAGE_SIZE` by default.
+        Returns:
+            list: Up to `page_size + 1` posts loaded `with_card_data`.
+        """
+        from .follows import get_follow_set, get_high_fanout_ids
+
+        page_size = page_size or settings.POSTS_PAGE_SIZE
+        entries = list(TimelineEntry.objects.get_page(user, cursor, page_size))
+        high_fanout_ids = get_high_fanout_ids()
+        if high_fanout_ids:
+            high_fanout_ids = high_fanout_ids & get_follow_set(user).ids
+        pulled = []
+        if high_fanout_ids:
+            pulled = list(self.get_high_fanout_page(user, high_fanout_ids, entries, cursor, page_size))
+        return self.merge_feed(entries, pulled, page_size)
+
+    async def aget_feed_posts(self, user, cursor=None, page_size=None):
+        """
+        `get_feed_posts` for async views, the queries run through the async ORM.
+        """
+        from .follows import aget_high_fanout_ids, get_follow_set
+
+        page_size = page_size or settings.POSTS_PAGE_SIZE
+        entries = [entry async for entry in TimelineEntry.objects.get_page(user, cursor, page_size)]
+        high_fanout_ids = await aget_high_fanout_ids()
+        if high_fanout_ids:
+            high_fanout_ids = high_fanout_ids & await get_follow_set(user).aload()
+        pulled = []
+        if high_fanout_ids:
+            pulled = [post async for post in self.get_high_fanout_page(user, high_fanout_ids, entries, cursor,
+                                                                       page_size)]
+        return self.merge_feed(entries, pulled, page_size)
+
+    def get_high_fanout_page(self, user, author_ids, entries, cursor, page_size):
+        pulled = self.filter(author__in=author_ids).with_card_data(user)
+        if len(entries) > page_size:
+            # Older posts than the last entry are on the next pages.
+            pulled = pulled.filter(created_at__gte=entries[-1].created_at)
+        return page_queryset(pulled, cursor, page_size, descending=True)
+
+    @staticmethod
+    def merge_feed(entries, pulled, page_size):
+        posts = []
+        for entry in entries:
+            entry.post.is_liked = entry.is_liked
+            posts.append(entry.post)
+        if pulled:
+            timeline_ids = {post.id for post in posts}
+            posts += [post for post in pulled if post.id not in timeline_ids]
+            posts.sort(key=lambda post: (post.created_at, post.id), reverse=True)
+        return posts[:page_size + 1]
+
+    def bump_version(self, post):
+        """
+        Invalidates the cached card of `post` after its caption, images or tags changed.
+        """
+        self.filter(pk=post.pk).update(version=F('version') + 1)
 
 
 class Post(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
     caption = models.CharField(max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    version = models.PositiveIntegerField(default=0)
     objects = PostManager()
 
+    class Meta:
+        indexes = [models.Index(fields=['-created_at', '-id'], name='post_created_idx'),
+                   models.Index(fields=['author', '-created_at'], name='post_author_created_idx')]
+
+    @property
+    def tag_names(self):
+        return [post_tag.tag.name for post_tag in self.tags.all()]
+
 
 class PostImage(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='images')
     image = CloudinaryField(getattr(settings, 'CLOUDINARY_MEDIA_FOLDER'), blank=True)
 
 
+class TagManager(models.Manager):
+    """
+    Assigns tags to posts and comments with a constant number of queries.
+    """
+
+    def normalize(self, names):
+        """
+        Splits comma-separated tag names and normalizes them.
+        Parameters:
+            names (str): The tag names separated by commas, as entered in the tag form.
+        Returns:
+            list: The unique non-empty names, lowercased, without a leading '#' and with single spaces,
+                in the order they were entered.
+        """
+        max_length = self.model._meta.get_field('name').max_length
+        normalized = {}
+        for name in names.split(','):
+            name = ' '.join(name.strip().lstrip('#').split()).lower()[:max_length]
+            if name:
+                normalized.setdefault(name, None)
+        return list(normalized)
+
+    def upsert(self, names):
+        """
+        Returns the tags with the given normalized names, creating the missing ones in one query.
+        Parameters:
+            names (list): The normalized tag names.
+        Returns:
+            list: The tags in the order of `names`.
+        """
+        if not names:
+            return []
+        self.bulk_create([self.model(name=name) for name in names], ignore_conflicts=True)
+        tags = self.in_bulk(names, field_name='name')
+        return [tags[name] for name in names]
+
+    def assign(self, obj, names):
+        """
+        Links a post or a comment to the tags with the given names. Existing links are kept.
+        Parameters:
+            obj (Post | Comment): The tagged object.
+            names (str): The tag names separated by commas.
+        Returns:
+            list: The tags linked to the object.
+        """
+        tags = self.upsert(self.normalize(names))
+        link_model = obj.tags.model
+        link_model.objects.bulk_create([link_model(**{obj.tags.field.name: obj}, tag=tag) for tag in tags],
+                                       ignore_conflicts=True)
+        return tags
+
+
 class Tag(models.Model):
-    name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, unique=True)
+    objects = TagManager()
 
 
 class PostTag(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='tags')
     tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='posts')
 
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['post', 'tag'], name='unique_post_tag')]
+
+
+class LikeManager(models.Manager):
+    """
+    Toggles likes of the liked model (the foreign key other than `user`) and keeps its `like_count` in sync.
+    """
+    TOGGLE_SQL = """
+        WITH target AS (
+            {target_sql}
+        ), deleted AS (
+            DELETE FROM {like_table} WHERE {target_column} IN (SELECT * FROM target) AND {user_column} = %s
+            RETURNING 1
+        ), inserted AS (
+            INSERT INTO {like_table} ({target_column}, {user_column})
+            SELECT {target_pk}, %s FROM target WHERE NOT EXISTS (SELECT 1 FROM deleted)
+            ON CONFLICT DO NOTHING RETURNING 1
+        ), updated AS (
+            UPDATE {target_table} SET {counter_column} = GREATEST({counter_column}
+                + (SELECT COUNT(*) FROM inserted) - (SELECT COUNT(*) FROM deleted), 0)
+            WHERE {target_pk} IN (SELECT * FROM target) RETURNING {counter_column}
+        )
+        SELECT NOT EXISTS (SELECT 1 FROM deleted), (SELECT {counter_column} FROM updated)
+    """
+
+    @property
+    def target_field(self):
+        return next(field for field in self.model._meta.concrete_fields if field.is_relation and field.name != 'user')
+
+    def toggle(self, target_id, user, **filters):
+        """
+        Likes the target `target_id` for `user` or removes the like if it exists, without loading the target.
+        On PostgreSQL this is a single statement, other databases use a short transaction.
+        Concurrent toggles never create duplicate likes, and the counter only moves by the rows
+        actually inserted or deleted.
+        Parameters:
+            target_id (int): The id of the liked post or comment.
+            user (User): The user who likes the target.
+            filters: Conditions the target must also match, such as the post of a comment.
+        Returns:
+            tuple: Whether the target is liked after the toggle and its like count.
+        Raises:
+            DoesNotExist: If no target matches, the exception of the liked model.
+        """
+        target_model = self.target_field.related_model
+        targets = target_model.objects.filter(pk=target_id, **filters)
+        if connection.vendor == 'postgresql':
+            is_liked, like_count = self._toggle_in_one_statement(targets, user)
+        else:
+            with transaction.atomic():
+                is_liked, like_count = self._toggle_in_transaction(targets, target_id, user)
+        if like_count is None:
+            raise target_model.DoesNotExist(f'No {target_model._meta.object_name} {target_id}.')
+        return is_liked, like_count
+
+    def _toggle_in_transaction(self, targets, target_id, user):
+        if not targets.exists():
+            return False, None
+        lookup = {self.target_field.attname: target_id, 'user': user}
+        deleted, _ = self.filter(**lookup).delete()
+        delta = -deleted
+        if not deleted:
+            try:
+                with transaction.atomic():
+                    self.create(**lookup)
+                delta = 1
+            except IntegrityError:
+                pass
+        if delta:
+            # A counter that drifted below the likes stays at 0 instead of breaking its CHECK constraint.
+            targets.update(like_count=Greatest(F('like_count') + delta, 0))
+        return not deleted, targets.values_list('like_count', flat=True).first()
+
+    def _toggle_in_one_statement(self, targets, user):
+        quote = connection.ops.quote_name
+        field = self.target_field
+        target_meta = field.related_model._meta
+        target_sql, target_params = targets.values('pk').query.sql_with_params()
+        sql = self.TOGGLE_SQL.format(
+            target_sql=target_sql, like_table=quote(self.model._meta.db_table), target_column=quote(field.column),
+            user_column=quote(self.model._meta.get_field('user').column), target_table=quote(target_meta.db_table),
+            target_pk=quote(target_meta.pk.column), counter_column=quote(target_meta.get_field('like_count').column))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [*target_params, user.pk, user.pk])
+            return cursor.fetchone()
+
 
 class PostLike(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='likes')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='post_likes')
+    objects = LikeManager()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['post', 'user'], name='unique_post_like')]
+
+
+class CommentQuerySet(models.QuerySet):
+    def with_card_data(self, user):
+        """
+        Loads the author, tag names and the "liked by me" flag of the comments for `user`
+        with a fixed number of queries.
+        """
+        return self.select_related('user').prefetch_related(
+            Prefetch('tags', queryset=CommentTag.objects.select_related('tag'))).annotate(
+            is_liked=Exists(CommentLike.objects.filter(comment=OuterRef('pk'), user=user)))
 
 
 class Comment(models.Model):
@@ -55,13 +434,103 @@ class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    like_count = models.PositiveIntegerField(default=0)
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=['post', 'created_at', 'id'], name='comment_post_created_idx')]
+
+    @property
+    def tag_names(self):
+        return [comment_tag.tag.name for comment_tag in self.tags.all()]
 
 
 class CommentTag(models.Model):
     comment = models.ForeignKey(Comment, on_delete=models.CASCADE, related_name='tags')
     tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='comments')
 
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['comment', 'tag'], name='unique_comment_tag')]
+
 
 class CommentLike(models.Model):
     comment = models.ForeignKey(Comment, on_delete=models.CASCADE, related_name='likes')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comment_likes')
+    objects = LikeManager()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['comment', 'user'], name='unique_comment_like')]
+
+
+class TimelineManager(models.Manager):
+    def get_page(self, user, cursor, page_size):
+        """
+        Returns the entries of the timeline of `user` after `cursor` with their posts and the "liked by me" flag,
+        a range scan of the timeline index ordered like the posts, by (created_at, post id).
+        """
+        entries = self.filter(owner=user).select_related('post__author').annotate(
+            is_liked=Exists(PostLike.objects.filter(post=OuterRef('post_id'), user=user)))
+        return page_queryset(entries, cursor, page_size, descending=True, id_field='post_id')
+
+    def fan_out(self, post):
+        """
+        Writes the post into the timeline of every follower of its author.
+        Authors with more followers than `FEED_FANOUT_LIMIT` are skipped and served on read.
+        """
+        from .follows import get_high_fanout_ids
+
+        if post.author_id in get_high_fanout_ids():
+            return []
+        follower_ids = Subscription.objects.filter(subscribed_to=post.author_id).values_list('user_id', flat=True)
+        entries = [self.model(owner_id=owner_id, post=post, created_at=post.created_at) for owner_id in follower_ids]
+        return self.bulk_create(entries, batch_size=1000, ignore_conflicts=True)
+
+    def follow(self, user, author):
+        """
+        Backfills the timeline of `user` with the latest posts of `author`.
+        """
+        from .follows import get_high_fanout_ids
+
+        if author.pk in get_high_fanout_ids():
+            return []
+        posts = Post.objects.filter(author=author).order_by('-created_at').values_list('id', 'created_at')
+        entries = [self.model(owner=user, post_id=post_id, created_at=created_at)
+                   for post_id, created_at in posts[:settings.FEED_BACKFILL_SIZE]]
+        return self.bulk_create(entries, ignore_conflicts=True)
+
+    def unfollow(self, user, author):
+        """
+        Removes the posts of `author` from the timeline of `user`.
+        """
+        return self.filter(owner=user, post__author=author).delete()
+
+    def rebuild(self, user, batch_size=1000):
+        """
+        Replaces the timeline of `user` with the posts of every author they follow.
+        """
+        from .follows import get_high_fanout_ids
+
+        self.filter(owner=user).delete()
+        posts = Post.objects.filter(author__user_subscribers__user=user).exclude(
+            author__in=get_high_fanout_ids()).values_list('id', 'created_at')
+        created = 0
+        batch = []
+        for post_id, created_at in posts.iterator(chunk_size=batch_size):
+            batch.append(self.model(owner=user, post_id=post_id, created_at=created_at))
+            if len(batch) >= batch_size:
+                created += len(self.bulk_create(batch, ignore_conflicts=True))
+                batch = []
+        if batch:
+            created += len(self.bulk_create(batch, ignore_conflicts=True))
+        return created
+
+
+class TimelineEntry(models.Model):
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    created_at = models.DateTimeField()
+    objects = TimelineManager()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['owner', 'post'], name='unique_timeline_entry')]
+        indexes = [models.Index(fields=['owner', '-created_at', '-post'], name='timeline_owner_created_idx')]
@@ -0,0 +1,91 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import Http404
+
+# The largest id of a BigAutoField.
+MAX_ID = 2 ** 63 - 1
+
+
+def encode_cursor(obj):
+    """
+    Encodes the position of `obj` as an opaque cursor.
+    Parameters:
+        obj (Model): An object with `created_at` and `id` fields.
+    Returns:
+        str: A url-safe cursor pointing right after `obj`.
+    """
+    value = f'{obj.created_at.isoformat()}|{obj.id}'
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decodes a cursor produced by `encode_cursor`.
+    Parameters:
+        cursor (str): The opaque cursor.
+    Returns:
+        tuple: The (created_at, id) pair of the last object of the previous page.
+    Raises:
+        Http404: If the cursor is malformed.
+    """
+    try:
+        value = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = value.split('|')
+        created_at, pk = datetime.fromisoformat(created_at), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise Http404('Invalid cursor')
+    # Out of range values would fail in the database instead.
+    if not 0 < pk <= MAX_ID or (settings.USE_TZ and created_at.tzinfo is None):
+        raise Http404('Invalid cursor')
+    return created_at, pk
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def page_queryset(queryset, cursor, page_size, descending, id_field='id'):
+    """
+    Returns the slice of `queryset` holding the page after `cursor` and one more object.
+    The objects are ordered by `created_at` and `id_field`, the field holding the id of the paginated posts
+    or comments.
+    """
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        lookup = 'lt' if descending else 'gt'
+        queryset = queryset.filter(Q(**{f'created_at__{lookup}': created_at})
+                                   | Q(created_at=created_at, **{f'{id_field}__{lookup}': pk}))
+    ordering = ('-created_at', f'-{id_field}') if descending else ('created_at', id_field)
+    return queryset.order_by(*ordering)[:page_size + 1]
+
+
+def make_page(object_list, page_size):
+    next_cursor = None
+    if len(object_list) > page_size:
+        object_list = object_list[:page_size]
+        next_cursor = encode_cursor(object_list[-1])
+    return KeysetPage(object_list, next_cursor)
+
+
+def paginate(queryset, cursor, page_size, descending=True):
+    """
+    Returns one page of `queryset` ordered by (created_at, id) without OFFSET scans.
+    Parameters:
+        queryset (QuerySet): The objects to paginate, they must have `created_at` and `id` fields.
+        cursor (str): The cursor of the previous page or None for the first page.
+        page_size (int): The maximum number of objects on the page.
+        descending (bool): Whether the newest objects come first.
+    Returns:
+        KeysetPage: The objects of the page and the cursor of the next page.
+    """
+    return make_page(list(page_queryset(queryset, cursor, page_size, descending)), page_size)
@@ -0,0 +1,46 @@
+"""
+PostgreSQL backend keeping the closed connections in a pool of the process.
+
+Closing a connection outside of a transaction returns it to the pool of its database, and opening one takes
+a pooled connection when there is one, so requests skip the connection setup even when Django closes the
+connection at the end of every request, as under ASGI where `CONN_MAX_AGE` is 0 (see gunicorn.conf.py).
+At most `POOL_SIZE` idle connections are kept per database, set with `SQL_POOL_SIZE`.
+"""
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+from django.utils.asyncio import async_unsafe
+
+from webapp.db import get_pool
+
+
+def is_idle(connection):
+    # 0 is the IDLE transaction status of both psycopg2 and psycopg.
+    return not connection.closed and connection.info.transaction_status == 0
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    reused_from_pool = False
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict['POOL_SIZE'])
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        connection = self.pool.get()
+        while connection is not None:
+            if is_idle(connection):
+                self.reused_from_pool = True
+                self.isolation_level = IsolationLevel(
+                    self.settings_dict['OPTIONS'].get('isolation_level', IsolationLevel.READ_COMMITTED))
+                return connection
+            connection.close()
+            connection = self.pool.get()
+        self.reused_from_pool = False
+        return super().get_new_connection(conn_params)
+
+    def _close(self):
+        if (self.connection is not None and not self.in_atomic_block and not self.errors_occurred
+                and is_idle(self.connection) and self.pool.put(self.connection)):
+            return
+        return super()._close()
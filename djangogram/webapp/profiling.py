@@ -0,0 +1,118 @@
+"""
+Sampling request profiler that is safe to run in production.
+
+`PROFILE_SAMPLE_RATE` of the requests are run under cProfile. With `PROFILE_SLOW_REQUEST_MS` every request
+is timed and its database queries are counted, and the requests slower than the threshold are recorded
+even when they were not sampled. Records are written as JSON lines to `PROFILE_LOG_FILE`, rotated at
+`PROFILE_LOG_MAX_BYTES`, and listed by the `/internal/profiles/` view for staff users.
+cProfile sees one thread: under ASGI a sampled request is profiled on the event loop, without the sync code
+it runs in `sync_to_async` threads, and only one request at a time so concurrent requests do not mix.
+When both settings are 0 the middleware removes itself at startup.
+"""
+import cProfile
+import io
+import json
+import pstats
+import random
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.template.base import Template
+
+from . import cache, queries
+from .middleware import AsyncCapableMiddleware
+from .records import get_record_logger
+
+# Held while an async request is profiled on the event loop.
+event_loop_profile = threading.Lock()
+
+
+def get_template_seconds(stats):
+    """
+    Returns the time spent in `Template.render`, nested renders of included templates are counted once.
+    """
+    code = Template.render.__code__
+    key = (code.co_filename, code.co_firstlineno, code.co_name)
+    return stats.stats[key][3] if key in stats.stats else 0.0
+
+
+def read_profiles(limit):
+    """
+    Returns the last `limit` records of the current profile log, newest first.
+    """
+    try:
+        with open(settings.PROFILE_LOG_FILE) as file:
+            lines = deque(file, maxlen=limit)
+    except FileNotFoundError:
+        return []
+    return [json.loads(line) for line in reversed(lines)]
+
+
+class ProfilingMiddleware(AsyncCapableMiddleware):
+    """
+    Records the requests picked by `PROFILE_SAMPLE_RATE` or slower than `PROFILE_SLOW_REQUEST_MS`.
+    Should be the first middleware, so the time of the others is included.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILE_SAMPLE_RATE and not settings.PROFILE_SLOW_REQUEST_MS:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def process(self, request, get_response):
+        sampled = random.random() < settings.PROFILE_SAMPLE_RATE
+        if not sampled and not settings.PROFILE_SLOW_REQUEST_MS:
+            return get_response(request)
+
+        profile = cProfile.Profile() if sampled else None
+        started = time.perf_counter()
+        with queries.collect() as stats, cache.collect() as cache_stats:
+            if profile:
+                profile.enable()
+            try:
+                response = get_response(request)
+            finally:
+                if profile:
+                    profile.disable()
+        self.record(request, response, sampled, profile, stats, cache_stats, time.perf_counter() - started)
+        return response
+
+    async def aprocess(self, request, get_response):
+        sampled = random.random() < settings.PROFILE_SAMPLE_RATE and event_loop_profile.acquire(blocking=False)
+        if not sampled and not settings.PROFILE_SLOW_REQUEST_MS:
+            return await get_response(request)
+
+        profile = cProfile.Profile() if sampled else None
+        started = time.perf_counter()
+        with queries.collect() as stats, cache.collect() as cache_stats:
+            if profile:
+                profile.enable()
+            try:
+                response = await get_response(request)
+            finally:
+                if profile:
+                    profile.disable()
+                    event_loop_profile.release()
+        self.record(request, response, sampled, profile, stats, cache_stats, time.perf_counter() - started)
+        return response
+
+    @staticmethod
+    def record(request, response, sampled, profile, stats, cache_stats, seconds):
+        duration_ms = seconds * 1000
+        if not sampled and duration_ms < settings.PROFILE_SLOW_REQUEST_MS:
+            return
+        record = {'time': time.time(), 'method': request.method, 'path': request.path,
+                  'status': response.status_code, 'duration_ms': round(duration_ms, 2), 'sampled': sampled,
+                  'queries': stats.count, 'query_ms': round(stats.seconds * 1000, 2),
+                  'cache_hits': cache_stats.hits, 'cache_misses': cache_stats.misses}
+        if profile:
+            output = io.StringIO()
+            profile_stats = pstats.Stats(profile, stream=output)
+            record['template_ms'] = round(get_template_seconds(profile_stats) * 1000, 2)
+            profile_stats.sort_stats('cumulative').print_stats(settings.PROFILE_STATS_LINES)
+            record['profile'] = output.getvalue()
+        get_record_logger('webapp.profiling.records', settings.PROFILE_LOG_FILE,
+                          settings.PROFILE_LOG_MAX_BYTES).info(json.dumps(record))
@@ -0,0 +1,61 @@
+"""
+Per-request counting of the database queries.
+
+`record_query` is the one execute wrapper installed on every new database connection. It adds each query to
+the `QueryStats` collecting in the current context, which the metrics, the profiler and the query log open
+with `collect()`. The context variable is copied into `sync_to_async` threads, so the queries of async
+views are counted too.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+current_stats = ContextVar('current_query_stats', default=())
+
+
+class QueryStats:
+    """
+    The number of queries run while collecting and the time spent in them.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def add(self, sql, seconds):
+        self.count += 1
+        self.seconds += seconds
+
+
+@contextmanager
+def collect(stats=None):
+    """
+    Adds the queries run in the block to `stats`, a new `QueryStats` by default, and to the stats already
+    collecting.
+    Returns:
+        QueryStats: The stats collecting the queries.
+    """
+    stats = stats or QueryStats()
+    token = current_stats.set((*current_stats.get(), stats))
+    try:
+        yield stats
+    finally:
+        current_stats.reset(token)
+
+
+def record_query(execute, sql, params, many, context):
+    collecting = current_stats.get()
+    if not collecting:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        seconds = time.perf_counter() - started
+        for stats in collecting:
+            stats.add(sql, seconds)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
@@ -0,0 +1,137 @@
+"""
+Slow query log and N+1 detector.
+
+The queries of a request are collected into its `QueryLog` by `webapp.queries`.
+Queries slower than `SLOW_QUERY_MS` are logged with the URL name, the template line and the line of project
+code that ran them. Queries of the same shape (the SQL with its literals and IN lists collapsed) run
+`NPLUSONE_THRESHOLD` times in one request are reported once as an N+1 pattern, and requests running more
+queries than the budget of their URL name in `QUERY_BUDGETS` are reported as well. With `QUERY_LOG_STRICT`,
+which the test settings turn on, these reports raise `QueryBudgetExceeded` so the view tests fail.
+When all of the settings are off the middleware removes itself at startup.
+"""
+import logging
+import re
+import sys
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.utils import CursorWrapper
+from django.template.base import Node
+
+from . import queries
+from .middleware import AsyncCapableMiddleware
+
+logger = logging.getLogger(__name__)
+
+SHAPE_PATTERNS = [(re.compile(r"'(?:[^']|'')*'"), '?'),
+                  (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+                  (re.compile(r'\s+'), ' '),
+                  (re.compile(r'\((?:(?:%s|\?), )+(?:%s|\?)\)'), '(...)')]
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def get_shape(sql):
+    """
+    Returns `sql` with its literals replaced by `?` and its IN lists collapsed, so the queries
+    that only differ by their parameters have the same shape.
+    """
+    for pattern, replacement in SHAPE_PATTERNS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def get_origin():
+    """
+    Returns the template line and the line of project code that ran the current query, None when not found.
+    """
+    template = code = None
+    frame = sys._getframe(1)
+    # Skips the execute wrappers.
+    while frame and frame.f_code is not CursorWrapper._execute_with_wrappers.__code__:
+        frame = frame.f_back
+    while frame and not (template and code):
+        filename = frame.f_code.co_filename
+        if template is None and frame.f_code is Node.render_annotated.__code__:
+            node = frame.f_locals['self']
+            template = f'{node.origin.template_name}:{node.token.lineno}'
+        elif code is None and filename.startswith(str(settings.BASE_DIR)) \
+                and 'site-packages' not in filename:
+            code = f'{filename[len(str(settings.BASE_DIR)) + 1:]}:{frame.f_lineno}'
+        frame = frame.f_back
+    return template, code
+
+
+class QueryLog(queries.QueryStats):
+    """
+    The queries of one request.
+    Parameters:
+        request (HttpRequest): The request running the queries.
+    """
+
+    def __init__(self, request):
+        super().__init__()
+        self.request = request
+        self.shapes = Counter()
+        self.repeated = {}
+
+    @property
+    def view(self):
+        match = self.request.resolver_match
+        return (match.url_name or match.view_name) if match else self.request.path
+
+    def add(self, sql, seconds):
+        super().add(sql, seconds)
+        shape = get_shape(sql)
+        self.shapes[shape] += 1
+        if settings.SLOW_QUERY_MS and seconds * 1000 >= settings.SLOW_QUERY_MS:
+            template, code = get_origin()
+            logger.warning('Slow query (%.1f ms) in %s from %s, %s: %s', seconds * 1000, self.view, template, code,
+                           sql)
+        if self.shapes[shape] == settings.NPLUSONE_THRESHOLD:
+            self.repeated[shape] = get_origin()
+
+    def get_problems(self):
+        """
+        Returns the N+1 patterns and the exceeded budget of the request as messages.
+        """
+        problems = [f'N+1 in {self.view} from {template}, {code}: {self.shapes[shape]} queries like {shape}'
+                    for shape, (template, code) in self.repeated.items()]
+        budget = settings.QUERY_BUDGETS.get(self.view)
+        if budget is not None and self.count > budget:
+            problems.append(f'{self.view} ran {self.count} queries, over its budget of {budget}')
+        return problems
+
+
+class QueryLogMiddleware(AsyncCapableMiddleware):
+    """
+    Collects the queries of every request and reports its slow queries, N+1 patterns and exceeded budget.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_MS and not settings.NPLUSONE_THRESHOLD and not settings.QUERY_BUDGETS:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def process(self, request, get_response):
+        with queries.collect(QueryLog(request)) as log:
+            response = get_response(request)
+        self.report(log)
+        return response
+
+    async def aprocess(self, request, get_response):
+        with queries.collect(QueryLog(request)) as log:
+            response = await get_response(request)
+        self.report(log)
+        return response
+
+    @staticmethod
+    def report(log):
+        problems = log.get_problems()
+        if problems and settings.QUERY_LOG_STRICT:
+            raise QueryBudgetExceeded('\n'.join(problems))
+        for problem in problems:
+            logger.warning(problem)
@@ -0,0 +1,27 @@
+"""
+Rotated JSON lines files of the request profiles and traces.
+"""
+import logging
+import os
+import threading
+from logging.handlers import RotatingFileHandler
+
+lock = threading.Lock()
+
+
+def get_record_logger(name, path, max_bytes):
+    """
+    Returns the logger `name` writing records to `path`, rotated at `max_bytes` with three backups.
+    The file is reopened when `path` changed since the last call.
+    """
+    logger = logging.getLogger(name)
+    path = os.path.abspath(path)
+    with lock:
+        if not any(handler.baseFilename == path for handler in logger.handlers):
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+                handler.close()
+            logger.addHandler(RotatingFileHandler(path, maxBytes=max_bytes, backupCount=3))
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+    return logger
@@ -0,0 +1,28 @@
+"""
+Database router that sends the reads of GET requests to the read replicas.
+
+`ReplicaMiddleware` decides per request whether reads may go to a replica. Writes, and the reads of
+requests that are not GET or HEAD, always use the primary. After a user sends a POST their reads stay
+on the primary for `REPLICA_PIN_SECONDS`, so they see their own likes, comments and posts even if the
+replicas lag behind.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+use_replicas = ContextVar('use_replicas', default=False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if use_replicas.get() and settings.REPLICA_DATABASES:
+            return random.choice(settings.REPLICA_DATABASES)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same data as the primary.
+        return True
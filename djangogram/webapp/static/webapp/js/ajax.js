@@ -15,7 +15,7 @@
   \************************/
 /***/ (function() {
 
-eval("$(document).ready(function () {\n  $('.like-ajax').click(function (event) {\n    event.preventDefault();\n    var form = $(this).closest('form');\n    var url = form.attr('action');\n    $.ajax({\n      type: 'POST',\n      url: url,\n      data: form.serialize(),\n      dataTypes: \"json\",\n      context: this,\n      success: function (response) {\n        if (response.is_liked) {\n          $(this).text('Unlike');\n        } else {\n          $(this).text('Like');\n        }\n        $(this).toggleClass('btn-danger');\n        $(this).toggleClass('btn-success');\n        $(this).next(\".count_likes\").text(response.likes_count);\n      },\n      error: function (xhr, textStatus, errorThrown) {\n        console.log(xhr.status + ': ' + xhr.statusText);\n      }\n    });\n  });\n});\n$('.subscribe-ajax').click(function (event) {\n  event.preventDefault();\n  var form = $(this).closest('form');\n  var url = form.attr('action');\n  $.ajax({\n    type: 'POST',\n    url: url,\n    data: form.serialize(),\n    dataType: 'json',\n    context: this,\n    success: function (response) {\n      if (response.is_subscribed) {\n        $(this).text('Unsubscribed');\n      } else {\n        $(this).text('Subscribed');\n      }\n      $(this).toggleClass('btn-primary');\n      $(this).toggleClass('btn-secondary');\n    },\n    error: function (xhr, textStatus, errorThrown) {\n      console.log(xhr.status + ': ' + xhr.statusText);\n    }\n  });\n});\n\n//# sourceURL=webpack://frontend/./src/js/ajax.js?");
+eval("$(document).ready(function () {\n    $(document).on('click', '.like-ajax', function (event) {\n        event.preventDefault();\n        var form = $(this).closest('form')\n        var url = form.attr('action');\n        $.ajax({\n            type: 'POST',\n            url: url,\n            data: form.serialize(),\n            dataTypes: \"json\",\n            context: this,\n            success: function (response) {\n                if (response.is_liked) {\n                    $(this).text('Unlike');\n                } else {\n                    $(this).text('Like');\n                }\n                $(this).toggleClass('btn-danger');\n                $(this).toggleClass('btn-success');\n                $(this).next(\".count_likes\").text(response.likes_count);\n            },\n            error: function (xhr, textStatus, errorThrown) {\n                console.log(xhr.status + ': ' + xhr.statusText);\n            }\n        })\n    })\n    $(document).on('click', '.load-more-ajax', function (event) {\n        event.preventDefault();\n        var container = $(this).closest('.load-more')\n        $.ajax({\n            type: 'GET', url: $(this).attr('href'), dataType: 'html', success: function (response) {\n                container.replaceWith(response);\n            }, error: function (xhr, textStatus, errorThrown) {\n                console.log(xhr.status + ': ' + xhr.statusText);\n            }\n        })\n    })\n})\n$(document).on('click', '.subscribe-ajax', function (event) {\n    event.preventDefault();\n    var form = $(this).closest('form')\n    var url = form.attr('action');\n    $.ajax({\n        type: 'POST', url: url, data: form.serialize(), dataType: 'json', context: this, success: function (response) {\n            if (response.is_subscribed) {\n                $(this).text('Unsubscribed');\n            } else {\n                $(this).text('Subscribed');\n            }\n            $(this).toggleClass('btn-primary');\n            $(this).toggleClass('btn-secondary');\n        }, error: function (xhr, textStatus, errorThrown) {\n            console.log(xhr.status + ': ' + xhr.statusText);\n        }\n    })\n\n})\n\n//# sourceURL=webpack://frontend/./src/js/ajax.js?");
 
 /***/ })
 
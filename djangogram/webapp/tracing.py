@@ -0,0 +1,84 @@
+"""
+Recorder of request traces that the `replay_trace` command replays offline.
+
+Every visitor gets a random id in a cookie. The requests of `TRACE_SAMPLE_RATE` of the visitors (picked by
+their id, so all of their requests are recorded in order) are written as JSON lines to `TRACE_LOG_FILE`:
+the time, the visitor id, the URL name and arguments, the query string and the submitted form fields,
+without usernames, emails, passwords and CSRF tokens. Uploaded files are not recorded.
+When the sample rate is 0 the middleware removes itself at startup.
+"""
+import hashlib
+import json
+import secrets
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .middleware import AsyncCapableMiddleware
+from .records import get_record_logger
+
+EXCLUDED_FIELDS = {'username', 'email', 'password', 'password1', 'password2', 'csrfmiddlewaretoken'}
+VISITOR_COOKIE = 'trace_visitor'
+
+
+def get_visitor(request):
+    """
+    Returns the id of the visitor, which survives logging in and out unlike the session key,
+    and whether the visitor is sampled.
+    """
+    visitor = request.COOKIES.get(VISITOR_COOKIE) or secrets.token_hex(8)
+    digest = hashlib.sha256(visitor.encode()).hexdigest()
+    return visitor, int(digest[:8], 16) / 0xffffffff < settings.TRACE_SAMPLE_RATE
+
+
+class TraceRecorderMiddleware(AsyncCapableMiddleware):
+    """
+    Records the requests of the sampled visitors. Must be placed after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        if not settings.TRACE_SAMPLE_RATE:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def process(self, request, get_response):
+        visitor, sampled = get_visitor(request)
+        data = self.get_data(request) if sampled else None
+        started = time.perf_counter()
+        response = get_response(request)
+        if sampled:
+            self.record(request, response, visitor, data, time.perf_counter() - started)
+        return self.set_cookie(request, response, visitor)
+
+    async def aprocess(self, request, get_response):
+        visitor, sampled = get_visitor(request)
+        data = self.get_data(request) if sampled else None
+        started = time.perf_counter()
+        response = await get_response(request)
+        if sampled:
+            # Reading request.user may query the database.
+            await sync_to_async(self.record)(request, response, visitor, data, time.perf_counter() - started)
+        return self.set_cookie(request, response, visitor)
+
+    @staticmethod
+    def get_data(request):
+        # Read before the view, which may replace request.POST.
+        return {key: value for key, value in request.POST.lists() if key not in EXCLUDED_FIELDS}
+
+    @staticmethod
+    def set_cookie(request, response, visitor):
+        if VISITOR_COOKIE not in request.COOKIES:
+            response.set_cookie(VISITOR_COOKIE, visitor, max_age=365 * 24 * 60 * 60, httponly=True, samesite='Lax')
+        return response
+
+    @staticmethod
+    def record(request, response, visitor, data, seconds):
+        match = request.resolver_match
+        record = {'time': time.time(), 'visitor': visitor, 'authenticated': request.user.is_authenticated,
+                  'method': request.method, 'path': request.path, 'view': match.url_name if match else None,
+                  'kwargs': match.kwargs if match else {}, 'query': request.META.get('QUERY_STRING', ''),
+                  'data': data, 'status': response.status_code, 'duration_ms': round(seconds * 1000, 2)}
+        get_record_logger('webapp.tracing.records', settings.TRACE_LOG_FILE,
+                          settings.TRACE_LOG_MAX_BYTES).info(json.dumps(record))
@@ -23,6 +23,8 @@ urlpatterns = [
     path('posts/<int:id>/comments/create/', views.CommentsForPostCreateView.as_view(), name='comments-create'),
     path('posts/<int:id>/comments/edit/<int:comment_id>/', views.EditCommentView.as_view(), name='comments-edit'),
     path('posts/<int:id>/comments/delete/<int:comment_id>/', views.DeleteCommentView.as_view(), name='comments-delete'),
+    path('internal/profiles/', views.ProfilesView.as_view(), name='profiles'),
+    path('metrics', views.MetricsView.as_view(), name='metrics'),
 ]
 
 urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -1,15 +1,42 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import JsonResponse
+from django.contrib.auth.views import redirect_to_login
+from django.db import transaction
+from django.db.models import F
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.utils.crypto import constant_time_compare
 from django.utils.decorators import method_decorator
 from django.views import View
 
 from .forms import PostForm, PostImageForm, BioForm, CommentForm, PostTagForm, CommentTagForm, LoginForm, RegisterForm, \
     User
-from .models import Post, UserProfile, Tag, Comment, PostTag, PostLike, CommentTag, CommentLike, Subscription
+from .models import Post, UserProfile, Tag, Comment, PostLike, CommentLike, Subscription, TimelineEntry
+from . import cards, follows, like_buffer, metrics, profiling
+from .pagination import make_page, paginate
+
+
+def is_ajax(request):
+    return request.headers.get('x-requested-with') == 'XMLHttpRequest'
+
+
+def async_login_required(method):
+    """
+    `login_required` for the async methods of class-based views, the user is loaded with `request.auser()`.
+    """
+    @wraps(method)
+    async def wrapper(self, request, *args, **kwargs):
+        if (await request.auser()).is_authenticated:
+            return await method(self, request, *args, **kwargs)
+        return redirect_to_login(request.get_full_path())
+    return wrapper
 
 
 class SignUpView(View):
@@ -36,7 +63,7 @@ class SignUpView(View):
             user.username = user.username.lower()
             user.save()
             messages.success(request, 'You have singed up successfully.')
-            login(request, user, backend='django.contrib.auth.backends.ModelBackend')
+            login(request, user, backend='webapp.backends.CachedModelBackend')
             return redirect('user-bio-create')
         return render(request, 'webapp/register.html', {'form': form})
 
@@ -104,8 +131,8 @@ class SingOutView(View):
 
 
 class SubscribeView(View):
-    @method_decorator(login_required)
-    def post(self, request, user_id):
+    @async_login_required
+    async def post(self, request, user_id):
         """
         Handles the POST request for subscribing/unsubscribing to a user.
         Args:
@@ -118,31 +145,49 @@ class SubscribeView(View):
                     'is_subscribed': bool,  # Indicates whether the user is subscribed or unsubscribed.
                 }
         """
-        user = get_object_or_404(User, id=user_id)
-        if Subscription.objects.filter(user=request.user, subscribed_to=user):
-            request.user.profile.subscriptions.remove(user)
-            Subscription.objects.filter(user=request.user, subscribed_to=user).delete()
-            is_subscribed = False
-        else:
-            request.user.profile.subscriptions.add(user)
-            Subscription.objects.create(user=request.user, subscribed_to=user)
-            is_subscribed = True
+        try:
+            is_subscribed = await sync_to_async(self.toggle)(await request.auser(), user_id)
+        except User.DoesNotExist:
+            raise Http404('No User matches the given query.')
         response = {'is_subscribed': is_subscribed, }
         return JsonResponse(response)
 
+    @staticmethod
+    def toggle(user, subscribed_to_id):
+        """
+        Toggles the subscription and updates the follow set and the timeline of `user` in one thread.
+        """
+        is_subscribed = Subscription.objects.toggle(user, subscribed_to_id)
+        subscribed_to = User(pk=subscribed_to_id)
+        follows.invalidate(user.pk)
+        if is_subscribed:
+            TimelineEntry.objects.follow(user, subscribed_to)
+        else:
+            TimelineEntry.objects.unfollow(user, subscribed_to)
+        return is_subscribed
+
 
 class FeedView(View):
-    def get(self, request):
+    @async_login_required
+    async def get(self, request):
         """
         Get the feed posts for the given user and render them in the feed.html template.
+        The posts are paginated by the opaque `cursor` GET parameter, ajax requests get only the posts_page.html
+        fragment so the next page can be appended to the current one.
         Parameters:
             request (HttpRequest): The HTTP request object.
         Returns:
-            HttpResponse: The rendered feed.html template with the feed posts.
+            HttpResponse: The rendered feed.html template with one page of the feed posts.
         """
-        posts = Post.objects.get_feed_posts(request.user)
-        context = {'posts': posts}
-        return render(request, 'webapp/feed.html', context)
+        user = await request.auser()
+        posts = await Post.objects.aget_feed_posts(user, request.GET.get('cursor'), settings.POSTS_PAGE_SIZE)
+        page = make_page(posts, settings.POSTS_PAGE_SIZE)
+        if page.object_list:
+            # The cards read the follow set, it is loaded here so rendering runs no query.
+            await follows.get_follow_set(user).aload()
+        context = {'posts': await cards.aattach_fragments(page.object_list), 'next_cursor': page.next_cursor}
+        template_name = 'webapp/posts_page.html' if is_ajax(request) else 'webapp/feed.html'
+        return render(request, template_name, context)
 
 
 class HomeView(View):
@@ -155,16 +200,20 @@ class HomeView(View):
         Parameters:
             - request: The HTTP request object.
         Returns:
-            - A rendered HTML template ('webapp/home.html') with the 'posts' context variable.
-        """
-        posts = Post.objects.all().prefetch_related('images', 'tags')
-        context = {'posts': posts}
+            - A rendered HTML template ('webapp/home.html') with the 'posts' and 'next_cursor' context variables,
+              or only the 'webapp/posts_page.html' fragment for ajax requests.
+        """
+        posts = Post.objects.with_card_data(request.user)
+        page = paginate(posts, request.GET.get('cursor'), settings.POSTS_PAGE_SIZE)
+        context = {'posts': cards.attach_fragments(page.object_list), 'next_cursor': page.next_cursor}
+        if is_ajax(request):
+            return render(request, 'webapp/posts_page.html', context)
         return render(request, 'webapp/home.html', context)
 
 
 class LikePostView(View):
-    @method_decorator(login_required)
-    def post(self, request, post_id):
+    @async_login_required
+    async def post(self, request, post_id):
         """
         Handles the HTTP POST request to like or unlike a post.
         Parameters:
@@ -173,23 +222,27 @@ class LikePostView(View):
         Returns:
             JsonResponse: A JSON response containing the updated like status
             and the total number of likes for the post.
+        Notes:
+            - With `LIKE_WRITE_BEHIND` enabled the like is buffered and written later,
+              the response reflects the optimistic state.
         """
-        post = get_object_or_404(Post, id=post_id)
-        if request.user.is_authenticated:
-            try:
-                like = post.likes.get(user=request.user)
-                like.delete()
-                is_liked = False
-            except PostLike.DoesNotExist:
-                like = PostLike.objects.create(post=post, user=request.user)
-                is_liked = True
-            response = {'is_liked': is_liked, 'likes_count': post.likes.count(), }
-            return JsonResponse(response)
+        user = await request.auser()
+        try:
+            if settings.LIKE_WRITE_BEHIND:
+                is_liked, likes_count = await like_buffer.atoggle(post_id, user)
+            else:
+                is_liked, likes_count = await sync_to_async(PostLike.objects.toggle)(post_id, user)
+        except Post.DoesNotExist:
+            raise Http404('No Post matches the given query.')
+        if is_liked:
+            metrics.likes.labels('post').inc()
+        response = {'is_liked': is_liked, 'likes_count': likes_count, }
+        return JsonResponse(response)
 
 
 class LikeCommentView(View):
-    @method_decorator(login_required)
-    def post(self, request, post_id, comment_id):
+    @async_login_required
+    async def post(self, request, post_id, comment_id):
         """
         Handles the POST request to like or unlike a comment.
         Parameters:
@@ -199,18 +252,15 @@ class LikeCommentView(View):
         Returns:
             - JsonResponse: A JSON response containing the result of the like operation.
         """
-        comment = get_object_or_404(Comment, id=comment_id)
-        post = get_object_or_404(Post, id=post_id)
-        if request.user.is_authenticated:
-            liked_comments = CommentLike.objects.filter(comment=comment, user=request.user)
-            if liked_comments.exists():
-                liked_comments.delete()
-                is_liked = False
-            else:
-                CommentLike.objects.create(comment=comment, user=request.user)
-                is_liked = True
-            response = {'is_liked': is_liked, 'likes_count': liked_comments.count(), }
-            return JsonResponse(response)
+        try:
+            is_liked, likes_count = await sync_to_async(CommentLike.objects.toggle)(
+                comment_id, await request.auser(), post_id=post_id)
+        except Comment.DoesNotExist:
+            raise Http404('No Comment matches the given query.')
+        if is_liked:
+            metrics.likes.labels('comment').inc()
+        response = {'is_liked': is_liked, 'likes_count': likes_count, }
+        return JsonResponse(response)
 
 
 class UserBioView(View):
@@ -337,17 +387,16 @@ class CreatePostView(View):
             post = form.save(commit=False)
             post.author = request.user
             post.save()
+            TimelineEntry.objects.fan_out(post)
 
             post_image = post_image_form.save(commit=False)
             post_image.post = post
             post_image.save()
 
             if tag_form.is_valid():
-                tag_name = tag_form.cleaned_data['name'].split(',')
-                for name in tag_name:
-                    name = name.strip()
-                    tag, created = Tag.objects.get_or_create(name=name)
-                    post_tags = PostTag.objects.create(post=post, tag=tag)
+                Tag.objects.assign(post, tag_form.cleaned_data['name'])
+            Post.objects.bump_version(post)
+            metrics.posts_created.inc()
             messages.success(request, 'The post has been created successfully.')
             return redirect('posts')
         messages.error(request, 'Please correct the following errors:')
@@ -394,7 +443,8 @@ class EditPostView(View):
         - The `PostTagForm` is initialized with the request data.
         - If the form is valid, the post is saved.
         - If the post image form is valid, a new `PostImage` object is created and associated with the post.
-        - If the tag form is valid, new `PostTag` objects are created for each tag name provided.
+        - If the tag form is valid, the post is linked to the tags provided, existing links are kept.
+        - The version of the post is bumped, so its cached card is rendered again.
         - A success message is added to the request object.
         - Finally, the user is redirected to the 'posts' URL.
         """
@@ -413,11 +463,8 @@ class EditPostView(View):
                 post_image_form.save()
 
             if tag_form.is_valid():
-                tag_names = tag_form.cleaned_data['name'].split(',')
-                for name in tag_names:
-                    name = name.strip()
-                    tag, created = Tag.objects.get_or_create(name=name)
-                    post_tags = PostTag.objects.create(post=post, tag=tag)
+                Tag.objects.assign(post, tag_form.cleaned_data['name'])
+            Post.objects.bump_version(post)
             messages.success(request, 'The post has been updated successfully.')
             return redirect('posts')
         context = {'form': form, 'post_image_form': post_image_form, 'tag_form': tag_form, 'post_tags': post.tags.all()}
@@ -463,16 +510,20 @@ class AllCommentsForPostView(View):
     @method_decorator(login_required)
     def get(self, request, id):
         """
-        Renders the comments of a post.
+        Renders the comments of a post, oldest first, one page per `cursor` GET parameter.
         Parameters:
             request (HttpRequest): The HTTP request object.
             id (int): The ID of the post.
         Returns:
-            HttpResponse: The rendered HTML page containing the comments of the post.
+            HttpResponse: The rendered HTML page containing the comments of the post,
+            or only the 'webapp/comments_page.html' fragment for ajax requests.
         """
         post = get_object_or_404(Post, id=id)
-        comments = Comment.objects.filter(post=post)
-        context = {'post': post, 'comments': comments}
+        comments = Comment.objects.filter(post=post).with_card_data(request.user)
+        page = paginate(comments, request.GET.get('cursor'), settings.COMMENTS_PAGE_SIZE, descending=False)
+        context = {'post': post, 'comments': page.object_list, 'next_cursor': page.next_cursor}
+        if is_ajax(request):
+            return render(request, 'webapp/comments_page.html', context)
         return render(request, 'webapp/comments_post.html', context)
 
 
@@ -505,7 +556,7 @@ class CommentsForPostCreateView(View):
             - This function is decorated with the `login_required` decorator to ensure that the user is authenticated.
             - The function creates a new instance of the `CommentForm` and `CommentTagForm` classes using the data from the POST request.
             - If the form is valid, the function saves the comment object to the database and associates it with the specified post.
-            - If the tag form is valid, the function creates comment tag objects for each tag name provided.
+            - If the tag form is valid, the function links the comment to the tags provided.
             - The function displays success or error messages depending on the outcome of the comment creation process.
             - If the form is invalid, the function renders the comment form template with the form and tag form objects.
         """
@@ -516,13 +567,12 @@ class CommentsForPostCreateView(View):
             post = get_object_or_404(Post, id=id)
             comment.user = request.user
             comment.post = post
-            comment.save()
+            with transaction.atomic():
+                comment.save()
+                Post.objects.filter(id=post.id).update(comment_count=F('comment_count') + 1)
+            metrics.comments_created.inc()
             if tag_form.is_valid():
-                tag_name = tag_form.cleaned_data['name'].split(',')
-                for name in tag_name:
-                    name = name.strip()
-                    tag, created = Tag.objects.get_or_create(name=name)
-                    comment_tags = CommentTag.objects.create(comment=comment, tag=tag)
+                Tag.objects.assign(comment, tag_form.cleaned_data['name'])
             messages.success(request, 'The comment has been created successfully.')
             return redirect('all-comments-for-post', id=post.id)
         messages.error(request, 'Please correct the following errors:')
@@ -578,11 +628,7 @@ class EditCommentView(View):
             if form.is_valid():
                 form.save()
                 if tag_form.is_valid():
-                    tag_names = tag_form.cleaned_data['name'].split(',')
-                    for name in tag_names:
-                        name = name.strip()
-                        tag, created = Tag.objects.get_or_create(name=name)
-                        comment_tags = CommentTag.objects.create(comment=comment, tag=tag)
+                    Tag.objects.assign(comment, tag_form.cleaned_data['name'])
                 messages.success(request, 'The comment has been updated successfully.')
                 return redirect('all-comments-for-post', id=post.id)
             context = {'form': form, 'id': id, 'comment_id': comment_id, 'tag_form': tag_form}
@@ -624,6 +670,49 @@ class DeleteCommentView(LoginRequiredMixin, View):
         comment = get_object_or_404(Comment, pk=comment_id)
 
         if request.user == post.author or request.user == comment.user:
-            comment.delete()
+            with transaction.atomic():
+                comment.delete()
+                Post.objects.filter(id=comment.post_id, comment_count__gt=0).update(
+                    comment_count=F('comment_count') - 1)
             messages.success(request, 'The comment has been deleted successfully.')
         return redirect('all-comments-for-post', id=post.id)
+
+
+class ProfilesView(View):
+    @method_decorator(staff_member_required)
+    def get(self, request):
+        """
+        Lists the latest request profiles recorded by ProfilingMiddleware, newest first.
+        Parameters:
+            request (HttpRequest): The HTTP request object, `limit` GET parameter caps the number of profiles.
+        Returns:
+            JsonResponse: The profiles under the 'profiles' key.
+        """
+        try:
+            limit = max(1, min(int(request.GET.get('limit', 50)), 1000))
+        except ValueError:
+            raise Http404('Invalid limit')
+        return JsonResponse({'profiles': profiling.read_profiles(limit)})
+
+
+class MetricsView(View):
+    def get(self, request):
+        """
+        Serves the metrics of all workers in the Prometheus text format.
+        With `METRICS_TOKEN` set the request must carry it as a bearer token, without it the request must come
+        from an internal address.
+        Parameters:
+            request (HttpRequest): The HTTP request object.
+        Returns:
+            HttpResponse: The metrics, or a 403 response for a missing or wrong token or an external address.
+        """
+        if settings.METRICS_TOKEN:
+            allowed = constant_time_compare(request.headers.get('Authorization', ''),
+                                            f'Bearer {settings.METRICS_TOKEN}')
+        else:
+            allowed = metrics.is_internal_request(request)
+        if not allowed:
+            return HttpResponseForbidden()
+        content, content_type = metrics.render()
+        return HttpResponse(content, content_type=content_type)
+
@@ -0,0 +1,44 @@
+"""
+Warm-up of a new worker before it takes traffic.
+
+gunicorn runs `run()` in every worker before the worker accepts connections (see gunicorn.conf.py), so the
+first requests do not pay for importing the views, building the URL resolver and compiling the templates.
+It also checks that the database and the cache answer. Other servers warm up on the first readiness probe.
+"""
+import logging
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import connection
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+# The templates of the most requested pages with the templates they extend and include, which
+# the cached template loader would otherwise compile on their first render.
+TEMPLATES = ['base.html', 'webapp/home.html', 'webapp/feed.html', 'webapp/posts_page.html', 'webapp/post_card.html',
+             'webapp/post_card_body.html', 'webapp/post_card_tags.html', 'webapp/comments_post.html',
+             'webapp/comments_page.html', 'webapp/login.html']
+
+state = {'warm': False, 'seconds': None}
+lock = threading.Lock()
+
+
+def run():
+    """
+    Warms up this process once. Errors are raised, the worker is then not ready.
+    """
+    with lock:
+        if state['warm']:
+            return
+        started = time.perf_counter()
+        # Imports the views and builds the reverse lookup tables.
+        get_resolver().reverse_dict
+        for name in TEMPLATES:
+            get_template(name)
+        connection.ensure_connection()
+        cache.get('warmup')
+        state.update(warm=True, seconds=time.perf_counter() - started)
+    logger.info('Warmed up in %.0f ms.', state['seconds'] * 1000)